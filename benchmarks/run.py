@@ -0,0 +1,470 @@
+"""
+Benchmark suite for newenvreader, using the standard library only.
+
+Run it from the repository root and keep the JSON output to compare
+versions:
+
+    PYTHONPATH=. python benchmarks/run.py --output before.json
+    PYTHONPATH=. python benchmarks/run.py --compare before.json
+
+Every benchmark generates its own files in a temporary directory.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any, Optional
+
+import newenvreader
+
+QUICK_SIZES = (10, 1000)
+FULL_SIZES = (10, 1000, 50000)
+QUICK_MEMORY_SIZES = (10000,)
+FULL_MEMORY_SIZES = (10000, 100000, 1000000)
+QUICK_CHECK_FILES = 40
+FULL_CHECK_FILES = 5000
+
+
+def measure(func: Callable[[], Any], repeat: int, number: int = 1) -> dict[str, float]:
+    """Time ``number`` calls of ``func``, ``repeat`` times.
+
+    :param func: The code to time.
+    :type func: Callable[[], Any]
+    :param repeat: How many samples to take.
+    :type repeat: int
+    :param number: Calls per sample, defaults to 1
+    :type number: int, optional
+    :return: Fastest and median time per call, in seconds.
+    :rtype: dict[str, float]
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def write_env_file(directory: str, keys: int) -> str:
+    """Write a .env file with ``keys`` entries of mixed styles."""
+    path = os.path.join(directory, ".env")
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(keys):
+            if i % 10 == 0:
+                file.write(f"# comment {i}\n")
+            if i % 3 == 0:
+                file.write(f'KEY_{i}="quoted value {i}"\n')
+            else:
+                file.write(f"KEY_{i}=plain value {i}\n")
+    return path
+
+
+def write_ini_file(directory: str, keys: int) -> str:
+    """Write a settings.ini file with ``keys`` options and a foreign section."""
+    path = os.path.join(directory, "settings.ini")
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("[settings]\nBASE=/srv\n")
+        for i in range(keys):
+            file.write(f"KEY_{i}=%(BASE)s/value{i}\n")
+        file.write("\n[tool]\n")
+        for i in range(keys):
+            file.write(f"option_{i} = value {i}\n")
+    return path
+
+
+def make_tree(root: str, depth: int, width: int) -> str:
+    """Create ``depth`` nested directories, each holding ``width`` subdirectories.
+
+    :return: The deepest directory, to start discovery from.
+    :rtype: str
+    """
+    current = root
+    for level in range(depth):
+        for i in range(width):
+            os.makedirs(os.path.join(current, f"sibling{i}", "nested"))
+        current = os.path.join(current, f"level{level}")
+        os.mkdir(current)
+    return current
+
+
+def bench_discovery(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Time discovery, and repeated CLI starts through the discovery cache.
+
+    With the cache, every call reads the cache file again, as a new process
+    would.
+    """
+    results = []
+    cache_dir = os.path.join(tmp, "cache")
+    for width in (0, args.tree_width):
+        root = os.path.join(tmp, f"discovery{width}")
+        os.mkdir(root)
+        write_env_file(root, 1)
+        start = make_tree(root, args.tree_depth, width)
+        # Trees on build machines are not modified right before each run
+        past = time.time_ns() - 60 * 10**9
+        for directory, _, _ in os.walk(root):
+            os.utime(directory, ns=(past, past))
+
+        for cache in (False, True):
+            if cache:
+                os.environ[newenvreader.DISCOVERY_CACHE_ENV_VAR] = cache_dir
+            try:
+                newenvreader.search_env_file(start)
+                timing = measure(
+                    lambda: newenvreader.search_env_file(start), args.repeat, number=20
+                )
+            finally:
+                os.environ.pop(newenvreader.DISCOVERY_CACHE_ENV_VAR, None)
+            params = {"depth": args.tree_depth, "width": width}
+            if cache:
+                params["cache"] = True
+            results.append({"name": "search_env_file", "params": params, **timing})
+    return results
+
+
+def bench_parsing(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    results = []
+    for keys in args.sizes:
+        directory = os.path.join(tmp, f"parse{keys}")
+        os.mkdir(directory)
+        env_path = write_env_file(directory, keys)
+        ini_path = write_ini_file(directory, keys)
+
+        timing = measure(lambda: newenvreader.parse_env_file(env_path), args.repeat)
+        results.append({"name": "parse_env_file", "params": {"keys": keys}, **timing})
+        timing = measure(
+            lambda: dict(newenvreader.parse_ini_file(ini_path)), args.repeat
+        )
+        results.append({"name": "parse_ini_file", "params": {"keys": keys}, **timing})
+
+        os.remove(ini_path)
+        timing = measure(lambda: newenvreader.load_env(directory), args.repeat)
+        results.append({"name": "load_env", "params": {"keys": keys}, **timing})
+    return results
+
+
+def bench_incremental(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Compare parsing a changed .env file again in full with the incremental
+    re-parse, after an append and after an edit in the middle of the file."""
+    results = []
+    for keys in args.sizes:
+        directory = os.path.join(tmp, str(keys))
+        os.mkdir(directory)
+        path = write_env_file(directory, keys)
+        with open(path, "rb") as file:
+            base = file.read()
+        # Change the value of the first assignment past the middle
+        middle = base.index(b"\nKEY_", len(base) // 2) + 1
+        equals = base.index(b"=", middle)
+        edited = base[:equals] + b"=edited" + base[base.index(b"\n", equals) :]
+        changes = (("append", base + b"APPENDED=1\n"), ("edit", edited))
+        for change, changed in changes:
+            # Every call switches the file to the other version and parses it
+            versions = [changed, base]
+            state = {"values": newenvreader.parse_env_file_incremental(path)}
+
+            def switch() -> None:
+                versions.reverse()
+                with open(path, "wb") as file:
+                    file.write(versions[0])
+
+            def full() -> None:
+                switch()
+                newenvreader.parse_env_file(path)
+
+            def incremental() -> None:
+                switch()
+                values = newenvreader.parse_env_file_incremental(path, state["values"])
+                state["values"] = values
+
+            for mode, parse in (("full", full), ("incremental", incremental)):
+                timing = measure(parse, args.repeat)
+                params = {"keys": keys, "change": change, "mode": mode}
+                results.append({"name": "reparse", "params": params, **timing})
+    return results
+
+
+def bench_get_env(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    directory = os.path.join(tmp, "get_env")
+    os.mkdir(directory)
+    with open(os.path.join(directory, ".env"), "w", encoding="utf-8") as file:
+        file.write("STR_VAL=hello\nINT_VAL=12345\nFLOAT_VAL=1.5\nBOOL_VAL=yes\n")
+        file.write("LIST_VAL=1,2,3,4\nDURATION_VAL=1h30m\n")
+    newenvreader.configure(directory)
+    newenvreader.preload()
+
+    results = []
+    casts = (("str", "STR_VAL", str), ("int", "INT_VAL", int))
+    casts += (("float", "FLOAT_VAL", float), ("bool", "BOOL_VAL", bool))
+    casts += (("list[int]", "LIST_VAL", list[int]),)
+    casts += (("timedelta", "DURATION_VAL", datetime.timedelta),)
+    for cast_name, key, cast in casts:
+        for cache in (True, False):
+            timing = measure(
+                lambda: newenvreader.get_env(key, cast=cast, cache=cache),
+                args.repeat,
+                number=args.loops,
+            )
+            params = {"cast": cast_name, "cache": cache}
+            results.append({"name": "get_env", "params": params, **timing})
+        timing = measure(
+            lambda: newenvreader.get_env("MISSING_VAL", cast=cast, default="1"),
+            args.repeat,
+            number=args.loops,
+        )
+        params = {"cast": cast_name, "default": True}
+        results.append({"name": "get_env", "params": params, **timing})
+    newenvreader.enable_instrumentation()
+    try:
+        timing = measure(
+            lambda: newenvreader.get_env("INT_VAL", cast=int),
+            args.repeat,
+            number=args.loops,
+        )
+    finally:
+        newenvreader.disable_instrumentation()
+    params = {"cast": "int", "cache": True, "instrumented": True}
+    results.append({"name": "get_env", "params": params, **timing})
+    return results
+
+
+def bench_spawn_env(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Compare preparing a child environment by merging it for every spawn
+    with :func:`newenvreader.subprocess_env`."""
+
+    def naive() -> dict[bytes, bytes]:
+        merged = {**os.environ, **newenvreader.loaded_env}
+        # What subprocess does with a str environment for each child
+        return {os.fsencode(key): os.fsencode(val) for key, val in merged.items()}
+
+    modes = (
+        ("naive", naive),
+        ("cached", newenvreader.subprocess_env),
+        ("extra", lambda: newenvreader.subprocess_env(JOB_ID="42")),
+    )
+    results = []
+    for keys in args.sizes:
+        directory = os.path.join(tmp, str(keys))
+        os.mkdir(directory)
+        write_env_file(directory, keys)
+        newenvreader.configure(directory)
+        newenvreader.preload()
+        for mode, prepare in modes:
+            timing = measure(prepare, args.repeat, max(1, args.loops // 100))
+            params = {"keys": keys, "mode": mode}
+            results.append({"name": "spawn_env", "params": params, **timing})
+    newenvreader.configure()
+    return results
+
+
+def traced_memory(build: Callable[[], Any]) -> tuple[Any, int, int]:
+    """Call ``build`` under tracemalloc.
+
+    :return: The result, the bytes it still holds and the peak while building.
+    :rtype: tuple[Any, int, int]
+    """
+    tracemalloc.start()
+    try:
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+
+def bench_memory(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Compare the memory held by parsed values as a dict and as a CompactEnv."""
+    results = []
+    sizes = QUICK_MEMORY_SIZES if args.quick else FULL_MEMORY_SIZES
+    for keys in sizes:
+        # Per-tenant feature flags, many keys sharing a few prefixes
+        text = "".join(
+            f"TENANT_{i // 100}_FLAG_{i % 100}=enabled for plan {i % 7}\n"
+            for i in range(keys)
+        )
+        stores = (
+            ("dict", lambda: newenvreader.parse_env_text(text)),
+            (
+                "compact",
+                lambda: newenvreader.CompactEnv(newenvreader.parse_env_text(text)),
+            ),
+        )
+        for store, build in stores:
+            values, current, peak = traced_memory(build)
+            params = {"keys": keys, "store": store}
+            results.append(
+                {
+                    "name": "memory",
+                    "params": params,
+                    "min": current,
+                    "median": current,
+                    "peak": peak,
+                    "unit": "bytes",
+                }
+            )
+            timing = measure(lambda: values.get("TENANT_42_FLAG_7"), args.repeat, 1000)
+            results.append({"name": "lookup", "params": params, **timing})
+            del values
+    return results
+
+
+def bench_import(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Time ``import newenvreader`` in fresh interpreters, from bytecode."""
+    samples = []
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(sys.path),
+        PYTHONPYCACHEPREFIX=os.path.join(tmp, "pycache"),
+    )
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    # The first run compiles the module and is not counted
+    for run in range(args.repeat + 1):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import newenvreader"],
+            cwd=tmp,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for line in proc.stderr.splitlines():
+            fields = line.split("|")
+            if run and len(fields) == 3 and fields[2].strip() == "newenvreader":
+                samples.append(int(fields[1]) / 1e6)
+    timing = {"min": min(samples), "median": statistics.median(samples)}
+    return [{"name": "import", "params": {}, **timing}]
+
+
+def bench_check(tmp: str, args: argparse.Namespace) -> list[dict[str, Any]]:
+    """Time ``python -m newenvreader check`` on a fleet of files, by job count."""
+    files = QUICK_CHECK_FILES if args.quick else FULL_CHECK_FILES
+    keys = min(max(args.sizes), 1000)
+    for i in range(files):
+        service = os.path.join(tmp, f"service{i % 100}")
+        os.makedirs(service, exist_ok=True)
+        path = write_env_file(service, keys)
+        os.replace(path, os.path.join(service, f"{i}.env"))
+    schema = os.path.join(tmp, "schema.json")
+    with open(schema, "w", encoding="utf-8") as file:
+        json.dump({"KEY_0": "str", "KEY_1": "Optional[str]"}, file)
+
+    def check(jobs: int) -> None:
+        argv = ["check", tmp, "--schema", schema, "--format", "json"]
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            newenvreader.main(argv + ["--jobs", str(jobs)])
+
+    results = []
+    for jobs in sorted({1, 2, os.cpu_count() or 1}):
+        timing = measure(lambda: check(jobs), args.repeat)
+        params = {"files": files, "keys": keys, "jobs": jobs}
+        results.append({"name": "check", "params": params, **timing})
+    return results
+
+
+BENCHMARKS = {
+    "discovery": bench_discovery,
+    "parsing": bench_parsing,
+    "get_env": bench_get_env,
+    "import": bench_import,
+    "memory": bench_memory,
+    "check": bench_check,
+    "spawn_env": bench_spawn_env,
+    "incremental": bench_incremental,
+}
+
+
+def result_key(result: dict[str, Any]) -> str:
+    """Identify a result across runs."""
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(
+    results: list[dict[str, Any]], baseline_path: str, threshold: float
+) -> list[str]:
+    """Report results slower than the baseline by more than ``threshold``.
+
+    :return: One line per regression.
+    :rtype: list[str]
+    """
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {result_key(r): r for r in json.load(file)["results"]}
+    regressions = []
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old is None or not old["min"]:
+            continue
+        ratio = result["min"] / old["min"]
+        line = f"{result_key(result)}: {ratio:.2f}x"
+        print(line, file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument(
+        "--only", choices=sorted(BENCHMARKS), action="append", help="benchmark group"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", help="config keys per file")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per case")
+    parser.add_argument("--loops", type=int, default=10000, help="get_env calls")
+    parser.add_argument("--tree-depth", type=int, default=8)
+    parser.add_argument("--tree-width", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", help="JSON of an earlier run to compare to")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%"
+    )
+    args = parser.parse_args(argv)
+    if args.sizes is None:
+        args.sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    if args.quick:
+        args.repeat = min(args.repeat, 3)
+        args.loops = min(args.loops, 1000)
+        args.tree_width = min(args.tree_width, 10)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or BENCHMARKS:
+            group_dir = os.path.join(tmp, name)
+            os.mkdir(group_dir)
+            results.extend(BENCHMARKS[name](group_dir, args))
+
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "unit": "seconds",
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print("Regressions:\n" + "\n".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
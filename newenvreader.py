@@ -2,12 +2,263 @@
 This module provides utility functions for reading environment variables.
 """
 
+import contextvars
+import functools
+import itertools
+import marshal
 import os
-from configparser import ConfigParser, MissingSectionHeaderError
-from typing import TypeVar, Optional
+import threading
+import time
+import types
+import typing
+from collections.abc import (
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from typing import Any, TypeVar, Optional
 
 T = TypeVar("T")
 
+ENV_FILE_NAME = ".env"
+LOCAL_FILE_NAME = ".env.local"
+PROFILE_ENV_VAR = "NEWENVREADER_PROFILE"
+INI_FILE_NAME = "settings.ini"
+DEFAULT_STOP_MARKERS: tuple[str, ...] = ()
+DEFAULT_PRECEDENCE: tuple[str, ...] = (
+    "overrides",
+    "file",
+    "system",
+    "secrets",
+    "remote",
+    "defaults",
+)
+GET_ENV_CACHE_SIZE = 1024
+INI_SECTION = "settings"
+INI_DEFAULT_SECTION = "DEFAULT"
+MAX_INTERPOLATION_DEPTH = 10
+CACHE_DIR_ENV_VAR = "NEWENVREADER_CACHE_DIR"
+COMPILED_CACHE_SUFFIX = ".envc"
+COMPILED_CACHE_VERSION = 2
+DISCOVERY_CACHE_ENV_VAR = "NEWENVREADER_DISCOVERY_CACHE"
+DISCOVERY_CACHE_FILE = "discovery.cache"
+DISCOVERY_CACHE_VERSION = 1
+DISCOVERY_CACHE_SIZE = 256
+# Directories modified this recently may change again within the same
+# mtime tick, so searches through them are not cached
+DISCOVERY_CACHE_RACY_NS = 2 * 10**9
+# Config files are parsed in threads once they add up to this many bytes
+PARALLEL_PARSE_MIN_BYTES = 1 << 20
+# .env files this large are re-parsed incrementally on reload
+INCREMENTAL_PARSE_MIN_BYTES = 1 << 20
+INCREMENTAL_BLOCK_BYTES = 1 << 16
+SNAPSHOT_ENV_VAR = "NEWENVREADER_SNAPSHOT"
+SNAPSHOT_MAGIC = b"NEVS"
+SNAPSHOT_VERSION = 1
+REMOTE_CACHE_SUFFIX = ".cache"
+REMOTE_CACHE_VERSION = 1
+REMOTE_TIMEOUT = 2.0
+
+# Marks a missing key in places where raising KeyError would be too costly
+_MISSING: Any = object()
+
+
+class Instrumentation:
+    """Counters and timings collected while instrumentation is enabled.
+
+    Everything is cumulative until :meth:`reset`. ``hook``, if set, is called
+    as ``hook(event, data)`` for every recorded event, see
+    :func:`enable_instrumentation`.
+    """
+
+    def __init__(self, hook: Optional[Callable[[str, dict], Any]] = None) -> None:
+        """Create empty statistics.
+
+        :param hook: Called with each event, defaults to None
+        :type hook: Optional[Callable[[str, dict], Any]], optional
+        """
+        self.hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop everything recorded so far."""
+        with self._lock:
+            self.phases: dict[str, list] = {}
+            self.directories = 0
+            self.entries = 0
+            self.path: Optional[str] = None
+            self.keys: dict[str, list[int]] = {}
+            self.casts: dict[str, list] = {}
+
+    def _emit(self, event: str, data: dict) -> None:
+        hook = self.hook
+        if hook is not None:
+            hook(event, data)
+
+    def add_phase(self, phase: str, seconds: float) -> None:
+        """Add the duration of one run of a load phase."""
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+        self._emit("phase", {"phase": phase, "seconds": seconds})
+
+    def add_discovery(
+        self, directories: int, entries: int, path: Optional[str]
+    ) -> None:
+        """Record one config file search and the path it chose."""
+        with self._lock:
+            self.directories += directories
+            self.entries += entries
+            self.path = path
+        self._emit(
+            "discovery",
+            {"directories": directories, "entries": entries, "path": path},
+        )
+
+    def add_get_env(self, key: str, found: bool, default: bool) -> None:
+        """Record one :func:`get_env` call."""
+        with self._lock:
+            counts = self.keys.get(key)
+            if counts is None:
+                counts = self.keys[key] = [0, 0, 0]
+            counts[0] += 1
+            if not found:
+                counts[1] += 1
+                if default:
+                    counts[2] += 1
+        self._emit("get_env", {"key": key, "found": found, "default": default})
+
+    def add_cast(self, cast: Any, seconds: float) -> None:
+        """Add the duration of one cast."""
+        name = cast.__qualname__ if isinstance(cast, type) else repr(cast)
+        with self._lock:
+            totals = self.casts.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+        self._emit("cast", {"cast": name, "seconds": seconds})
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a copy of the statistics as plain dicts, see :func:`stats`."""
+        with self._lock:
+            return {
+                "phases": {
+                    phase: {"count": count, "seconds": seconds}
+                    for phase, (count, seconds) in self.phases.items()
+                },
+                "discovery": {
+                    "directories": self.directories,
+                    "entries": self.entries,
+                    "path": self.path,
+                },
+                "get_env": {
+                    key: {"calls": calls, "misses": misses, "defaults": defaults}
+                    for key, (calls, misses, defaults) in self.keys.items()
+                },
+                "casts": {
+                    cast: {"count": count, "seconds": seconds}
+                    for cast, (count, seconds) in self.casts.items()
+                },
+            }
+
+
+class _PhaseTimer:
+    """Context manager that adds the time spent in its body to a phase."""
+
+    __slots__ = ("_stats", "_phase", "_start")
+
+    def __init__(self, stats: Instrumentation, phase: str) -> None:
+        self._stats = stats
+        self._phase = phase
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stats.add_phase(self._phase, time.perf_counter() - self._start)
+
+
+class _NoPhaseTimer:
+    """Stand-in for :class:`_PhaseTimer` while instrumentation is off."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NO_PHASE_TIMER = _NoPhaseTimer()
+_stats = Instrumentation()
+# Either _stats or None; hot paths only test this against None
+_instrumentation: Optional[Instrumentation] = None
+
+
+def _phase(phase: str) -> Any:
+    """Return a context manager timing a load phase, if instrumentation is on."""
+    instrumentation = _instrumentation
+    if instrumentation is None:
+        return _NO_PHASE_TIMER
+    return _PhaseTimer(instrumentation, phase)
+
+
+def enable_instrumentation(hook: Optional[Callable[[str, dict], Any]] = None) -> None:
+    """Start collecting load timings and :func:`get_env` counters.
+
+    ``hook`` is called synchronously as ``hook(event, data)`` with one of
+    these events:
+
+    - ``"phase"``: ``{"phase", "seconds"}``, where the phase is
+      ``"discovery"``, ``"read"``, ``"parse"``, ``"fetch"`` (of the remote
+      config), ``"attach"`` (to a snapshot shared by the parent process, see
+      :func:`share_env`) or ``"merge"``;
+    - ``"discovery"``: ``{"directories", "entries", "path"}``;
+    - ``"get_env"``: ``{"key", "found", "default"}``;
+    - ``"cast"``: ``{"cast", "seconds"}``.
+
+    :param hook: Called with each event, e.g. to forward it to a metrics
+        system, defaults to None
+    :type hook: Optional[Callable[[str, dict], Any]], optional
+    """
+    global _instrumentation
+    _stats.hook = hook
+    _instrumentation = _stats
+
+
+def disable_instrumentation() -> None:
+    """Stop collecting, the statistics gathered so far are kept."""
+    global _instrumentation
+    _instrumentation = None
+
+
+def stats() -> dict[str, Any]:
+    """Return the statistics collected while instrumentation was enabled.
+
+    - ``phases``: count and total seconds of each load phase;
+    - ``discovery``: directories and directory entries visited, and the
+      config file chosen by the last search;
+    - ``get_env``: per key, the number of calls, of calls for a key that is
+      not set (``misses``) and of those answered with the default;
+    - ``casts``: count and total seconds per cast, casts served from the
+      :func:`get_env` cache are not run and not counted.
+
+    :return: A snapshot of the statistics.
+    :rtype: dict[str, Any]
+    """
+    return _stats.snapshot()
+
+
+def reset_stats() -> None:
+    """Clear the statistics returned by :func:`stats`."""
+    _stats.reset()
+
 
 def clean_env_var(value: str) -> str:
     """Clean an environment variable value.
@@ -24,141 +275,4444 @@ def clean_env_var(value: str) -> str:
     return value
 
 
+class EnvFileSyntaxError(ValueError):
+    """Raised for lines of a .env file that cannot be parsed."""
+
+    def __init__(self, msg: str, path: str, lineno: int, colno: int) -> None:
+        """Create the error.
+
+        :param msg: Description of the problem.
+        :type msg: str
+        :param path: Path of the file being parsed.
+        :type path: str
+        :param lineno: Line number, starting at 1.
+        :type lineno: int
+        :param colno: Column number, starting at 1.
+        :type colno: int
+        """
+        super().__init__(f"{path}:{lineno}:{colno}: {msg}")
+        self.msg = msg
+        self.path = path
+        self.lineno = lineno
+        self.colno = colno
+
+
+class EnvInterpolationError(ValueError):
+    """Raised when ``${VAR}`` references in a .env file form a cycle."""
+
+    def __init__(self, cycle: Sequence[str], path: str) -> None:
+        """Create the error.
+
+        :param cycle: The keys of the cycle, the first one repeated at the end.
+        :type cycle: Sequence[str]
+        :param path: Path of the file being parsed.
+        :type path: str
+        """
+        super().__init__(f"{path}: circular reference: {' -> '.join(cycle)}")
+        self.cycle = tuple(cycle)
+        self.path = path
+
+
+# Escape sequences understood inside double quoted values
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", '"': '"', "\\": "\\", "$": "$"}
+
+
+def _find_closing_quote(text: str, start: int, quote: str) -> int:
+    """Return the index of the quote closing a value, or -1."""
+    if quote == "'":
+        return text.find("'", start)
+    index = start
+    while True:
+        index = text.find('"', index)
+        if index == -1:
+            return -1
+        backslashes = 0
+        while index - backslashes > start and text[index - backslashes - 1] == "\\":
+            backslashes += 1
+        if not backslashes % 2:
+            return index
+        index += 1
+
+
+def _unescape(value: str, quote: str) -> str:
+    """Resolve backslash escapes of a double quoted value."""
+    if quote == "'" or "\\" not in value:
+        return value
+    chunks = []
+    index = 0
+    while True:
+        found = value.find("\\", index)
+        if found == -1 or found == len(value) - 1:
+            chunks.append(value[index:])
+            return "".join(chunks)
+        chunks.append(value[index:found])
+        char = value[found + 1]
+        chunks.append(_ESCAPES.get(char, "\\" + char))
+        index = found + 2
+
+
+def _split_export(key: str) -> str:
+    """Drop a leading ``export`` keyword from a key."""
+    if key.startswith("export") and key[6:7].isspace():
+        return key[6:].lstrip()
+    return key
+
+
+def _looks_like_assignment(line: str) -> bool:
+    """Whether a line reads as ``KEY=...``, used to bound multiline values."""
+    key, sep, _ = line.partition("=")
+    return bool(sep) and _split_export(key.strip()).isidentifier()
+
+
+def _scan_quoted(
+    value: str,
+    lines: list[str],
+    index: int,
+    decode: Callable[[str, str], Any] = _unescape,
+) -> tuple[Any, int]:
+    """Parse a value starting with a quote.
+
+    :param value: The stripped value, starting with the quote character.
+    :type value: str
+    :param lines: All lines of the file.
+    :type lines: list[str]
+    :param index: Index of the line following the value.
+    :type index: int
+    :param decode: Called with the text between the quotes and the quote,
+        defaults to resolving escapes
+    :type decode: Callable[[str, str], Any], optional
+    :return: The value and the index of the next line to parse.
+    :rtype: tuple[Any, int]
+    """
+    quote = value[0]
+    end = _find_closing_quote(value, 1, quote)
+    if end != -1:
+        rest = value[end + 1 :].lstrip()
+        if not rest or rest[0] == "#":
+            return decode(value[1:end], quote), index
+        # Quotes inside the value, only strip the outer ones
+        if len(value) > 2 and value[-1] == quote:
+            return value[1:-1], index
+        return value, index
+
+    # The value may continue over the next lines, up to a line holding the
+    # closing quote. A line that looks like a new assignment ends the search
+    # and the opening quote is then kept as data.
+    parts = [value[1:]]
+    for next_index in range(index, len(lines)):
+        line = lines[next_index]
+        if _looks_like_assignment(line):
+            break
+        end = _find_closing_quote(line, 0, quote)
+        if end != -1:
+            rest = line[end + 1 :].strip()
+            if rest and rest[0] != "#":
+                break
+            parts.append(line[:end])
+            return decode("\n".join(parts), quote), next_index + 1
+        parts.append(line)
+    return value, index
+
+
+def _is_escaped(text: str, index: int, start: int) -> bool:
+    """Whether the character at ``index`` follows an odd number of backslashes."""
+    backslashes = 0
+    while index - backslashes > start and text[index - backslashes - 1] == "\\":
+        backslashes += 1
+    return backslashes % 2 == 1
+
+
+def _parse_template(
+    text: str, pos: int, escapes: bool, nested: bool
+) -> tuple[list, int]:
+    """Split a value into literal strings and ``(name, default)`` references.
+
+    ``default`` is None or itself a list of parts. With ``nested``, parsing
+    stops at the ``}`` closing a default.
+    """
+    parts: list = []
+    literal_start = pos
+    while True:
+        ref = text.find("${", pos)
+        close = text.find("}", pos) if nested else -1
+        if close != -1 and (ref == -1 or close < ref):
+            if escapes and _is_escaped(text, close, literal_start):
+                pos = close + 1
+                continue
+            pos = close
+            break
+        if ref == -1:
+            pos = len(text)
+            break
+        if escapes and _is_escaped(text, ref, literal_start):
+            pos = ref + 2
+            continue
+
+        if ref > literal_start:
+            literal = text[literal_start:ref]
+            parts.append(_unescape(literal, '"') if escapes else literal)
+        start = ref + 2
+        close = text.find("}", start)
+        name = (text[start:close] if close != -1 else text[start:]).partition(":-")[0]
+        if not name.isidentifier():
+            raise ValueError("invalid variable reference")
+        end = start + len(name)
+        default = None
+        if text.startswith(":-", end):
+            default, end = _parse_template(text, end + 2, escapes, True)
+        if text[end : end + 1] != "}":
+            raise ValueError("unterminated variable reference")
+        parts.append((name, default))
+        pos = literal_start = end + 1
+
+    if pos > literal_start:
+        literal = text[literal_start:pos]
+        parts.append(_unescape(literal, '"') if escapes else literal)
+    return parts, pos
+
+
+def _compile_value(text: str, escapes: bool) -> Any:
+    """Return the value as a string, or as a list of parts if it has references."""
+    if "${" not in text:
+        return _unescape(text, '"') if escapes else text
+    parts = _parse_template(text, 0, escapes, False)[0]
+    # Literals are only split around references, so this means none were found
+    if len(parts) < 2 and (not parts or parts[0].__class__ is str):
+        return parts[0] if parts else ""
+    return parts
+
+
+def _compile_quoted(value: str, quote: str) -> Any:
+    """Decoder for :func:`_scan_quoted` that keeps references of double quoted values."""
+    if quote == "'":
+        return value
+    return _compile_value(value, True)
+
+
+def _references(
+    key: str, parts: list, values: dict[str, Any], environ: Mapping[str, str]
+) -> Iterator[str]:
+    """Yield the file keys a value needs, in the order they are needed.
+
+    The caller resolves each yielded key before resuming, so a default is
+    only followed when the reference turned out to be unset or empty.
+    """
+    for part in parts:
+        if part.__class__ is str:
+            continue
+        name, default = part
+        if name != key and name in values:
+            yield name
+            value = values[name]
+        else:
+            value = environ.get(name, "")
+        if not value and default is not None:
+            yield from _references(key, default, values, environ)
+
+
+def _render(
+    key: str, parts: list, values: dict[str, Any], environ: Mapping[str, str]
+) -> str:
+    """Join the parts of a value whose references are all resolved."""
+    chunks = []
+    for part in parts:
+        if part.__class__ is str:
+            chunks.append(part)
+            continue
+        name, default = part
+        if name != key and name in values:
+            value = values[name]
+        else:
+            value = environ.get(name, "")
+        if not value and default is not None:
+            value = _render(key, default, values, environ)
+        chunks.append(value)
+    return "".join(chunks)
+
+
+def _expand_values(
+    values: dict[str, Any], keys: Iterator[str], path: str, environ: Mapping[str, str]
+) -> None:
+    """Expand, in place, the values that are still lists of parts.
+
+    The dependency graph is walked depth first with an explicit stack, so
+    every value is rendered once, after the values it references, and long
+    chains do not hit the recursion limit.
+    """
+    for root in keys:
+        if values[root].__class__ is not list:
+            continue
+        stack = [(root, _references(root, values[root], values, environ))]
+        on_stack = {root}
+        while stack:
+            key, dependencies = stack[-1]
+            for name in dependencies:
+                if name in on_stack:
+                    cycle = [frame[0] for frame in stack]
+                    cycle = cycle[cycle.index(name) :] + [name]
+                    raise EnvInterpolationError(cycle, path)
+                if values[name].__class__ is list:
+                    stack.append(
+                        (name, _references(name, values[name], values, environ))
+                    )
+                    on_stack.add(name)
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(key)
+                values[key] = _render(key, values[key], values, environ)
+
+
+def parse_env_text(
+    text: str,
+    path: str = "<string>",
+    interpolate: bool = True,
+    environ: Optional[Mapping[str, str]] = None,
+) -> dict[str, str]:
+    """Parse the content of a .env file.
+
+    Every line holds ``KEY=value``, optionally prefixed with ``export``.
+    Blank lines and lines starting with ``#`` are skipped, as are comments
+    after unquoted values when separated by whitespace. Values in single or
+    double quotes keep their spaces and may span several lines; double
+    quoted values understand ``\\n``, ``\\t``, ``\\r``, ``\\"``, ``\\$`` and
+    ``\\\\`` escapes.
+
+    Unquoted and double quoted values may reference other keys of the file
+    or of the environment as ``${VAR}``, or ``${VAR:-default}`` to use a
+    default when the variable is unset or empty. Keys of the file win over
+    the environment, except for a key referencing itself, which reads the
+    environment as in ``PATH=${PATH}:/opt/bin``. Unset variables expand to
+    an empty string. Single quoted values and ``\\$`` are kept literally.
+
+    :param text: The content to parse.
+    :type text: str
+    :param path: File name used in error messages, defaults to "<string>"
+    :type path: str, optional
+    :param interpolate: Expand ``${VAR}`` references, defaults to True
+    :type interpolate: bool, optional
+    :param environ: Environment for references to keys outside the file,
+        defaults to ``os.environ``
+    :type environ: Optional[Mapping[str, str]], optional
+    :raises EnvFileSyntaxError: If a line has no ``=`` or an empty key, or a
+        reference is malformed.
+    :raises EnvInterpolationError: If references form a cycle.
+    :return: A dictionary of environment variables.
+    :rtype: dict
+    """
+    env_file_val, templates = _tokenize_env(text, path, interpolate)
+    if templates:
+        _expand_values(
+            env_file_val,
+            iter(templates),
+            path,
+            os.environ if environ is None else environ,
+        )
+    return env_file_val
+
+
+def _tokenize_env(
+    text: str, path: str, interpolate: bool
+) -> tuple[dict[str, Any], dict[str, None]]:
+    """Body of :func:`parse_env_text` that leaves references unexpanded.
+
+    :return: The values, where those with references are lists of parts,
+        and the keys of those values.
+    """
+    env_file_val: dict[str, Any] = {}
+    # Keys whose value has references, expanded once the whole file is read
+    templates: dict[str, None] = {}
+    # A file without references needs no per-value checks
+    interpolate = interpolate and "${" in text
+    lines = text.split("\n")
+    # Lines up to this number were consumed by a multiline value
+    skip = 0
+    for lineno, raw in enumerate(lines, 1):
+        if lineno <= skip:
+            continue
+        line = raw.strip()
+        if not line or line[0] == "#":
+            continue
+
+        key, sep, value = line.partition("=")
+        if not sep:
+            colno = len(raw) - len(raw.lstrip()) + 1
+            raise EnvFileSyntaxError("expected KEY=value", path, lineno, colno)
+        key = key.rstrip()
+        if key[:1] == "e" and key.startswith("export"):
+            key = _split_export(key)
+        if not key:
+            colno = raw.index("=") + 1
+            raise EnvFileSyntaxError("missing key before '='", path, lineno, colno)
+
+        value = value.lstrip()
+        if value:
+            first = value[0]
+            try:
+                if first == '"' or first == "'":
+                    # Fast path for a plain quoted value closed at the end of the line
+                    if value.find(first, 1) == len(value) - 1 and (
+                        first == "'" or "\\" not in value
+                    ):
+                        value = value[1:-1]
+                        if first == '"' and interpolate and "${" in value:
+                            value = _compile_value(value, False)
+                    elif first == '"' and interpolate:
+                        value, skip = _scan_quoted(
+                            value, lines, lineno, _compile_quoted
+                        )
+                    else:
+                        value, skip = _scan_quoted(value, lines, lineno)
+                else:
+                    if "#" in value:
+                        for marker in (" #", "\t#"):
+                            cut = value.find(marker)
+                            if cut != -1:
+                                value = value[:cut].rstrip()
+                    if interpolate and "${" in value:
+                        value = _compile_value(value, False)
+            except ValueError as err:
+                colno = raw.index("=") + 2
+                raise EnvFileSyntaxError(str(err), path, lineno, colno) from None
+            if interpolate and value.__class__ is list:
+                templates[key] = None
+        env_file_val[key] = value
+    return env_file_val, templates
+
+
 def parse_env_file(path: str) -> dict[str, str]:
     """Parse a .env file.
 
+    The file is read with a single buffered read and tokenized in one pass,
+    see :func:`parse_env_text` for the syntax.
+
     :param path: Path to the .env file.
     :type path: str
+    :raises EnvFileSyntaxError: If a line cannot be parsed.
     :return: A dictionary of environment variables.
     :rtype: dict
     """
-    env_file_val = {}
-    with open(path, "r", encoding="utf-8") as file:
-        for line in file:
-            line = line.strip()
-            if not line:
-                continue
+    with _phase("read"):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+    with _phase("parse"):
+        return parse_env_text(text, path)
 
-            key, value = line.split("=", maxsplit=1)
-            key = key.strip()
-            env_file_val[key] = clean_env_var(value.strip())
 
-    return env_file_val
+class _Block:
+    """A run of whole records of an indexed .env file."""
 
+    __slots__ = ("start", "end", "crc", "lines", "values", "position")
 
-def parse_ini_file(path: str) -> dict[str, str]:
-    """Parse a .ini file.
+    def __init__(
+        self, start: int, end: int, crc: int, lines: int, values: dict[str, Any]
+    ) -> None:
+        self.start = start
+        self.end = end
+        self.crc = crc
+        self.lines = lines
+        # Raw values, those with references still lists of parts
+        self.values = values
+        self.position = 0
 
-    :param path: Path to the .ini file.
+
+class _EnvIndex:
+    """Blocks of an indexed .env file and which blocks assign each key."""
+
+    __slots__ = ("size", "blocks", "owners", "templates")
+
+    def __init__(self, size: int, blocks: list[_Block]) -> None:
+        self.size = size
+        self.blocks = blocks
+        # Blocks assigning each key, in file order, the last one wins
+        self.owners: dict[str, list[_Block]] = {}
+        for position, block in enumerate(blocks):
+            block.position = position
+            for key in block.values:
+                self.owners.setdefault(key, []).append(block)
+        # Keys whose winning value has references
+        self.templates: dict[str, None] = {}
+
+
+class IndexedEnv(dict):
+    """Values of a .env file, with the index to parse it again incrementally.
+
+    Returned by :func:`parse_env_file_incremental`. ``changed`` holds the
+    keys whose value differs from the values it was parsed from, or None
+    after a full parse.
+    """
+
+    __slots__ = ("path", "changed", "_index", "_base")
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.path = ""
+        self.changed: Optional[frozenset[str]] = None
+        self._index: Optional[_EnvIndex] = None
+        # id() of the values this was parsed from, only compared while
+        # both are alive, so that they are not kept alive by each other
+        self._base: Optional[int] = None
+
+
+def _decode_text(data: bytes) -> str:
+    """Decode a config file read in binary mode as text mode would."""
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _is_boundary(data: bytes, offset: int) -> bool:
+    """Whether a block may start at ``offset``.
+
+    Multiline values stop at lines that look like assignments, so records
+    never span such a line and the blocks around it parse independently.
+    """
+    if offset == 0 or offset == len(data):
+        return True
+    if data[offset - 1 : offset] != b"\n":
+        return False
+    end = data.find(b"\n", offset)
+    line = data[offset : end if end != -1 else len(data)]
+    return _looks_like_assignment(line.decode("utf-8", "replace").split("\r", 1)[0])
+
+
+def _block_ends(data: bytes, start: int, end: int) -> Iterator[int]:
+    """Yield the ends of blocks of about INCREMENTAL_BLOCK_BYTES covering a range."""
+    target = start + INCREMENTAL_BLOCK_BYTES
+    while target < end:
+        cut = data.find(b"\n", target - 1, end)
+        while cut != -1 and not _is_boundary(data, cut + 1):
+            cut = data.find(b"\n", cut + 1, end)
+        if cut == -1 or cut + 1 >= end:
+            break
+        yield cut + 1
+        target = cut + 1 + INCREMENTAL_BLOCK_BYTES
+    yield end
+
+
+def _parse_blocks(
+    data: bytes, start: int, end: int, path: str, lineno: int
+) -> list[_Block]:
+    """Tokenize a range of whole records, starting at line ``lineno``."""
+    # Imported here to keep importing this module cheap
+    import zlib
+
+    blocks = []
+    for block_end in _block_ends(data, start, end):
+        if block_end == start:
+            continue
+        chunk = data[start:block_end]
+        text = _decode_text(chunk)
+        try:
+            values = _tokenize_env(text, path, True)[0]
+        except EnvFileSyntaxError as err:
+            raise EnvFileSyntaxError(
+                err.msg, path, lineno + err.lineno - 1, err.colno
+            ) from None
+        lines = chunk.count(b"\n")
+        blocks.append(_Block(start, block_end, zlib.crc32(chunk), lines, values))
+        lineno += lines
+        start = block_end
+    return blocks
+
+
+def _block_unchanged(data: bytes, block: _Block, start: int) -> bool:
+    """Whether ``block`` is found unchanged at ``start`` and still stands alone."""
+    # Imported here to keep importing this module cheap
+    import zlib
+
+    end = start + block.end - block.start
+    return (
+        start >= 0
+        and end <= len(data)
+        and _is_boundary(data, start)
+        and _is_boundary(data, end)
+        and zlib.crc32(memoryview(data)[start:end]) == block.crc
+    )
+
+
+def _index_env(data: bytes, path: str) -> IndexedEnv:
+    """Parse the whole of a .env file into blocks."""
+    blocks = _parse_blocks(data, 0, len(data), path, 1)
+    index = _EnvIndex(len(data), blocks)
+    values = IndexedEnv()
+    for block in blocks:
+        values.update(block.values)
+    index.templates = {
+        key: None for key, value in values.items() if value.__class__ is list
+    }
+    if index.templates:
+        _expand_values(values, iter(index.templates), path, os.environ)
+    values.path = path
+    values._index = index
+    return values
+
+
+def _reparse(
+    data: bytes, path: str, index: _EnvIndex, previous: IndexedEnv
+) -> IndexedEnv:
+    """Parse only the blocks that changed since ``previous`` was parsed."""
+    # Imported here to keep importing this module cheap
+    import bisect
+
+    blocks = index.blocks
+    delta = len(data) - index.size
+    first = 0
+    while first < len(blocks) and _block_unchanged(
+        data, blocks[first], blocks[first].start
+    ):
+        first += 1
+    start = blocks[first - 1].end if first else 0
+    last = len(blocks)
+    while last > first and blocks[last - 1].start + delta >= start:
+        block = blocks[last - 1]
+        if not _block_unchanged(data, block, block.start + delta):
+            break
+        last -= 1
+    if first == 0 and last == len(blocks):
+        # Nothing to reuse, the bookkeeping would only add to a full parse
+        values = _index_env(data, path)
+        previous._index = None
+        values._base = id(previous)
+        values.changed = frozenset(
+            key
+            for key in values.keys() | previous.keys()
+            if values.get(key, _MISSING) != previous.get(key, _MISSING)
+        )
+        return values
+    end = blocks[last].start + delta if last < len(blocks) else len(data)
+    lineno = 1 + sum(block.lines for block in blocks[:first])
+    added = _parse_blocks(data, start, end, path, lineno)
+
+    # The index changes in place from here, ``previous`` cannot be parsed
+    # from again, and an error leaves the next parse a full one
+    previous._index = None
+    removed = blocks[first:last]
+    for block in blocks[last:]:
+        block.start += delta
+        block.end += delta
+    index.blocks = blocks = blocks[:first] + added + blocks[last:]
+    index.size = len(data)
+    for position, block in enumerate(blocks):
+        block.position = position
+
+    owners = index.owners
+    affected = set()
+    for block in removed:
+        for key in block.values:
+            owned = owners[key]
+            owned.remove(block)
+            if not owned:
+                del owners[key]
+            affected.add(key)
+    for block in added:
+        for key in block.values:
+            bisect.insort(
+                owners.setdefault(key, []), block, key=lambda item: item.position
+            )
+            affected.add(key)
+
+    # Apply the changes to a copy, the previous values may still be in use.
+    # Copying is cheapest from values without deleted keys, which CPython
+    # clones without hashing again
+    values = IndexedEnv(previous)
+    templates = index.templates
+    for key in affected:
+        owned = owners.get(key)
+        if owned is None:
+            del values[key]
+            templates.pop(key, None)
+            continue
+        raw = owned[-1].values[key]
+        values[key] = raw
+        if raw.__class__ is list:
+            templates[key] = None
+        else:
+            templates.pop(key, None)
+    if templates:
+        # A reference may point to any key that changed, so render them all
+        for key in templates:
+            values[key] = owners[key][-1].values[key]
+        _expand_values(values, iter(templates), path, os.environ)
+
+    values.path = path
+    values._index = index
+    values._base = id(previous)
+    values.changed = frozenset(
+        key
+        for key in itertools.chain(affected, templates)
+        if values.get(key, _MISSING) != previous.get(key, _MISSING)
+    )
+    return values
+
+
+def parse_env_file_incremental(
+    path: str, previous: Optional[IndexedEnv] = None
+) -> IndexedEnv:
+    """Parse a .env file, re-tokenizing only what changed since ``previous``.
+
+    The file is split into blocks of whole records, and the offsets, line
+    count, checksum and parsed values of each block are kept with the
+    result. Given the result of an earlier parse of the same file, blocks
+    whose bytes are unchanged are found again by checksum, at the start of
+    the file and, shifted, at its end, so appending to the file or editing
+    part of it only tokenizes the changed range. The changed keys are then
+    applied to a copy of the earlier values. ``${VAR}`` references are
+    expanded again after every parse.
+
+    ``previous`` gives its index to the result, so it can only be parsed
+    from once.
+
+    :param path: Path to the .env file.
     :type path: str
-    :return: A dictionary of environment variables.
-    :rtype: dict
+    :param previous: The result of the last parse of this file, defaults
+        to None
+    :type previous: Optional[IndexedEnv], optional
+    :raises EnvFileSyntaxError: If a line cannot be parsed.
+    :raises EnvInterpolationError: If references form a cycle.
+    :return: The variables of the file, see :func:`parse_env_text`.
+    :rtype: IndexedEnv
     """
-    parser = ConfigParser()
-    parser.optionxform = lambda option: option
-    with open(path, "r", encoding="utf-8") as file:
-        try:
-            parser.read_file(file)
-        except MissingSectionHeaderError as err:
-            raise ValueError(
-                "Invalid .ini file: File contains no settings section"
-            ) from err
-        # get alls key values from section settings
-        env_file_val = dict(parser.items("settings"))
-    return env_file_val
+    with _phase("read"):
+        with open(path, "rb") as file:
+            data = file.read()
+    with _phase("parse"):
+        if previous is not None and previous.path == path and previous._index:
+            return _reparse(data, path, previous._index, previous)
+        return _index_env(data, path)
 
 
-def search_env_file(start_path: str) -> str:
-    """Search for a .env file in the current directory and its parent directories.
+def _configparser_error(name: str, *args: Any) -> Exception:
+    """Build a ``configparser`` exception.
 
-    :param start_path: Start directory to search for the .env file.
-    :type start_path: str
-    :raises FileNotFoundError: If no .env file is found.
-    :return: The path to the .env file.
-    :rtype: str
+    The module is imported here so that it is only loaded when a file is
+    actually broken.
+    """
+    import configparser
 
+    return getattr(configparser, name)(*args)
+
+
+def _ini_header(value: str) -> Optional[str]:
+    """Return the section name if a stripped line is a section header."""
+    if value[:1] == "[":
+        end = value.rfind("]")
+        if end >= 2:
+            return value[1:end]
+    return None
+
+
+def _find_ini_headers(text: str, section: str) -> list[int]:
+    """Return the start offsets of the lines holding a given section header.
+
+    An unindented header line is always a header. An indented one may be a
+    continuation line of the option before it instead, which only a scan
+    of the lines before it can tell, see :func:`_ini_header_offsets`.
     """
-    current_dir = os.path.abspath(start_path)
+    needle = f"[{section}]"
+    offsets = []
+    headers: Optional[set[int]] = None
+    found = text.find(needle)
+    while found != -1:
+        line_start = text.rfind("\n", 0, found) + 1
+        line_end = text.find("\n", found)
+        if line_end == -1:
+            line_end = len(text)
+        line = text[line_start:line_end].strip()
+        if line.startswith(needle) and _ini_header(line) == section:
+            if found != line_start:
+                if headers is None:
+                    headers = _ini_header_offsets(text)
+                if line_start not in headers:
+                    line_start = -1
+            if line_start != -1:
+                offsets.append(line_start)
+        found = text.find(needle, found + len(needle))
+    return offsets
 
-    for root, _, files in os.walk(current_dir):
-        for file in files:
-            # Check if it's file ending with .env or is settings.ini
-            if file.endswith(".env") or file == "settings.ini":
-                return os.path.join(root, file)
 
-    parent_dir = os.path.dirname(current_dir)
-    if parent_dir == current_dir:
-        # Reached the root directory, file not found
-        raise FileNotFoundError("No .env file found")
+def _ini_header_offsets(text: str) -> set[int]:
+    """Return the start offsets of all section header lines.
 
-    return search_env_file(parent_dir)
+    Follows the continuation rule of ``ConfigParser._read``: a line indented
+    deeper than the option before it continues that option's value, even if
+    it looks like a header.
+    """
+    offsets = set()
+    indent_level = 0
+    optname: Optional[str] = None
+    in_section = False
+    size = len(text)
+    offset = 0
+    while offset < size:
+        line_end = text.find("\n", offset)
+        if line_end == -1:
+            line_end = size
+        line = text[offset:line_end]
+        value = line.strip()
+        if value and value[0] not in ("#", ";"):
+            cur_indent_level = len(line) - len(line.lstrip())
+            if not (in_section and optname and cur_indent_level > indent_level):
+                indent_level = cur_indent_level
+                if _ini_header(value) is not None:
+                    offsets.add(offset)
+                    in_section = True
+                    optname = None
+                else:
+                    equal = value.find("=")
+                    colon = value.find(":")
+                    if equal != -1 or colon != -1:
+                        delim = colon if equal == -1 or -1 < colon < equal else equal
+                        optname = value[:delim].rstrip()
+        offset = line_end + 1
+    return offsets
 
 
-def cast_bool(value: str) -> bool:
-    """Cast a string to a boolean.
+class IniSettings(Mapping[str, str]):
+    """The ``[settings]`` section of an ini file.
 
-    :param value: The string to cast.
-    :type value: str
-    :return: The boolean value.
-    :rtype: bool
+    Values are interpolated the way ``configparser.BasicInterpolation`` does,
+    but only when first looked up. Options of the ``DEFAULT`` section are
+    included, as with ``ConfigParser.items``.
     """
-    if not isinstance(value, str):
-        return bool(value)
 
-    if value.lower() in ("yes", "true", "t", "1", "on", "y"):
-        return True
-    if value.lower() in ("no", "false", "f", "0", "off", "n", ""):
-        return False
+    def __init__(self, raw: dict[str, str], path: str) -> None:
+        """Wrap the raw values of a section.
 
-    raise ValueError("Invalid boolean value")
+        :param raw: Uninterpolated values, in ``ConfigParser.items`` order.
+        :type raw: dict[str, str]
+        :param path: Path of the ini file, used in error messages.
+        :type path: str
+        """
+        self._raw = raw
+        self._path = path
+        self._resolved: dict[str, str] = {}
 
+    def raw(self, key: str) -> str:
+        """Return a value without interpolation.
 
-def load_env() -> dict[str, str]:
-    """Load environment variables from the .env file or the system environment.
+        :param key: The option name.
+        :type key: str
+        :return: The raw value.
+        :rtype: str
+        """
+        return self._raw[key]
 
-    :raises KeyError: If a required environment variable is not found.
-    :return: A dictionary of environment variables.
-    :rtype: dict[str, str]
+    def __getitem__(self, key: str) -> str:
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        value = self._raw[key]
+        if "%" in value:
+            accum: list[str] = []
+            self._interpolate(key, accum, value, 1)
+            value = "".join(accum)
+        self._resolved[key] = value
+        return value
+
+    def _interpolate(
+        self, option: str, accum: list[str], rest: str, depth: int
+    ) -> None:
+        """Expand ``%%`` and ``%(name)s`` references into ``accum``."""
+        if depth > MAX_INTERPOLATION_DEPTH:
+            raise _configparser_error(
+                "InterpolationDepthError", option, INI_SECTION, self._raw[option]
+            )
+        while rest:
+            pos = rest.find("%")
+            if pos < 0:
+                accum.append(rest)
+                return
+            if pos > 0:
+                accum.append(rest[:pos])
+                rest = rest[pos:]
+            char = rest[1:2]
+            if char == "%":
+                accum.append("%")
+                rest = rest[2:]
+            elif char == "(":
+                end = rest.find(")", 2)
+                if end <= 2 or rest[end + 1 : end + 2] != "s":
+                    raise _configparser_error(
+                        "InterpolationSyntaxError",
+                        option,
+                        INI_SECTION,
+                        f"bad interpolation variable reference {rest!r}",
+                    )
+                var = rest[2:end]
+                rest = rest[end + 2 :]
+                try:
+                    value = self._raw[var]
+                except KeyError:
+                    raise _configparser_error(
+                        "InterpolationMissingOptionError",
+                        option,
+                        INI_SECTION,
+                        self._raw[option],
+                        var,
+                    ) from None
+                if "%" in value:
+                    self._interpolate(option, accum, value, depth + 1)
+                else:
+                    accum.append(value)
+            else:
+                raise _configparser_error(
+                    "InterpolationSyntaxError",
+                    option,
+                    INI_SECTION,
+                    f"'%' must be followed by '%' or '(', found: {rest!r}",
+                )
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._raw
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self._path!r} {len(self._raw)} keys>"
+
+
+def _read_ini_section(
+    text: str,
+    section: str,
+    offset: int,
+    lineno: int,
+    path: str,
+    values: dict[str, list[str]],
+    seen: set[str],
+    errors: list[tuple[int, str]],
+) -> None:
+    """Read the options of the section whose header line starts at ``offset``.
+
+    Mirrors ``ConfigParser._read`` with its default settings: ``=`` and ``:``
+    delimiters, ``#`` and ``;`` full line comments, indented continuation
+    lines and blank lines kept inside values. Stops at the next header.
     """
-    env = {}
-    for key, value in os.environ.items():
-        env[key] = value
+    size = len(text)
+    line_end = text.find("\n", offset)
+    if line_end == -1:
+        line_end = size
+    header = text[offset:line_end]
+    indent_level = len(header) - len(header.lstrip())
+    optname: Optional[str] = None
 
-    try:
-        found_env_path = search_env_file(os.getcwd())
-        if found_env_path.endswith(".ini"):
-            env.update(parse_ini_file(found_env_path))
-        else:
-            env.update(parse_env_file(found_env_path))
-    except FileNotFoundError:
-        pass
-    return env
+    while line_end < size:
+        offset = line_end + 1
+        lineno += 1
+        line_end = text.find("\n", offset)
+        if line_end == -1:
+            line_end = size
+        line = text[offset:line_end]
+        value = line.strip()
 
+        if value[:1] in ("#", ";"):
+            continue
+        if not value:
+            if optname:
+                values[optname].append("")
+            continue
 
-loaded_env = load_env()
+        cur_indent_level = len(line) - len(line.lstrip())
+        if optname and cur_indent_level > indent_level:
+            values[optname].append(value)
+            continue
 
+        indent_level = cur_indent_level
+        if _ini_header(value) is not None:
+            return
 
-def get_env(key: str, cast: type[T] = str, default: Optional[T] = None) -> T:
-    """Load environment variable from the .env file or the system environment.
+        equal = value.find("=")
+        colon = value.find(":")
+        if equal == -1 and colon == -1:
+            errors.append((lineno, line + "\n" if line_end < size else line))
+            continue
+        delim = colon if equal == -1 or -1 < colon < equal else equal
+        optname = value[:delim].rstrip()
+        if not optname:
+            errors.append((lineno, line + "\n" if line_end < size else line))
+        if optname in seen:
+            raise _configparser_error(
+                "DuplicateOptionError", section, optname, path, lineno
+            )
+        seen.add(optname)
+        values[optname] = [value[delim + 1 :].strip()]
 
-    :param key: The environment variable key.
-    :type key: str
-    :param cast: The type to cast the environment variable to, defaults to str
-    :type cast: type, optional
-    :param default: The default value to return if the environment variable is not found, defaults to None
-    :type default: Optional[T], optional
-    :raises KeyError: If the environment variable is not found and is required.
-    :return: The environment variable value.
-    :rtype: str
+
+def parse_ini_text(text: str, path: str = "<string>") -> IniSettings:
+    """Parse the ``[settings]`` section of ini file content.
+
+    Only the ``[settings]`` and ``DEFAULT`` sections are read; the other
+    sections are skipped without being parsed. The result matches
+    ``ConfigParser.items("settings")`` with case preserving option names.
+
+    :param text: The content to parse.
+    :type text: str
+    :param path: File name used in error messages, defaults to "<string>"
+    :type path: str, optional
+    :raises ValueError: If the file does not start with a section header.
+    :return: The settings, interpolated on lookup.
+    :rtype: IniSettings
+    """
+    # The first option or header of the file must be a section header
+    offset = 0
+    lineno = 0
+    size = len(text)
+    while offset < size:
+        line_end = text.find("\n", offset)
+        if line_end == -1:
+            line_end = size
+        lineno += 1
+        value = text[offset:line_end].strip()
+        if value and value[0] not in ("#", ";"):
+            if _ini_header(value) is None:
+                raise ValueError("Invalid .ini file: File contains no settings section")
+            break
+        offset = line_end + 1
+
+    headers = []
+    for section in (INI_DEFAULT_SECTION, INI_SECTION):
+        headers.extend((start, section) for start in _find_ini_headers(text, section))
+    headers.sort()
+
+    sections: dict[str, dict[str, list[str]]] = {INI_DEFAULT_SECTION: {}}
+    seen: dict[str, set[str]] = {INI_DEFAULT_SECTION: set()}
+    errors: list[tuple[int, str]] = []
+    for start, section in headers:
+        header_lineno = text.count("\n", 0, start) + 1
+        if section in sections and section != INI_DEFAULT_SECTION:
+            raise _configparser_error(
+                "DuplicateSectionError", section, path, header_lineno
+            )
+        sections.setdefault(section, {})
+        seen.setdefault(section, set())
+        _read_ini_section(
+            text,
+            section,
+            start,
+            header_lineno,
+            path,
+            sections[section],
+            seen[section],
+            errors,
+        )
+
+    if errors:
+        error = _configparser_error("ParsingError", path)
+        for error_lineno, line in errors:
+            error.append(error_lineno, repr(line))
+        raise error
+    if INI_SECTION not in sections:
+        raise _configparser_error("NoSectionError", INI_SECTION)
+
+    raw = {
+        key: "\n".join(lines).rstrip()
+        for key, lines in sections[INI_DEFAULT_SECTION].items()
+    }
+    raw.update(
+        (key, "\n".join(lines).rstrip()) for key, lines in sections[INI_SECTION].items()
+    )
+    return IniSettings(raw, path)
+
+
+def parse_ini_file(path: str) -> Mapping[str, str]:
+    """Parse a .ini file.
+
+    See :func:`parse_ini_text`, values are interpolated on lookup.
+
+    :param path: Path to the .ini file.
+    :type path: str
+    :raises ValueError: If the file does not start with a section header.
+    :return: A mapping of environment variables.
+    :rtype: Mapping[str, str]
+    """
+    with _phase("read"):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+    with _phase("parse"):
+        return parse_ini_text(text, path)
+
+
+def _find_candidate(
+    directory: str, stop_markers: tuple[str, ...], overlays: tuple[str, ...] = ()
+) -> tuple[Optional[str], dict[str, str], bool, int]:
+    """Look for config files among the direct entries of a directory.
+
+    A plain ``.env`` wins over ``settings.ini``, which wins over any other
+    ``*.env`` file (picked alphabetically) so the result does not depend on
+    directory listing order.
+
+    :param directory: Directory to scan.
+    :type directory: str
+    :param stop_markers: Entry names that mark the top of the search.
+    :type stop_markers: tuple[str, ...]
+    :param overlays: Names of overlay files to collect as well, defaults to ()
+    :type overlays: tuple[str, ...], optional
+    :return: The base config file path or None, the overlay files found by
+        name, whether a stop marker was seen and the number of entries
+        looked at.
+    :rtype: tuple[Optional[str], dict[str, str], bool, int]
     """
+    found = {}
+    found_overlays = {}
+    others = []
+    stop = False
+    count = 0
     try:
-        val = loaded_env[key]
-    except KeyError as err:
-        if default is not None:
-            val = default
-        else:
-            raise KeyError(f"Environment variable {key} is not found") from err
+        with os.scandir(directory) as entries:
+            for count, entry in enumerate(entries, 1):
+                name = entry.name
+                if name in stop_markers:
+                    stop = True
+                if name in (ENV_FILE_NAME, INI_FILE_NAME):
+                    if entry.is_file():
+                        found[name] = entry.path
+                elif overlays and name in overlays:
+                    if entry.is_file():
+                        found_overlays[name] = entry.path
+                elif name.endswith(ENV_FILE_NAME) and entry.is_file():
+                    others.append(name)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None, {}, False, count
+
+    if ENV_FILE_NAME in found:
+        return found[ENV_FILE_NAME], found_overlays, stop, count
+    if INI_FILE_NAME in found:
+        return found[INI_FILE_NAME], found_overlays, stop, count
+    if others:
+        return os.path.join(directory, min(others)), found_overlays, stop, count
+    return None, found_overlays, stop, count
+
+
+def _user_cache_dir() -> str:
+    """Return the per-user cache directory of this library."""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "newenvreader")
+
+
+def _discovery_cache_path() -> Optional[str]:
+    """Return the discovery cache file, or None when the cache is disabled."""
+    setting = os.environ.get(DISCOVERY_CACHE_ENV_VAR)
+    if not setting:
+        return None
+    if setting == "1":
+        setting = _user_cache_dir()
+    return os.path.join(setting, DISCOVERY_CACHE_FILE)
+
+
+def _read_discovery_cache(path: str) -> dict:
+    """Read the discovery cache, returning no entries if it is missing or corrupt."""
+    try:
+        with open(path, "rb") as file:
+            data = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    if (
+        not isinstance(data, tuple)
+        or len(data) != 2
+        or data[0] != DISCOVERY_CACHE_VERSION
+        or not isinstance(data[1], dict)
+    ):
+        return {}
+    return data[1]
+
+
+def _mtime_ns(path: str) -> int:
+    """Return the modification time of a path, or -1 if it cannot be read."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _cached_search(
+    entries: dict, key: tuple
+) -> Optional[tuple[Optional[str], dict[str, str]]]:
+    """Return a cached search result if no directory it looked at changed."""
+    try:
+        found, found_overlays, directories = entries[key]
+        for directory, mtime_ns in directories:
+            if _mtime_ns(directory) != mtime_ns:
+                return None
+        return found, dict(found_overlays)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def clear_discovery_cache() -> None:
+    """Remove the persistent discovery cache, if it is enabled and exists."""
+    path = _discovery_cache_path()
+    if path is not None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _scan(
+    current_dir: str,
+    stop_markers: tuple[str, ...],
+    max_depth: Optional[int],
+    overlays: tuple[str, ...],
+    visited: Optional[list[tuple[str, int]]],
+) -> tuple[Optional[str], dict[str, str], int, int]:
+    """Climb from ``current_dir`` to the first directory holding a config file.
+
+    :return: The base config file or None, the overlay files found, the
+        number of directories scanned and of entries looked at.
+    :rtype: tuple[Optional[str], dict[str, str], int, int]
+    """
+    depth = 0
+    entries = 0
+    while True:
+        if visited is not None:
+            # Taken before the listing, so that a change during it is noticed
+            visited.append((current_dir, _mtime_ns(current_dir)))
+        found, found_overlays, stop, count = _find_candidate(
+            current_dir, stop_markers, overlays
+        )
+        entries += count
+        if found is not None or found_overlays:
+            break
+        if stop or (max_depth is not None and depth >= max_depth):
+            break
+
+        parent_dir = os.path.dirname(current_dir)
+        if parent_dir == current_dir:
+            # Reached the root directory, file not found
+            break
+        current_dir = parent_dir
+        depth += 1
+    return found, found_overlays, depth + 1, entries
+
+
+def _search(
+    start_path: str,
+    stop_markers: tuple[str, ...],
+    max_depth: Optional[int],
+    overlays: tuple[str, ...] = (),
+) -> tuple[Optional[str], dict[str, str]]:
+    """Find the config files for ``start_path``, through the discovery cache.
+
+    With the cache enabled, a stored result is used as long as none of the
+    directories the search listed has a new modification time. Adding,
+    removing or renaming an entry changes it.
+
+    :return: The base config file, or None, and the overlay files found in
+        its directory.
+    :rtype: tuple[Optional[str], dict[str, str]]
+    """
+    instrumentation = _instrumentation
+    if instrumentation is not None:
+        start = time.perf_counter()
+    current_dir = os.path.abspath(start_path)
+    cache_path = _discovery_cache_path()
+
+    hit = None
+    visited: Optional[list[tuple[str, int]]] = None
+    if cache_path is not None:
+        key = (current_dir, tuple(stop_markers), max_depth, tuple(overlays))
+        cache = _read_discovery_cache(cache_path)
+        hit = _cached_search(cache, key)
+        visited = []
+    if hit is not None:
+        found, found_overlays = hit
+        directories = entries = 0
+    else:
+        found, found_overlays, directories, entries = _scan(
+            current_dir, stop_markers, max_depth, overlays, visited
+        )
+
+    if visited:
+        racy = time.time_ns() - DISCOVERY_CACHE_RACY_NS
+        if all(mtime_ns < racy for _, mtime_ns in visited):
+            cache.pop(key, None)
+            while len(cache) >= DISCOVERY_CACHE_SIZE:
+                del cache[next(iter(cache))]
+            cache[key] = (found, found_overlays, tuple(visited))
+            _write_compiled(cache_path, (DISCOVERY_CACHE_VERSION, cache))
+
+    if instrumentation is not None:
+        instrumentation.add_phase("discovery", time.perf_counter() - start)
+        instrumentation.add_discovery(
+            directories,
+            entries,
+            found or next(iter(found_overlays.values()), None),
+        )
+    return found, found_overlays
+
+
+def search_env_file(
+    start_path: str,
+    stop_markers: tuple[str, ...] = DEFAULT_STOP_MARKERS,
+    max_depth: Optional[int] = None,
+) -> str:
+    """Search for a .env file in the current directory and its parent directories.
+
+    Only the start directory and its ancestors are looked at, one directory
+    listing per level; subdirectories are never visited.
+
+    :param start_path: Start directory to search for the .env file.
+    :type start_path: str
+    :param stop_markers: Stop climbing once a directory containing one of
+        these entries (e.g. ``.git``) has been checked, defaults to ()
+    :type stop_markers: tuple[str, ...], optional
+    :param max_depth: Maximum number of parent directories to climb,
+        defaults to None (no limit)
+    :type max_depth: Optional[int], optional
+    :raises FileNotFoundError: If no .env file is found.
+    :return: The path to the .env file.
+    :rtype: str
+
+    """
+    found = _search(start_path, stop_markers, max_depth)[0]
+    if found is None:
+        raise FileNotFoundError("No .env file found")
+    return found
+
+
+def _overlay_names(profile: Optional[str]) -> tuple[str, ...]:
+    """Return the overlay file names for a profile, highest precedence first."""
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV_VAR, "")
+    if not profile:
+        return (LOCAL_FILE_NAME,)
+    if "/" in profile or os.sep in profile or profile in (".", ".."):
+        raise ValueError(f"Invalid profile name: {profile!r}")
+    profile_name = f"{ENV_FILE_NAME}.{profile}"
+    if profile_name == LOCAL_FILE_NAME:
+        return (LOCAL_FILE_NAME,)
+    return (LOCAL_FILE_NAME, profile_name)
+
+
+def search_env_files(
+    start_path: str,
+    profile: Optional[str] = None,
+    stop_markers: tuple[str, ...] = DEFAULT_STOP_MARKERS,
+    max_depth: Optional[int] = None,
+) -> list[tuple[str, str]]:
+    """Search for the base config file and its profile overlays.
+
+    The first directory, climbing from ``start_path``, that holds any of the
+    files is used, and all of them are picked up from that single listing:
+    ``.env.local``, then ``.env.<profile>``, then the base file found by
+    :func:`search_env_file`.
+
+    :param start_path: Start directory of the search.
+    :type start_path: str
+    :param profile: Profile name, defaults to the ``NEWENVREADER_PROFILE``
+        environment variable
+    :type profile: Optional[str], optional
+    :param stop_markers: See :func:`search_env_file`, defaults to ()
+    :type stop_markers: tuple[str, ...], optional
+    :param max_depth: See :func:`search_env_file`, defaults to None
+    :type max_depth: Optional[int], optional
+    :raises FileNotFoundError: If no config file is found.
+    :raises ValueError: If the profile name contains a path separator.
+    :return: ``(layer name, path)`` pairs, highest precedence first. The base
+        file is named ``"file"``, overlays ``"file:<file name>"``.
+    :rtype: list[tuple[str, str]]
+    """
+    overlays = _overlay_names(profile)
+    found, found_overlays = _search(start_path, stop_markers, max_depth, overlays)
+    files = [
+        (f"file:{name}", found_overlays[name])
+        for name in overlays
+        if name in found_overlays
+    ]
+    if found is not None:
+        files.append(("file", found))
+    if not files:
+        raise FileNotFoundError("No .env file found")
+    return files
+
+
+_TRUE_VALUES = frozenset(("yes", "true", "t", "1", "on", "y"))
+_FALSE_VALUES = frozenset(("no", "false", "f", "0", "off", "n", ""))
+
+
+def cast_bool(value: str) -> bool:
+    """Cast a string to a boolean.
+
+    :param value: The string to cast.
+    :type value: str
+    :return: The boolean value.
+    :rtype: bool
+    """
+    if not isinstance(value, str):
+        return bool(value)
+
+    lowered = value.lower()
+    if lowered in _TRUE_VALUES:
+        return True
+    if lowered in _FALSE_VALUES:
+        return False
+
+    raise ValueError("Invalid boolean value")
+
+
+class Json:
+    """Cast marker: ``get_env("KEY", cast=Json)`` parses the value as JSON.
+
+    Objects and arrays are returned as read-only mappings and tuples, so the
+    result can be cached and shared.
+    """
+
+
+def _freeze(value: Any) -> Any:
+    """Turn decoded JSON into read-only containers."""
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: _freeze(val) for key, val in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(val) for val in value)
+    return value
+
+
+def _to_json(value: Any) -> Any:
+    if not isinstance(value, (str, bytes, bytearray)):
+        return _freeze(value)
+    # Imported here to keep importing this module cheap
+    import json
+
+    return _freeze(json.loads(value))
+
+
+_DURATION_UNITS = {
+    "w": 604800.0,
+    "d": 86400.0,
+    "h": 3600.0,
+    "m": 60.0,
+    "min": 60.0,
+    "s": 1.0,
+    "ms": 0.001,
+    "us": 0.000001,
+}
+
+
+def _duration_seconds(value: str) -> float:
+    """Convert ``"90"``, ``"1h30m"``, ``"500ms"`` or ``"01:30:00"`` to seconds."""
+    text = value.strip().lower()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    if ":" in text:
+        parts = text.split(":")
+        if len(parts) > 3:
+            raise ValueError(f"Invalid duration: {value!r}")
+        seconds = 0.0
+        for part, unit in zip(parts, (3600.0, 60.0, 1.0)):
+            seconds += float(part) * unit
+        return seconds
+
+    seconds = 0.0
+    pos = 0
+    length = len(text)
+    while pos < length:
+        start = pos
+        while pos < length and (text[pos].isdigit() or text[pos] == "."):
+            pos += 1
+        number = text[start:pos]
+        start = pos
+        while pos < length and text[pos].isalpha():
+            pos += 1
+        unit = _DURATION_UNITS.get(text[start:pos])
+        if not number or unit is None:
+            raise ValueError(f"Invalid duration: {value!r}")
+        seconds += float(number) * unit
+        while pos < length and text[pos] == " ":
+            pos += 1
+    if not length:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return seconds
+
+
+def _to_timedelta(value: Any) -> Any:
+    from datetime import timedelta
+
+    if isinstance(value, timedelta):
+        return value
+    if isinstance(value, str):
+        value = _duration_seconds(value)
+    return timedelta(seconds=value)
+
+
+def _to_decimal(value: Any) -> Any:
+    import decimal
+
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation as err:
+        raise ValueError(f"Invalid decimal value: {value!r}") from err
+
+
+def _split_items(value: str) -> list[str]:
+    """Split a comma separated value, an empty value has no items."""
+    if not value.strip():
+        return []
+    return [part.strip() for part in value.split(",")]
+
+
+def _sequence_converter(
+    item: Callable[[Any], Any], container: Callable[[Any], Any]
+) -> Callable[[Any], Any]:
+    def convert(value: Any) -> Any:
+        if isinstance(value, str):
+            value = _split_items(value)
+        return container(item(part) for part in value)
+
+    return convert
+
+
+def _fixed_tuple_converter(
+    items: tuple[Callable[[Any], Any], ...],
+) -> Callable[[Any], Any]:
+    def convert(value: Any) -> tuple:
+        parts = _split_items(value) if isinstance(value, str) else tuple(value)
+        if len(parts) != len(items):
+            raise ValueError(f"Expected {len(items)} items, got {len(parts)}")
+        return tuple(item(part) for item, part in zip(items, parts))
+
+    return convert
+
+
+def _mapping_converter(
+    key: Callable[[Any], Any], val: Callable[[Any], Any]
+) -> Callable[[Any], Any]:
+    def convert(value: Any) -> Mapping:
+        if isinstance(value, str):
+            pairs = []
+            for part in _split_items(value):
+                name, sep, item = part.partition("=")
+                if not sep:
+                    raise ValueError(f"Invalid mapping item: {part!r}")
+                pairs.append((name.strip(), item.strip()))
+        elif isinstance(value, Mapping):
+            pairs = value.items()
+        else:
+            pairs = value
+        return types.MappingProxyType({key(name): val(item) for name, item in pairs})
+
+    return convert
+
+
+def _generic_converter(cast: Any) -> Callable[[Any], Any]:
+    """Build the converter of a parameterized type such as ``list[int]``."""
+    origin = typing.get_origin(cast)
+    args = typing.get_args(cast)
+    if origin is typing.Union or origin is types.UnionType:
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) == 1:
+            return _resolve_cast(members[0])
+    elif origin in (list, tuple, Sequence):
+        if origin is tuple and args and not (len(args) == 2 and args[1] is ...):
+            return _fixed_tuple_converter(tuple(_resolve_cast(arg) for arg in args))
+        return _sequence_converter(_resolve_cast(args[0] if args else str), tuple)
+    elif origin in (set, frozenset, typing.AbstractSet):
+        return _sequence_converter(_resolve_cast(args[0] if args else str), frozenset)
+    elif origin in (dict, Mapping):
+        key, val = args if args else (str, str)
+        return _mapping_converter(_resolve_cast(key), _resolve_cast(val))
+    raise TypeError(f"Unsupported cast: {cast!r}")
+
+
+# Converters for types that are not called directly
+_CASTS: dict[Any, Callable[[Any], Any]] = {bool: cast_bool, Json: _to_json}
+# Converters for standard library types, keyed by name so that their
+# modules are only imported by callers that use them
+_NAMED_CASTS: dict[str, Callable[[Any], Any]] = {
+    "datetime.timedelta": _to_timedelta,
+    "decimal.Decimal": _to_decimal,
+}
+# Resolved converter of the registered casts, types and generics seen so far
+_resolved_casts: dict[Any, Callable[[Any], Any]] = {}
+
+
+def _resolve_cast(cast: Any) -> Callable[[Any], Any]:
+    """Find the converter of a cast, and remember it unless it is a plain callable.
+
+    Plain callables, such as a lambda built for each call, are their own
+    converter and cheap to resolve again, and remembering them would keep
+    every one of them alive.
+    """
+    converter = _CASTS.get(cast)
+    if converter is None:
+        if typing.get_origin(cast) is not None:
+            converter = _generic_converter(cast)
+        else:
+            name = (
+                f"{getattr(cast, '__module__', '')}.{getattr(cast, '__qualname__', '')}"
+            )
+            converter = _NAMED_CASTS.get(name, cast)
+            if not isinstance(cast, type):
+                return converter
+    _resolved_casts[cast] = converter
+    return converter
+
+
+def register_cast(cast: Any, converter: Callable[[Any], Any]) -> None:
+    """Use ``converter`` whenever ``cast`` is passed to :func:`get_env`.
+
+    The converter also applies to items of generics, e.g. ``list[cast]``. It
+    should return immutable values, since results are cached and shared.
+
+    :param cast: A type, a parameterized generic or any hashable marker.
+    :type cast: Any
+    :param converter: Called with the raw value, or with the default.
+    :type converter: Callable[[Any], Any]
+    """
+    _CASTS[cast] = converter
+    _resolved_casts.clear()
+    clear_get_env_cache()
+
+
+def _cast(value: Any, cast: Callable[[Any], T]) -> T:
+    """Cast a value with the rules of :func:`get_env`."""
+    try:
+        converter = _resolved_casts[cast]
+    except KeyError:
+        converter = _resolve_cast(cast)
+    except TypeError:
+        # Unhashable casts are called directly
+        return cast(value)
+    return converter(value)
+
+
+def _compiled_cache_path(path: str, cache_dir: str) -> str:
+    """Return where the compiled snapshot of a config file is stored."""
+    import hashlib
+
+    name = hashlib.blake2b(path.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, name + COMPILED_CACHE_SUFFIX)
+
+
+def _read_compiled(cache_path: str) -> Optional[tuple]:
+    """Read a compiled snapshot, returning None if it is missing or corrupt."""
+    try:
+        with open(cache_path, "rb") as file:
+            entry = marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (
+        not isinstance(entry, tuple)
+        or len(entry) != 6
+        or entry[0] != COMPILED_CACHE_VERSION
+        or not isinstance(entry[5], dict)
+    ):
+        return None
+    return entry
+
+
+def _write_compiled(cache_path: str, entry: tuple) -> None:
+    """Atomically replace a marshalled cache file, ignoring any I/O error."""
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(marshal.dumps(entry))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def parse_config_file(path: str, cache_dir: Optional[str] = None) -> Mapping[str, str]:
+    """Parse a .env or settings.ini file, through the compiled cache if enabled.
+
+    With a cache directory, the parsed values are stored in a marshal file
+    keyed by the source path, its ``st_mtime_ns``, size and content hash.
+    Later calls, from any process, return the stored values without parsing
+    as long as that key still matches. .env files with ``${VAR}`` references
+    are not cached, since their values depend on the environment. Ini values
+    are stored uninterpolated and still expanded on first lookup. Cache files
+    are replaced atomically, so concurrent readers see either the old or the
+    new entry.
+
+    :param path: Path to the config file.
+    :type path: str
+    :param cache_dir: Directory holding compiled snapshots, defaults to None
+        (no caching)
+    :type cache_dir: Optional[str], optional
+    :return: A mapping of environment variables.
+    :rtype: Mapping[str, str]
+    """
+    ini = path.endswith(".ini")
+    if cache_dir is None:
+        return parse_ini_file(path) if ini else parse_env_file(path)
+
+    # Imported here to keep importing this module cheap
+    import hashlib
+
+    source = path
+    path = os.path.abspath(path)
+    with _phase("read"):
+        with open(path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            data = file.read()
+        # Expanded values depend on os.environ, which is not part of the key
+        cacheable = ini or b"${" not in data
+        if cacheable:
+            digest = hashlib.blake2b(data).digest()
+            cache_path = _compiled_cache_path(path, cache_dir)
+            entry = _read_compiled(cache_path)
+    if (
+        cacheable
+        and entry is not None
+        and entry[1:5] == (path, stat.st_mtime_ns, stat.st_size, digest)
+    ):
+        return IniSettings(entry[5], source) if ini else entry[5]
+
+    # Parse the bytes read above, the file may have changed since
+    with _phase("parse"):
+        text = _decode_text(data)
+        if ini:
+            values = parse_ini_text(text, source)
+        else:
+            values = parse_env_text(text, source)
+    if not cacheable:
+        return values
+    _write_compiled(
+        cache_path,
+        (
+            COMPILED_CACHE_VERSION,
+            path,
+            stat.st_mtime_ns,
+            stat.st_size,
+            digest,
+            # Ini values are interpolated on lookup, like an uncached parse
+            values._raw if ini else values,
+        ),
+    )
+    return values
+
+
+class LayeredEnv(Mapping[str, str]):
+    """Read-only view over several named sources, like ``ChainMap``.
+
+    A key is looked up in each layer in order and the first hit wins. The
+    layers are not merged into a copy; instead each resolved key is
+    remembered, together with the name of the layer that supplied it.
+    """
+
+    def __init__(self, layers: Sequence[tuple[str, Mapping[str, str]]]) -> None:
+        """Create the view.
+
+        :param layers: ``(name, mapping)`` pairs, highest precedence first.
+        :type layers: Sequence[tuple[str, Mapping[str, str]]]
+        """
+        self.layers = tuple(layers)
+        self._values: dict[str, str] = {}
+        self._sources: dict[str, str] = {}
+
+    def _resolve(self, key: str) -> str:
+        for name, layer in self.layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                self._sources[key] = name
+                self._values[key] = value
+                return value
+        raise KeyError(key)
+
+    def __getitem__(self, key: str) -> str:
+        try:
+            return self._values[key]
+        except KeyError:
+            return self._resolve(key)
+
+    def source_of(self, key: str) -> str:
+        """Return the name of the layer that supplies a key.
+
+        :param key: The environment variable key.
+        :type key: str
+        :raises KeyError: If no layer has the key.
+        :return: The layer name, e.g. ``"file"`` or ``"system"``.
+        :rtype: str
+        """
+        if key not in self._sources:
+            self._resolve(key)
+        return self._sources[key]
+
+    def select(self, keys: Iterable[str]) -> dict[str, str]:
+        """Look several keys up at once.
+
+        Each layer is asked for all the keys still missing in one go, and
+        ``os.environ`` is scanned once instead of failing a lookup per key.
+
+        :param keys: The environment variable keys.
+        :type keys: Iterable[str]
+        :return: The keys that are set, with their values.
+        :rtype: dict[str, str]
+        """
+        values = self._values
+        found = {}
+        pending = set()
+        for key in keys:
+            value = values.get(key, _MISSING)
+            if value is _MISSING:
+                pending.add(key)
+            else:
+                found[key] = value
+
+        for name, layer in self.layers:
+            if not pending:
+                break
+            if layer is os.environ:
+                hits = pending.intersection(layer)
+            else:
+                hits = {key for key in pending if key in layer}
+            for key in hits:
+                found[key] = values[key] = layer[key]
+                self._sources[key] = name
+            pending -= hits
+        return found
+
+    def with_prefix(self, prefix: str) -> dict[str, str]:
+        """Return the keys starting with ``prefix`` in any layer, with their values.
+
+        :class:`CompactEnv` layers answer from their sorted index, other
+        layers are scanned.
+
+        :param prefix: The key prefix, e.g. ``"TENANT_42_"``.
+        :type prefix: str
+        :return: The matching keys and the values that win for them.
+        :rtype: dict[str, str]
+        """
+        found: dict[str, str] = {}
+        # Lowest precedence first, so that higher layers overwrite
+        for _, layer in reversed(self.layers):
+            if isinstance(layer, CompactEnv):
+                found.update(layer.with_prefix(prefix))
+            else:
+                found.update(
+                    (key, value)
+                    for key, value in layer.items()
+                    if key.startswith(prefix)
+                )
+        return found
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._values:
+            return True
+        return any(key in layer for _, layer in self.layers)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(
+            dict.fromkeys(
+                itertools.chain.from_iterable(layer for _, layer in self.layers)
+            )
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        names = ", ".join(name for name, _ in self.layers)
+        return f"<{type(self).__name__} layers=({names})>"
+
+
+class CompactEnv(Mapping[str, str]):
+    """Read-only mapping packing many keys and values into two buffers.
+
+    Keys and values are stored UTF-8 encoded, back to back, in one ``bytes``
+    object each, with arrays of offsets, and the keys are kept sorted. This
+    avoids the per-entry overhead of a dict of ``str`` objects for
+    configurations with tens of thousands of keys, and keeps keys sharing a
+    prefix next to each other, see :meth:`with_prefix`. A lookup binary
+    searches the keys and decodes only the value it finds.
+    """
+
+    def __init__(self, values: Mapping[str, str]) -> None:
+        """Pack a mapping.
+
+        :param values: The keys and values to store.
+        :type values: Mapping[str, str]
+        """
+        from array import array
+
+        # UTF-8 preserves code point order, so the encoded keys stay sorted
+        keys = sorted(values)
+        chunks = [key.encode("utf-8") for key in keys]
+        self._keys = b"".join(chunks)
+        self._key_offsets = array("I" if len(self._keys) < 1 << 32 else "Q", [0])
+        self._key_offsets.extend(itertools.accumulate(map(len, chunks)))
+        chunks = [values[key].encode("utf-8") for key in keys]
+        self._data = b"".join(chunks)
+        self._offsets = array("I" if len(self._data) < 1 << 32 else "Q", [0])
+        self._offsets.extend(itertools.accumulate(map(len, chunks)))
+        self._count = len(keys)
+
+    def _lower_bound(self, target: bytes) -> int:
+        """Return the position of the first key not sorting before ``target``."""
+        keys = self._keys
+        offsets = self._key_offsets
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if keys[offsets[mid] : offsets[mid + 1]] < target:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _find(self, key: str) -> int:
+        """Return the position of a key, or -1."""
+        target = key.encode("utf-8")
+        pos = self._lower_bound(target)
+        if pos < self._count:
+            offsets = self._key_offsets
+            if self._keys[offsets[pos] : offsets[pos + 1]] == target:
+                return pos
+        return -1
+
+    def _key(self, pos: int) -> str:
+        offsets = self._key_offsets
+        return self._keys[offsets[pos] : offsets[pos + 1]].decode("utf-8")
+
+    def _value(self, pos: int) -> str:
+        offsets = self._offsets
+        return self._data[offsets[pos] : offsets[pos + 1]].decode("utf-8")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if not isinstance(key, str):
+            return default
+        pos = self._find(key)
+        return default if pos < 0 else self._value(pos)
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._key, range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def with_prefix(self, prefix: str) -> dict[str, str]:
+        """Return the keys starting with ``prefix``, with their values.
+
+        The matching keys are found by binary search, without looking at the
+        other keys.
+
+        :param prefix: The key prefix, e.g. ``"TENANT_42_"``.
+        :type prefix: str
+        :return: The matching keys and values, sorted by key.
+        :rtype: dict[str, str]
+        """
+        target = prefix.encode("utf-8")
+        keys = self._keys
+        offsets = self._key_offsets
+        found = {}
+        for pos in range(self._lower_bound(target), self._count):
+            key = keys[offsets[pos] : offsets[pos + 1]]
+            if not key.startswith(target):
+                break
+            found[key.decode("utf-8")] = self._value(pos)
+        return found
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self._count} keys>"
+
+
+class SecretsDir(Mapping[str, str]):
+    """Read-only mapping over a directory holding one file per secret.
+
+    This is how Docker (``/run/secrets``) and Kubernetes volumes expose
+    secrets: the file name is the key and its content the value. The
+    directory is listed once, and a file is only read when its key is first
+    looked up, so memory and I/O grow with the keys actually used. Names
+    starting with a dot, such as the ``..data`` link Kubernetes swaps on
+    rotation, are ignored.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        strip: bool = True,
+        previous: Optional["SecretsDir"] = None,
+    ) -> None:
+        """List the directory, without reading any secret.
+
+        :param path: The secrets directory. A missing directory has no keys.
+        :type path: str
+        :param strip: Remove trailing newlines from the values, defaults to True
+        :type strip: bool, optional
+        :param previous: An older view of the same directory, whose values
+            are reused for the files that did not change, defaults to None
+        :type previous: Optional[SecretsDir], optional
+        """
+        self.path = os.path.abspath(path)
+        self.strip = strip
+        self._signature = file_signature(self.path)
+        try:
+            with os.scandir(self.path) as entries:
+                self._names = frozenset(
+                    entry.name for entry in entries if entry.name[0] != "."
+                )
+        except (FileNotFoundError, NotADirectoryError):
+            self._names = frozenset()
+        # Values read so far, with the signature of the file they came from
+        self._values: dict[str, tuple[tuple[int, int, int], str]] = {}
+        if previous is not None and previous.path == self.path:
+            for name, (signature, value) in list(previous._values.items()):
+                if name in self._names and signature == file_signature(
+                    os.path.join(self.path, name)
+                ):
+                    self._values[name] = (signature, value)
+
+    def _read(self, name: str) -> Any:
+        try:
+            with open(os.path.join(self.path, name), "rb") as file:
+                stat = os.fstat(file.fileno())
+                value = file.read().decode("utf-8")
+        except (FileNotFoundError, IsADirectoryError):
+            return _MISSING
+        if self.strip:
+            value = value.rstrip("\r\n")
+        self._values[name] = ((stat.st_mtime_ns, stat.st_size, stat.st_ino), value)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self._names:
+            return default
+        cached = self._values.get(key)
+        if cached is not None:
+            return cached[1]
+        value = self._read(key)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def unread(self) -> frozenset[str]:
+        """Return the keys whose file has not been read.
+
+        :return: The unread keys.
+        :rtype: frozenset[str]
+        """
+        return self._names - self._values.keys()
+
+    def has_changed(self) -> bool:
+        """Check whether the directory or any secret read so far changed.
+
+        Takes one ``stat`` of the directory, which catches files being added
+        or removed and the symlink swap of a Kubernetes rotation, and one per
+        secret read, which catches files replaced in place.
+
+        :return: True if the directory should be listed again.
+        :rtype: bool
+        """
+        if file_signature(self.path) != self._signature:
+            return True
+        return any(
+            file_signature(os.path.join(self.path, name)) != signature
+            for name, (signature, _) in list(self._values.items())
+        )
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.path!r} {len(self._names)} keys>"
+
+
+# Idle keep-alive connections by (scheme, host, port), shared by all sources
+_http_connections: dict[tuple[str, str, int], list[Any]] = {}
+_http_connections_lock = threading.Lock()
+
+
+def _forget_http_connections() -> None:
+    """Drop the pool in a forked child, which must not share its parent's sockets."""
+    global _http_connections_lock
+    _http_connections.clear()
+    # The lock may have been held by another thread of the parent
+    _http_connections_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_http_connections)
+
+
+def _http_connection(key: tuple[str, str, int], timeout: float) -> tuple[Any, bool]:
+    """Take an idle connection to a server, or open a new one.
+
+    :return: The connection and whether it was used before.
+    """
+    with _http_connections_lock:
+        idle = _http_connections.get(key)
+        conn = idle.pop() if idle else None
+    if conn is not None:
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    # Imported here to keep importing this module cheap
+    import http.client
+
+    scheme, host, port = key
+    if scheme == "https":
+        return http.client.HTTPSConnection(host, port, timeout=timeout), False
+    return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+
+def _release_connection(key: tuple[str, str, int], conn: Any) -> None:
+    """Keep a connection whose response was fully read, for the next request."""
+    with _http_connections_lock:
+        _http_connections.setdefault(key, []).append(conn)
+
+
+def close_http_connections() -> None:
+    """Close the idle connections kept by :class:`HttpSource`."""
+    with _http_connections_lock:
+        idle = [conn for conns in _http_connections.values() for conn in conns]
+        _http_connections.clear()
+    for conn in idle:
+        conn.close()
+
+
+def _remote_cache_path(url: str) -> str:
+    """Return the default last-known-good copy of a config URL."""
+    # Imported here to keep importing this module cheap
+    import hashlib
+
+    digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+    return os.path.join(_user_cache_dir(), f"remote-{digest}{REMOTE_CACHE_SUFFIX}")
+
+
+class HttpSource(Mapping[str, str]):
+    """Read-only mapping over config values served by an HTTP(S) endpoint.
+
+    The body is parsed as a .env file, or as a JSON object when the
+    response has a JSON content type; JSON values that are not strings are
+    kept as JSON text. Each successful response is saved, with its ETag, as
+    a last-known-good copy on disk. Requests are conditional on that ETag,
+    so an unchanged config costs a ``304 Not Modified``, and reuse
+    keep-alive connections. When the server fails or does not answer
+    within ``timeout``, the copy is used instead and :attr:`stale` is set.
+    When a copy exists, it is served right away and revalidated in the
+    background, so that creating the source never waits for the server.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        cache_path: Optional[str] = None,
+        timeout: float = REMOTE_TIMEOUT,
+        headers: Optional[Mapping[str, str]] = None,
+        previous: Optional["HttpSource"] = None,
+    ) -> None:
+        """Load the last-known-good copy, or fetch the config if there is none.
+
+        :param url: The ``http://`` or ``https://`` URL of the config.
+        :type url: str
+        :param cache_path: File for the last-known-good copy, defaults to a
+            file named after the URL in the user cache directory
+        :type cache_path: Optional[str], optional
+        :param timeout: Seconds to wait for a whole request, name lookup
+            included, defaults to 2
+        :type timeout: float, optional
+        :param headers: Extra request headers, e.g. ``Authorization``,
+            defaults to None
+        :type headers: Optional[Mapping[str, str]], optional
+        :param previous: An older view of the same URL. Its values and ETag
+            are reused, and so is a response fetched by its
+            :meth:`has_changed`, defaults to None
+        :type previous: Optional[HttpSource], optional
+        :raises ValueError: If the URL is not an HTTP(S) URL.
+        """
+        # Imported here to keep importing this module cheap
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Not an HTTP(S) URL: {url!r}")
+        default_port = 443 if parts.scheme == "https" else 80
+        self._key = (parts.scheme, parts.hostname, parts.port or default_port)
+        self._target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.url = url
+        self.cache_path = (
+            cache_path if cache_path is not None else _remote_cache_path(url)
+        )
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.etag: Optional[str] = None
+        #: Whether the values may be out of date: the last request failed,
+        #: the copy served at startup is not revalidated yet, or a newer
+        #: config is waiting for the next view
+        self.stale = False
+        #: The error of the last failed request, if any
+        self.error: Optional[BaseException] = None
+        self._body: Optional[bytes] = None
+        self._values: Mapping[str, str] = {}
+        # A newer response fetched by has_changed(), for the next view
+        self._fetched: Optional[tuple[Optional[str], str, bytes]] = None
+        self._revalidation: Optional[threading.Thread] = None
+
+        if previous is not None and previous.url == url:
+            self.etag = previous.etag
+            self._body = previous._body
+            self._values = previous._values
+            fetched, previous._fetched = previous._fetched, None
+            if fetched is not None:
+                self._refresh(fetched)
+                return
+        else:
+            self._read_copy()
+            if self._body is not None:
+                # Until the server confirms it, the copy may be out of date
+                self.stale = True
+                self._revalidation = threading.Thread(
+                    target=self._revalidate, name="newenvreader-remote", daemon=True
+                )
+                self._revalidation.start()
+                return
+        self._refresh()
+
+    def _read_copy(self) -> None:
+        try:
+            with open(self.cache_path, "rb") as file:
+                version, url, etag, content_type, body = marshal.loads(file.read())
+            if version != REMOTE_CACHE_VERSION or url != self.url:
+                return
+            values = self._parse(content_type, body)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        self.etag, self._body, self._values = etag, body, values
+
+    def _parse(self, content_type: str, body: bytes) -> Mapping[str, str]:
+        text = body.decode("utf-8")
+        if "json" not in content_type:
+            return parse_env_text(text, self.url)
+
+        import json
+
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError(f"{self.url}: expected a JSON object")
+        return {
+            key: value if isinstance(value, str) else json.dumps(value)
+            for key, value in data.items()
+        }
+
+    def _request_within_timeout(self) -> Optional[tuple[Optional[str], str, bytes]]:
+        """Send a conditional GET, giving up after ``timeout`` seconds in total.
+
+        Socket timeouts only bound each operation, and the name lookup has
+        none, so the request runs in a thread that is waited for instead.
+        A request given up on finishes in the background and is ignored.
+        """
+        result: dict[str, Any] = {}
+
+        def run() -> None:
+            try:
+                result["fetched"] = self._request()
+            except BaseException as err:
+                result["error"] = err
+
+        thread = threading.Thread(target=run, name="newenvreader-http", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise TimeoutError(f"{self.url}: no response within {self.timeout}s")
+        if "error" in result:
+            raise result["error"]
+        return result["fetched"]
+
+    def _request(self) -> Optional[tuple[Optional[str], str, bytes]]:
+        """Send a conditional GET.
+
+        :return: None if our copy is current, else the ETag, content type
+            and body of the new config.
+        """
+        import http.client
+
+        headers = {"Accept": "text/plain, application/json", **self.headers}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        for attempt in range(2):
+            conn, reused = _http_connection(self._key, self.timeout)
+            try:
+                conn.request("GET", self._target, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as err:
+                conn.close()
+                # The server may have closed a kept-alive connection meanwhile
+                if reused and not attempt and isinstance(err, ConnectionError):
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+            else:
+                _release_connection(self._key, conn)
+            break
+
+        if response.status == 304:
+            return None
+        if response.status != 200:
+            raise OSError(f"{self.url}: HTTP {response.status} {response.reason}")
+        content_type = response.headers.get("Content-Type", "")
+        return response.headers.get("ETag"), content_type, body
+
+    def _refresh(self, fetched: Any = _MISSING) -> None:
+        """Apply a fetched response, or fetch one, keeping our values on failure."""
+        import http.client
+
+        try:
+            if fetched is _MISSING:
+                with _phase("fetch"):
+                    fetched = self._request_within_timeout()
+            if fetched is not None:
+                etag, content_type, body = fetched
+                # Only a body that parses becomes the last-known-good copy
+                self._values = self._parse(content_type, body)
+                self.etag, self._body = etag, body
+                _write_compiled(
+                    self.cache_path,
+                    (REMOTE_CACHE_VERSION, self.url, etag, content_type, body),
+                )
+        except (OSError, http.client.HTTPException, ValueError) as err:
+            self.stale = True
+            self.error = err
+        else:
+            self.stale = False
+            self.error = None
+
+    def _revalidate(self) -> None:
+        """Check the copy served at startup, keeping a newer config for later."""
+        import http.client
+
+        try:
+            changed = self._check()
+        except (OSError, http.client.HTTPException) as err:
+            self.error = err
+        else:
+            self.error = None
+            self.stale = changed
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the copy served at startup has been revalidated.
+
+        :param timeout: Seconds to wait at most, defaults to None (no limit)
+        :type timeout: Optional[float], optional
+        :return: False if the revalidation is still running.
+        :rtype: bool
+        """
+        thread = self._revalidation
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def __getitem__(self, key: str) -> str:
+        return self._values[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def has_changed(self) -> bool:
+        """Ask the server whether the config changed since it was fetched.
+
+        Costs one conditional request, answered with an empty ``304`` while
+        the config is unchanged. A new config is kept for the next view
+        created with ``previous=self``, which does not fetch it again. When
+        the server cannot be reached, the current values are kept and this
+        returns False.
+
+        :return: True if the config should be loaded again.
+        :rtype: bool
+        """
+        import http.client
+
+        if self._fetched is not None:
+            # Already fetched by the revalidation of the copy
+            return True
+        try:
+            return self._check()
+        except (OSError, http.client.HTTPException) as err:
+            self.error = err
+            return False
+
+    def _check(self) -> bool:
+        """Body of :meth:`has_changed` that raises request errors."""
+        with _phase("fetch"):
+            fetched = self._request_within_timeout()
+        if fetched is None:
+            return False
+        if fetched[2] == self._body:
+            # Same content, possibly from a server without ETags
+            self.etag = fetched[0]
+            return False
+        self._fetched = fetched
+        return True
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.url!r} {len(self._values)} keys>"
+
+
+def _reparse_config_file(
+    path: str, cache_dir: Optional[str], previous: Optional[Mapping[str, str]]
+) -> Mapping[str, str]:
+    """Parse a config file again, incrementally if it is a large .env file.
+
+    The first reload of a large file builds the index that later reloads
+    use, so that processes which never reload do not pay for it.
+    """
+    if isinstance(previous, IndexedEnv) and previous.path == path:
+        return parse_env_file_incremental(path, previous)
+    if previous is not None and not path.endswith(".ini"):
+        try:
+            large = os.path.getsize(path) >= INCREMENTAL_PARSE_MIN_BYTES
+        except OSError:
+            large = False
+        if large:
+            return parse_env_file_incremental(path)
+    return parse_config_file(path, cache_dir)
+
+
+def _parse_files(
+    paths: Sequence[str],
+    cache_dir: Optional[str],
+    previous: Optional[Sequence[Optional[Mapping[str, str]]]] = None,
+) -> list[Mapping[str, str]]:
+    """Parse config files, in a thread pool when they are large.
+
+    ``previous`` holds the values each file had before a reload.
+    """
+    olds = previous if previous is not None else [None] * len(paths)
+
+    def parse(path: str, old: Optional[Mapping[str, str]]) -> Mapping[str, str]:
+        return _reparse_config_file(path, cache_dir, old)
+
+    if len(paths) > 1:
+        size = 0
+        for path in paths:
+            try:
+                size += os.stat(path).st_size
+            except OSError:
+                pass
+        if size >= PARALLEL_PARSE_MIN_BYTES:
+            # Imported here to keep importing this module cheap
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+                return list(pool.map(parse, paths, olds))
+    return [parse(path, old) for path, old in zip(paths, olds)]
+
+
+def _load_env(
+    start_path: Optional[str] = None,
+    stop_markers: tuple[str, ...] = DEFAULT_STOP_MARKERS,
+    max_depth: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    precedence: Sequence[str] = DEFAULT_PRECEDENCE,
+    overrides: Optional[Mapping[str, str]] = None,
+    defaults: Optional[Mapping[str, str]] = None,
+    profile: Optional[str] = None,
+    compact: bool = False,
+    secrets_dir: Optional[str] = None,
+    remote_url: Optional[str] = None,
+    remote_cache: Optional[str] = None,
+    remote_timeout: float = REMOTE_TIMEOUT,
+    remote_headers: Optional[Mapping[str, str]] = None,
+    file_source: Optional[tuple[Sequence[tuple[str, Any]], Mapping[str, str]]] = None,
+    previous: Optional[LayeredEnv] = None,
+) -> tuple[LayeredEnv, list[tuple[str, Optional[tuple[int, int, int]]]]]:
+    """Body of :func:`load_env` that also returns the config files used.
+
+    Each file is returned with its :func:`file_signature`, taken before it
+    was read, so that a write landing during the parse is seen as a change.
+    ``file_source`` is a ``(files, values)`` pair used as the only file
+    layer instead of searching for and parsing the config files.
+    ``previous`` is the environment being replaced, whose secrets are reused
+    when their files did not change, and whose remote config is revalidated
+    instead of fetched again.
+    """
+    unknown = set(precedence) - set(DEFAULT_PRECEDENCE)
+    if unknown:
+        raise ValueError(f"Unknown layers in precedence: {sorted(unknown)}")
+
+    file_layers: list[tuple[str, Mapping[str, str]]] = []
+    signed: list[tuple[str, Optional[tuple[int, int, int]]]] = []
+    if "file" in precedence and file_source is not None:
+        signed = list(file_source[0])
+        file_layers.append(("file", file_source[1]))
+    elif "file" in precedence:
+        try:
+            files = search_env_files(
+                start_path if start_path is not None else os.getcwd(),
+                profile=profile,
+                stop_markers=stop_markers,
+                max_depth=max_depth,
+            )
+        except FileNotFoundError:
+            pass
+        else:
+            if cache_dir is None:
+                cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+            paths = [path for _, path in files]
+            signed = [(path, file_signature(path)) for path in paths]
+            olds = None
+            if previous is not None and not compact:
+                old_layers = dict(previous.layers)
+                olds = [old_layers.get(name) for name, _ in files]
+            parsed = _parse_files(paths, cache_dir or None, olds)
+            if compact:
+                parsed = [CompactEnv(values) for values in parsed]
+            file_layers = [(name, values) for (name, _), values in zip(files, parsed)]
+
+    secrets = None
+    if "secrets" in precedence and secrets_dir is not None:
+        old = dict(previous.layers).get("secrets") if previous is not None else None
+        secrets = SecretsDir(
+            secrets_dir, previous=old if isinstance(old, SecretsDir) else None
+        )
+
+    remote = None
+    if "remote" in precedence and remote_url is not None:
+        old = dict(previous.layers).get("remote") if previous is not None else None
+        remote = HttpSource(
+            remote_url,
+            cache_path=remote_cache,
+            timeout=remote_timeout,
+            headers=remote_headers,
+            previous=old if isinstance(old, HttpSource) else None,
+        )
+
+    sources: dict[str, Optional[Mapping[str, str]]] = {
+        "overrides": overrides,
+        "system": os.environ,
+        "secrets": secrets,
+        "remote": remote,
+        "defaults": defaults,
+    }
+    with _phase("merge"):
+        layers = []
+        for name in precedence:
+            if name == "file":
+                layers.extend(layer for layer in file_layers if layer[1])
+            elif name in ("secrets", "remote"):
+                # Kept while empty, so that has_changed() keeps polling them
+                if sources[name] is not None:
+                    layers.append((name, sources[name]))
+            elif sources[name]:
+                layers.append((name, sources[name]))
+        env = LayeredEnv(layers)
+    return env, signed
+
+
+def load_env(
+    start_path: Optional[str] = None,
+    stop_markers: tuple[str, ...] = DEFAULT_STOP_MARKERS,
+    max_depth: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    precedence: Sequence[str] = DEFAULT_PRECEDENCE,
+    overrides: Optional[Mapping[str, str]] = None,
+    defaults: Optional[Mapping[str, str]] = None,
+    profile: Optional[str] = None,
+    compact: bool = False,
+    secrets_dir: Optional[str] = None,
+    remote_url: Optional[str] = None,
+    remote_cache: Optional[str] = None,
+    remote_timeout: float = REMOTE_TIMEOUT,
+    remote_headers: Optional[Mapping[str, str]] = None,
+) -> LayeredEnv:
+    """Load environment variables from the .env file or the system environment.
+
+    Nothing is copied: the result looks keys up in the explicit overrides,
+    the config files, ``os.environ``, the secret files, the remote config and
+    the defaults, in the order given by ``precedence``. ``os.environ`` is read when a key is
+    first looked up.
+
+    The config files are the base file and, next to it, the optional
+    ``.env.<profile>`` and ``.env.local`` overlays, see
+    :func:`search_env_files`. Each one is a layer of its own, so
+    :meth:`LayeredEnv.source_of` tells which file a key came from.
+
+    :param start_path: Directory to start searching for the config file from,
+        defaults to the current working directory
+    :type start_path: Optional[str], optional
+    :param stop_markers: Passed to :func:`search_env_file`, defaults to ()
+    :type stop_markers: tuple[str, ...], optional
+    :param max_depth: Passed to :func:`search_env_file`, defaults to None
+    :type max_depth: Optional[int], optional
+    :param cache_dir: Directory for compiled config snapshots, see
+        :func:`parse_config_file`, defaults to the ``NEWENVREADER_CACHE_DIR``
+        environment variable
+    :type cache_dir: Optional[str], optional
+    :param precedence: Layer names, highest precedence first. Leaving a layer
+        out disables it, defaults to
+        ``("overrides", "file", "system", "secrets", "remote", "defaults")``
+    :type precedence: Sequence[str], optional
+    :param overrides: Values for the ``overrides`` layer, defaults to None
+    :type overrides: Optional[Mapping[str, str]], optional
+    :param defaults: Values for the ``defaults`` layer, defaults to None
+    :type defaults: Optional[Mapping[str, str]], optional
+    :param profile: Selects the ``.env.<profile>`` overlay, defaults to the
+        ``NEWENVREADER_PROFILE`` environment variable
+    :type profile: Optional[str], optional
+    :param compact: Store the config files as :class:`CompactEnv` instead of
+        dicts, to save memory with very many keys, defaults to False
+    :type compact: bool, optional
+    :param secrets_dir: Directory of secret files for the ``secrets`` layer,
+        see :class:`SecretsDir`, defaults to None
+    :type secrets_dir: Optional[str], optional
+    :param remote_url: URL of the config for the ``remote`` layer, see
+        :class:`HttpSource`, defaults to None
+    :type remote_url: Optional[str], optional
+    :param remote_cache: File for the last-known-good copy of the remote
+        config, defaults to one in the user cache directory
+    :type remote_cache: Optional[str], optional
+    :param remote_timeout: Seconds a request for the remote config may take
+        in total before falling back to the copy, defaults to 2
+    :type remote_timeout: float, optional
+    :param remote_headers: Extra headers for the remote config request,
+        defaults to None
+    :type remote_headers: Optional[Mapping[str, str]], optional
+    :raises ValueError: If ``precedence`` names an unknown layer, or
+        ``remote_url`` is not an HTTP(S) URL.
+    :return: A read-only mapping of environment variables.
+    :rtype: LayeredEnv
+    """
+    return _load_env(
+        start_path,
+        stop_markers=stop_markers,
+        max_depth=max_depth,
+        cache_dir=cache_dir,
+        precedence=precedence,
+        overrides=overrides,
+        defaults=defaults,
+        profile=profile,
+        compact=compact,
+        secrets_dir=secrets_dir,
+        remote_url=remote_url,
+        remote_cache=remote_cache,
+        remote_timeout=remote_timeout,
+        remote_headers=remote_headers,
+    )[0]
+
+
+async def async_load_env(
+    start_path: Optional[str] = None, executor: Optional[Any] = None, **options: Any
+) -> LayeredEnv:
+    """Run :func:`load_env` in an executor, without blocking the event loop.
+
+    :param start_path: See :func:`load_env`, defaults to the current working
+        directory
+    :type start_path: Optional[str], optional
+    :param executor: Thread pool to load in, defaults to the event loop's
+        default executor
+    :type executor: Optional[concurrent.futures.Executor], optional
+    :param options: Keyword arguments passed on to :func:`load_env`.
+    :return: A read-only mapping of environment variables.
+    :rtype: LayeredEnv
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(load_env, start_path, **options)
+    )
+
+
+def file_signature(path: str) -> Optional[tuple[int, int, int]]:
+    """Return a cheap change marker for a file.
+
+    :param path: Path to the file.
+    :type path: str
+    :return: ``(st_mtime_ns, st_size, st_ino)`` or None if the file is gone.
+    :rtype: Optional[tuple[int, int, int]]
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def diff_env(old: Mapping[str, str], new: Mapping[str, str]) -> frozenset[str]:
+    """Return the keys that were added, removed or changed between two envs.
+
+    :param old: The previous environment.
+    :type old: Mapping[str, str]
+    :param new: The new environment.
+    :type new: Mapping[str, str]
+    :return: The changed keys.
+    :rtype: frozenset[str]
+    """
+    keys = _diff_candidates(old, new)
+    if keys is None:
+        changed = old.keys() ^ new.keys()
+        keys = old.keys() & new.keys()
+    else:
+        changed = set()
+    # Secrets nobody read are not read just to compare them
+    unread = _unread_secrets(old) & _unread_secrets(new)
+    for key in keys:
+        if key in unread:
+            if (key in old) != (key in new):
+                changed.add(key)
+        elif _peek(old, key) != _peek(new, key):
+            changed.add(key)
+    return frozenset(changed)
+
+
+def _peek(env: Mapping[str, str], key: str) -> Any:
+    """Look a key up without a :class:`LayeredEnv` remembering it as used."""
+    if not isinstance(env, LayeredEnv):
+        return env.get(key, _MISSING)
+    value = env._values.get(key, _MISSING)
+    if value is _MISSING:
+        for _, layer in env.layers:
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                break
+    return value
+
+
+def _diff_candidates(
+    old: Mapping[str, str], new: Mapping[str, str]
+) -> Optional[set[str]]:
+    """Return the only keys that may differ between two similar environments.
+
+    That is the keys looked up in ``old``, since a layer shared by both,
+    like ``os.environ``, may have changed since, and the keys of the layers
+    that were replaced, or only the changed ones for a layer parsed
+    incrementally from the old one. Returns None when the layers differ.
+    """
+    if not isinstance(old, LayeredEnv) or not isinstance(new, LayeredEnv):
+        return None
+    if [name for name, _ in old.layers] != [name for name, _ in new.layers]:
+        return None
+    keys = set(old._values)
+    for (_, before), (_, after) in zip(old.layers, new.layers):
+        if after is before:
+            continue
+        if (
+            isinstance(after, IndexedEnv)
+            and after.changed is not None
+            and after._base == id(before)
+        ):
+            keys.update(after.changed)
+        else:
+            keys.update(before)
+            keys.update(after)
+    return keys
+
+
+def _unread_secrets(env: Mapping[str, str]) -> set[str]:
+    """Return the keys of ``env`` that would be read from an unread secret file."""
+    unread: set[str] = set()
+    if isinstance(env, LayeredEnv):
+        for index, (_, layer) in enumerate(env.layers):
+            if isinstance(layer, SecretsDir):
+                keys = set(layer.unread())
+                for _, higher in env.layers[:index]:
+                    keys = {key for key in keys if key not in higher}
+                unread |= keys
+    return unread
+
+
+def write_snapshot(
+    values: Mapping[str, str], path: str, meta: Optional[dict] = None
+) -> None:
+    """Write values to a snapshot file that :class:`EnvSnapshot` can map.
+
+    The file holds a small header, the ``meta`` dict, an index of
+    ``(key offset, key length, value offset, value length)`` entries sorted
+    by key, and the UTF-8 encoded keys and values.
+
+    :param values: The values to store.
+    :type values: Mapping[str, str]
+    :param path: Where to write the snapshot.
+    :type path: str
+    :param meta: Marshallable data stored next to the values, defaults to None
+    :type meta: Optional[dict], optional
+    """
+    from array import array
+
+    items = sorted(
+        (key.encode("utf-8"), value.encode("utf-8")) for key, value in values.items()
+    )
+    meta_bytes = marshal.dumps(meta or {})
+    meta_bytes += b"\0" * (-len(meta_bytes) % 4)
+    offset = 16 + len(meta_bytes) + 16 * len(items)
+    index = array("I")
+    for key, value in items:
+        index.extend((offset, len(key), offset + len(key), len(value)))
+        offset += len(key) + len(value)
+
+    with open(path, "wb") as file:
+        file.write(SNAPSHOT_MAGIC)
+        file.write(array("I", (SNAPSHOT_VERSION, len(items), len(meta_bytes))))
+        file.write(meta_bytes)
+        file.write(index)
+        for key, value in items:
+            file.write(key)
+            file.write(value)
+
+
+class EnvSnapshot(Mapping[str, str]):
+    """Read-only mapping over a memory-mapped snapshot file.
+
+    Nothing is parsed or copied when the file is opened. A lookup binary
+    searches the sorted index and decodes only the value it finds, so every
+    process mapping the file shares the same pages.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Map a file written by :func:`write_snapshot`.
+
+        :param path: Path to the snapshot.
+        :type path: str
+        :raises ValueError: If the file is not a snapshot of this version.
+        """
+        import mmap
+
+        with open(path, "rb") as file:
+            self._buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        buf = self._buf
+        try:
+            if buf[:4] != SNAPSHOT_MAGIC or len(buf) < 16:
+                raise ValueError(f"{path} is not a snapshot")
+            with memoryview(buf)[4:16].cast("I") as header:
+                version, count, meta_length = header
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"{path} has unsupported version {version}")
+            self.meta = marshal.loads(buf[16 : 16 + meta_length])
+            if not isinstance(self.meta, dict):
+                raise ValueError(f"{path} has invalid metadata")
+            start = 16 + meta_length
+            end = start + 16 * count
+            if end > len(buf):
+                raise ValueError(f"{path} is truncated")
+        except (ValueError, EOFError, TypeError) as err:
+            buf.close()
+            raise ValueError(str(err)) from err
+        self._count = count
+        self._index = memoryview(buf)[start:end].cast("I")
+
+    def _find(self, key: str) -> int:
+        """Return the position of a key in the index, or -1."""
+        target = key.encode("utf-8")
+        buf = self._buf
+        index = self._index
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            base = mid * 4
+            offset = index[base]
+            probe = buf[offset : offset + index[base + 1]]
+            if probe < target:
+                low = mid + 1
+            elif probe > target:
+                high = mid
+            else:
+                return base
+        return -1
+
+    def get(self, key: str, default: Any = None) -> Any:
+        base = self._find(key)
+        if base < 0:
+            return default
+        offset = self._index[base + 2]
+        return self._buf[offset : offset + self._index[base + 3]].decode("utf-8")
+
+    def __getitem__(self, key: str) -> str:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        buf = self._buf
+        index = self._index
+        for base in range(0, self._count * 4, 4):
+            offset = index[base]
+            yield buf[offset : offset + index[base + 1]].decode("utf-8")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        """Unmap the file, the mapping cannot be used afterwards."""
+        self._index.release()
+        self._buf.close()
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.path!r} {self._count} keys>"
+
+
+def _remove_snapshot(path: str, pid: int) -> None:
+    """Delete a snapshot at exit, only in the process that created it."""
+    if os.getpid() == pid:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _OverrideFrame:
+    """One :func:`override` block, linked to the block it is nested in."""
+
+    __slots__ = ("values", "parent", "token", "_view")
+
+    def __init__(
+        self, values: Mapping[str, str], parent: Optional["_OverrideFrame"]
+    ) -> None:
+        self.values = values
+        self.parent = parent
+        # Restores the parent in the context that entered this block
+        self.token: Optional[contextvars.Token] = None
+        # (base environment, view over it), rebuilt when the base is swapped
+        self._view: Optional[tuple[LayeredEnv, LayeredEnv]] = None
+
+    def view(self, base: LayeredEnv) -> LayeredEnv:
+        """Return ``base`` with the values of this block and its parents on top."""
+        cached = self._view
+        if cached is not None and cached[0] is base:
+            return cached[1]
+        layers = []
+        frame: Optional[_OverrideFrame] = self
+        while frame is not None:
+            layers.append(("context", frame.values))
+            frame = frame.parent
+        view = LayeredEnv(layers + list(base.layers))
+        self._view = (base, view)
+        return view
+
+
+# Innermost active override() block of the current thread or task
+_context_overrides: contextvars.ContextVar[Optional[_OverrideFrame]] = (
+    contextvars.ContextVar("newenvreader_overrides", default=None)
+)
+
+
+def _encode_environ(values: Mapping[str, str]) -> dict:
+    """Encode an environment the way :mod:`subprocess` would for each child.
+
+    Every value of every layer is read, including each file of a
+    :class:`SecretsDir`.
+    """
+    if isinstance(values, LayeredEnv):
+        merged: dict[str, str] = {}
+        # Lowest precedence first, so that higher layers overwrite, and
+        # without remembering every key as looked up
+        for _, layer in reversed(values.layers):
+            if isinstance(layer, dict):
+                merged.update(layer)
+                continue
+            # Lazy layers may lose a key between listing and reading it,
+            # e.g. a secret file that was deleted meanwhile
+            get = layer.get
+            for key in layer:
+                value = get(key, _MISSING)
+                if value is not _MISSING:
+                    merged[key] = value
+        merged.update(values._values)
+        values = merged
+    if not os.supports_bytes_environ:
+        return dict(values)
+    fsencode = os.fsencode
+    return {fsencode(key): fsencode(value) for key, value in values.items()}
+
+
+class LazyEnv(Mapping[str, str]):
+    """Read-only mapping that runs :func:`load_env` on first access.
+
+    Loading is thread-safe: concurrent first accesses share a single load.
+    The loaded environment is an immutable snapshot. :meth:`reload` builds a
+    new snapshot and swaps it in with a single assignment, so readers never
+    take a lock and never see a partially built environment.
+    """
+
+    def __init__(self, start_path: Optional[str] = None, **options: Any) -> None:
+        """Create the proxy without loading anything.
+
+        :param start_path: Directory to start the config file search from,
+            defaults to the current working directory at load time
+        :type start_path: Optional[str], optional
+        :param options: Keyword arguments passed on to :func:`load_env`.
+        """
+        self._start_path = start_path
+        self._options = options
+        self._lock = threading.RLock()
+        self._env: Optional[LayeredEnv] = None
+        # (path, signature) of each config file read, highest precedence first
+        self._files: tuple[tuple[str, Optional[tuple[int, int, int]]], ...] = ()
+        # Replaced, never mutated, so that it can be read without the lock
+        self._subscribers: tuple[Callable[[frozenset[str]], Any], ...] = ()
+        # Guards the subscribers and the loads running in an executor
+        self._pending_lock = threading.Lock()
+        self._pending: dict[Any, tuple[Any, Any]] = {}
+        self._shared_path: Optional[str] = None
+        # (snapshot, encoded environment, read-only view) for subprocess_env()
+        self._spawn_env: Optional[tuple[LayeredEnv, dict, Mapping]] = None
+        # Bumped on every swap, used to key cached get_env results
+        self.generation = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the environment has been materialized."""
+        return self._env is not None
+
+    @property
+    def path(self) -> Optional[str]:
+        """The base config file the current snapshot was read from, if any."""
+        return self._files[-1][0] if self._files else None
+
+    @property
+    def paths(self) -> tuple[str, ...]:
+        """All config files the current snapshot was read from."""
+        return tuple(path for path, _ in self._files)
+
+    def _start_dir(self) -> str:
+        return os.path.abspath(
+            self._start_path if self._start_path is not None else os.getcwd()
+        )
+
+    def _discovery(self) -> dict:
+        """The options deciding which config files are read, as shared."""
+        profile = self._options.get("profile")
+        return {
+            "start_dir": self._start_dir(),
+            "profile": (
+                os.environ.get(PROFILE_ENV_VAR, "") if profile is None else profile
+            ),
+            "stop_markers": tuple(
+                self._options.get("stop_markers", DEFAULT_STOP_MARKERS)
+            ),
+            "max_depth": self._options.get("max_depth"),
+        }
+
+    def _attach(self) -> Optional[EnvSnapshot]:
+        """Map the snapshot shared by a parent process, if it applies to us.
+
+        The snapshot is only used when it was taken for the same start
+        directory, profile and discovery options, and none of its config
+        files changed since.
+        """
+        snapshot_path = os.environ.get(SNAPSHOT_ENV_VAR)
+        if not snapshot_path:
+            return None
+        with _phase("attach"):
+            try:
+                snapshot = EnvSnapshot(snapshot_path)
+            except (OSError, ValueError):
+                return None
+            meta = snapshot.meta
+            files = meta.get("files", ())
+            if any(
+                meta.get(key) != value for key, value in self._discovery().items()
+            ) or any(file_signature(path) != signature for path, signature in files):
+                snapshot.close()
+                return None
+        return snapshot
+
+    def _build(self) -> tuple[LayeredEnv, tuple]:
+        snapshot = self._attach()
+        if snapshot is not None:
+            env, files = _load_env(
+                self._start_path,
+                file_source=(snapshot.meta["files"], snapshot),
+                previous=self._env,
+                **self._options,
+            )
+            return env, tuple(files)
+
+        env, files = _load_env(self._start_path, previous=self._env, **self._options)
+        return env, tuple(files)
+
+    def load(self) -> LayeredEnv:
+        """Materialize the environment if needed and return it.
+
+        :return: The loaded environment.
+        :rtype: LayeredEnv
+        """
+        env = self._env
+        if env is None:
+            with self._lock:
+                env = self._env
+                if env is None:
+                    env, self._files = self._build()
+                    self._env = env
+        return env
+
+    def current(self) -> LayeredEnv:
+        """Return the environment as seen from the current context.
+
+        This is the loaded environment, with the values of the active
+        :func:`override` blocks on top.
+
+        :return: The environment for the current thread or task.
+        :rtype: LayeredEnv
+        """
+        env = self._env
+        if env is None:
+            env = self.load()
+        frame = _context_overrides.get()
+        if frame is None:
+            return env
+        return frame.view(env)
+
+    def configure(self, start_path: Optional[str] = None, **options: Any) -> None:
+        """Change the load options and drop the loaded environment, if any.
+
+        :param start_path: New start directory for the config file search.
+        :type start_path: Optional[str], optional
+        :param options: Keyword arguments passed on to :func:`load_env`.
+        """
+        with self._lock:
+            self._start_path = start_path
+            self._options = options
+            self._env = None
+            self._files = ()
+            self.generation += 1
+        clear_get_env_cache()
+
+    def source_of(self, key: str) -> str:
+        """Return the name of the layer that supplies a key.
+
+        :param key: The environment variable key.
+        :type key: str
+        :raises KeyError: If no layer has the key.
+        :return: The layer name.
+        :rtype: str
+        """
+        return self.current().source_of(key)
+
+    def has_changed(self) -> bool:
+        """Check with one ``stat`` per config file whether any of them changed.
+
+        The secrets directory and the remote config, if any, are checked as
+        well, see :meth:`SecretsDir.has_changed` and
+        :meth:`HttpSource.has_changed`. When no config file was found,
+        discovery runs again instead. Overlay
+        files created after loading are only picked up by
+        ``reload(force=True)``.
+
+        :return: True if the environment should be reloaded.
+        :rtype: bool
+        """
+        env = self._env
+        if env is None:
+            return True
+        if any(
+            layer.has_changed()
+            for _, layer in env.layers
+            if isinstance(layer, (SecretsDir, HttpSource))
+        ):
+            return True
+        if not self._files:
+            try:
+                search_env_files(
+                    self._start_path if self._start_path is not None else os.getcwd(),
+                    profile=self._options.get("profile"),
+                    stop_markers=self._options.get(
+                        "stop_markers", DEFAULT_STOP_MARKERS
+                    ),
+                    max_depth=self._options.get("max_depth"),
+                )
+            except FileNotFoundError:
+                return False
+            return True
+        return any(file_signature(path) != signature for path, signature in self._files)
+
+    def reload(self, force: bool = False) -> frozenset[str]:
+        """Re-read the config file if it changed and swap in the new snapshot.
+
+        Subscribers are called with the changed keys after the swap.
+
+        :param force: Reload even if the file looks unchanged, defaults to False
+        :type force: bool, optional
+        :return: The keys that were added, removed or changed.
+        :rtype: frozenset[str]
+        """
+        with self._lock:
+            if not force and not self.has_changed():
+                return frozenset()
+            old = self._env
+            env, files = self._build()
+            self._env = env
+            self._files = files
+            self.generation += 1
+            subscribers = self._subscribers
+        clear_get_env_cache()
+
+        changed = diff_env(old, env) if old is not None else frozenset(env)
+        if changed:
+            for callback in subscribers:
+                callback(changed)
+        return changed
+
+    def subscribe(
+        self, callback: Callable[[frozenset[str]], Any]
+    ) -> Callable[[], None]:
+        """Call ``callback`` with the changed keys after every reload.
+
+        :param callback: Called with a frozenset of changed keys.
+        :type callback: Callable[[frozenset[str]], Any]
+        :return: A function that removes the subscription.
+        :rtype: Callable[[], None]
+        """
+        with self._pending_lock:
+            self._subscribers += (callback,)
+
+        def unsubscribe() -> None:
+            with self._pending_lock:
+                subscribers = list(self._subscribers)
+                if callback in subscribers:
+                    subscribers.remove(callback)
+                    self._subscribers = tuple(subscribers)
+
+        return unsubscribe
+
+    def share(self, directory: Optional[str] = None) -> str:
+        """Write the config file values to a snapshot for child processes.
+
+        The snapshot path is exported in the ``NEWENVREADER_SNAPSHOT``
+        environment variable. Child processes started afterwards, whether
+        forked or spawned, map the file instead of searching for and parsing
+        the config file. The file is removed when this process exits.
+
+        :param directory: Where to write the snapshot, defaults to
+            ``/dev/shm`` if available, else the temporary directory
+        :type directory: Optional[str], optional
+        :return: The path of the snapshot.
+        :rtype: str
+        """
+        # Imported here to keep importing this module cheap
+        import atexit
+        import tempfile
+
+        with self._lock:
+            env = self.load()
+            file_values: dict[str, str] = {}
+            # Merge the file layers, lowest precedence first
+            for name, layer in reversed(env.layers):
+                if name == "file" or name.startswith("file:"):
+                    file_values.update(layer)
+            meta = {**self._discovery(), "files": self._files}
+        if directory is None:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        fd, path = tempfile.mkstemp(
+            prefix="newenvreader-", suffix=".snap", dir=directory
+        )
+        os.close(fd)
+        write_snapshot(file_values, path, meta)
+        atexit.register(_remove_snapshot, path, os.getpid())
+
+        os.environ[SNAPSHOT_ENV_VAR] = path
+        # Children spawned from now on must see the snapshot path
+        self._spawn_env = None
+        # Snapshots shared earlier by this process are no longer needed
+        if self._shared_path is not None:
+            _remove_snapshot(self._shared_path, os.getpid())
+        self._shared_path = path
+        return path
+
+    def subprocess_env(self, extra: Optional[Mapping[str, str]] = None) -> Mapping:
+        """Return the environment to pass to a child process.
+
+        The result holds every key of the current snapshot, encoded with
+        :func:`os.fsencode` where the platform supports bytes environments,
+        and can be passed as ``env`` to :mod:`subprocess` or
+        :func:`os.posix_spawn`. It is built once per snapshot: later calls
+        only pay for ``extra`` and the active :func:`override` blocks, which
+        are encoded on top of a copy. Changes made to ``os.environ`` after
+        the first call are not seen until the next reload, pass them as
+        ``extra`` instead.
+
+        Building it reads every value of every source, each secret file and
+        the remote config included, whether the child uses them or not.
+        Secret files deleted since the directory was listed are left out.
+
+        :param extra: Values to add for this child only, defaults to None
+        :type extra: Optional[Mapping[str, str]], optional
+        :return: A read-only mapping when there is nothing to add, else a
+            new dict.
+        :rtype: Mapping
+        """
+        env = self._env
+        if env is None:
+            env = self.load()
+        cached = self._spawn_env
+        if cached is None or cached[0] is not env:
+            encoded = _encode_environ(env)
+            cached = (env, encoded, types.MappingProxyType(encoded))
+            self._spawn_env = cached
+        frame = _context_overrides.get()
+        if frame is None and not extra:
+            return cached[2]
+
+        result = dict(cached[1])
+        frames = []
+        while frame is not None:
+            frames.append(frame.values)
+            frame = frame.parent
+        # Outermost block first, so that inner blocks win
+        for values in reversed(frames):
+            result.update(_encode_environ(values))
+        if extra:
+            result.update(_encode_environ(extra))
+        return result
+
+    def watch(self, interval: float = 1.0) -> "EnvWatcher":
+        """Start a daemon thread that polls for changes and reloads.
+
+        :param interval: Seconds between polls, defaults to 1.0
+        :type interval: float, optional
+        :return: The started watcher.
+        :rtype: EnvWatcher
+        """
+        watcher = EnvWatcher(self, interval)
+        watcher.start()
+        return watcher
+
+    async def _in_executor(
+        self, name: Any, func: Callable[[], T], executor: Optional[Any]
+    ) -> T:
+        """Run ``func`` in ``executor``, joining the same call if one is running.
+
+        The shared future is shielded, so that a cancelled caller does not
+        cancel the work for the others.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        with self._pending_lock:
+            pending = self._pending.get(name)
+            if pending is not None and pending[0] is loop:
+                future = pending[1]
+            else:
+                future = loop.run_in_executor(executor, func)
+                self._pending[name] = (loop, future)
+                future.add_done_callback(functools.partial(self._done, name))
+        return await asyncio.shield(future)
+
+    def _done(self, name: Any, future: Any) -> None:
+        with self._pending_lock:
+            pending = self._pending.get(name)
+            if pending is not None and pending[1] is future:
+                del self._pending[name]
+
+    async def aload(self, executor: Optional[Any] = None) -> LayeredEnv:
+        """Like :meth:`load`, but discovery and parsing run in an executor.
+
+        Concurrent calls wait for the same load.
+
+        :param executor: Thread pool to load in, defaults to the event loop's
+            default executor
+        :type executor: Optional[concurrent.futures.Executor], optional
+        :return: The loaded environment.
+        :rtype: LayeredEnv
+        """
+        env = self._env
+        if env is not None:
+            return env
+        return await self._in_executor("load", self.load, executor)
+
+    async def areload(
+        self, force: bool = False, executor: Optional[Any] = None
+    ) -> frozenset[str]:
+        """Like :meth:`reload`, but the files are checked and read in an executor.
+
+        Concurrent calls wait for the same reload and get the same keys.
+
+        :param force: Reload even if the files look unchanged, defaults to False
+        :type force: bool, optional
+        :param executor: Thread pool to reload in, defaults to the event
+            loop's default executor
+        :type executor: Optional[concurrent.futures.Executor], optional
+        :return: The keys that were added, removed or changed.
+        :rtype: frozenset[str]
+        """
+        return await self._in_executor(
+            ("reload", force), functools.partial(self.reload, force), executor
+        )
+
+    async def changes(self) -> AsyncIterator[frozenset[str]]:
+        """Yield the changed keys after every reload, from any thread.
+
+        Reloads are only seen once iteration has started.
+
+        :return: An async iterator of frozensets of changed keys.
+        :rtype: AsyncIterator[frozenset[str]]
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[frozenset[str]] = asyncio.Queue()
+
+        def callback(changed: frozenset[str]) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, changed)
+            except RuntimeError:
+                # The event loop is closed
+                pass
+
+        unsubscribe = self.subscribe(callback)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            unsubscribe()
+
+    def awatch(
+        self, interval: float = 1.0, executor: Optional[Any] = None
+    ) -> "AsyncEnvWatcher":
+        """Poll the config files from the running event loop, see :meth:`watch`.
+
+        :param interval: Seconds between polls, defaults to 1.0
+        :type interval: float, optional
+        :param executor: Thread pool to reload in, defaults to the event
+            loop's default executor
+        :type executor: Optional[concurrent.futures.Executor], optional
+        :return: The started watcher.
+        :rtype: AsyncEnvWatcher
+        """
+        watcher = AsyncEnvWatcher(self, interval, executor)
+        watcher.start()
+        return watcher
+
+    def __getitem__(self, key: str) -> str:
+        env = self._env
+        if env is None or _context_overrides.get() is not None:
+            env = self.current()
+        return env[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.current()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.current())
+
+    def __len__(self) -> int:
+        return len(self.current())
+
+    def __repr__(self) -> str:
+        if self._env is None:
+            return f"<{type(self).__name__} (not loaded)>"
+        return f"<{type(self).__name__} {len(self._env)} keys>"
+
+
+class EnvWatcher(threading.Thread):
+    """Daemon thread that reloads a :class:`LazyEnv` when its file changes."""
+
+    def __init__(self, env: LazyEnv, interval: float = 1.0) -> None:
+        """Create the watcher, call :meth:`start` to run it.
+
+        :param env: The environment to keep up to date.
+        :type env: LazyEnv
+        :param interval: Seconds between polls, defaults to 1.0
+        :type interval: float, optional
+        """
+        super().__init__(name="newenvreader-watcher", daemon=True)
+        self.env = env
+        self.interval = interval
+        # The last error raised by a reload, the old snapshot is kept meanwhile
+        self.error: Optional[Exception] = None
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.env.reload()
+            except Exception as err:
+                self.error = err
+            else:
+                self.error = None
+
+    def stop(self) -> None:
+        """Stop polling and wait for the thread to exit."""
+        self._stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+
+class AsyncEnvWatcher:
+    """Asyncio task that reloads a :class:`LazyEnv` when its files change.
+
+    Every poll runs in an executor, so the event loop is never blocked.
+    """
+
+    def __init__(
+        self, env: LazyEnv, interval: float = 1.0, executor: Optional[Any] = None
+    ) -> None:
+        """Create the watcher, call :meth:`start` from the event loop to run it.
+
+        :param env: The environment to keep up to date.
+        :type env: LazyEnv
+        :param interval: Seconds between polls, defaults to 1.0
+        :type interval: float, optional
+        :param executor: Thread pool to reload in, defaults to the event
+            loop's default executor
+        :type executor: Optional[concurrent.futures.Executor], optional
+        """
+        self.env = env
+        self.interval = interval
+        self.executor = executor
+        # The last error raised by a reload, the old snapshot is kept meanwhile
+        self.error: Optional[Exception] = None
+        self._task: Optional[Any] = None
+
+    def start(self) -> None:
+        """Start polling in a task of the running event loop."""
+        import asyncio
+
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="newenvreader-watcher"
+        )
+
+    async def _run(self) -> None:
+        import asyncio
+
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.env.areload(executor=self.executor)
+            except Exception as err:
+                self.error = err
+            else:
+                self.error = None
+
+    async def stop(self) -> None:
+        """Stop polling and wait for the task to exit."""
+        import asyncio
+
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+# The working directory is captured at import so that the lazy load resolves
+# the config file the same way the old import-time load did.
+loaded_env = LazyEnv(os.getcwd())
+
+
+def preload() -> Mapping[str, str]:
+    """Load the environment now instead of on the first :func:`get_env` call.
+
+    :return: The loaded environment.
+    :rtype: Mapping[str, str]
+    """
+    return loaded_env.load()
+
+
+def source_of(key: str) -> str:
+    """Return which layer of :data:`loaded_env` supplies a key.
+
+    :param key: The environment variable key.
+    :type key: str
+    :raises KeyError: If the key is not set anywhere.
+    :return: The layer name, e.g. ``"overrides"``, ``"file"``, ``"system"``,
+        ``"secrets"``, ``"remote"`` or ``"defaults"``.
+    :rtype: str
+    """
+    return loaded_env.source_of(key)
+
+
+def get_prefixed(prefix: str) -> dict[str, str]:
+    """Return the variables of :data:`loaded_env` whose key starts with ``prefix``.
+
+    Load the environment with ``configure(compact=True)`` to find the keys
+    of the config files without scanning all of them.
+
+    :param prefix: The key prefix, e.g. ``"TENANT_42_"``.
+    :type prefix: str
+    :return: The matching keys and their values.
+    :rtype: dict[str, str]
+    """
+    return loaded_env.current().with_prefix(prefix)
+
+
+def reload_env(force: bool = False) -> frozenset[str]:
+    """Reload :data:`loaded_env` if any of its config files changed.
+
+    :param force: Reload even if the file looks unchanged, defaults to False
+    :type force: bool, optional
+    :return: The keys that were added, removed or changed.
+    :rtype: frozenset[str]
+    """
+    return loaded_env.reload(force)
+
+
+def subscribe(callback: Callable[[frozenset[str]], Any]) -> Callable[[], None]:
+    """Call ``callback`` with the changed keys whenever :data:`loaded_env` reloads.
+
+    :param callback: Called with a frozenset of changed keys.
+    :type callback: Callable[[frozenset[str]], Any]
+    :return: A function that removes the subscription.
+    :rtype: Callable[[], None]
+    """
+    return loaded_env.subscribe(callback)
+
+
+def subprocess_env(
+    extra: Optional[Mapping[str, str]] = None, /, **kwargs: str
+) -> Mapping:
+    """Return the environment of :data:`loaded_env` for a child process.
+
+    Pass the result as ``env`` to :mod:`subprocess` or :func:`os.posix_spawn`.
+    It is encoded once per snapshot, see :meth:`LazyEnv.subprocess_env`.
+
+    .. code-block:: python
+
+        subprocess.run(["worker"], env=subprocess_env(JOB_ID=job_id))
+
+    :param extra: Values to add for this child only, defaults to None
+    :type extra: Optional[Mapping[str, str]], optional
+    :param kwargs: More values to add, as keyword arguments.
+    :return: The environment, encoded for the platform.
+    :rtype: Mapping
+    """
+    if kwargs:
+        extra = {**extra, **kwargs} if extra else kwargs
+    return loaded_env.subprocess_env(extra)
+
+
+def share_env(directory: Optional[str] = None) -> str:
+    """Share the config file of :data:`loaded_env` with child processes.
+
+    Call it in the parent before starting workers, see :meth:`LazyEnv.share`.
+
+    :param directory: Where to write the snapshot, defaults to
+        ``/dev/shm`` if available, else the temporary directory
+    :type directory: Optional[str], optional
+    :return: The path of the snapshot.
+    :rtype: str
+    """
+    return loaded_env.share(directory)
+
+
+def watch(interval: float = 1.0) -> EnvWatcher:
+    """Poll the config file of :data:`loaded_env` and reload it on change.
+
+    :param interval: Seconds between polls, defaults to 1.0
+    :type interval: float, optional
+    :return: The started watcher, call its ``stop`` method to end polling.
+    :rtype: EnvWatcher
+    """
+    return loaded_env.watch(interval)
+
+
+async def aload(executor: Optional[Any] = None) -> Mapping[str, str]:
+    """Load :data:`loaded_env` without blocking the event loop.
+
+    Await it at startup so that later :func:`get_env` calls, which never
+    block once the environment is loaded, do not load it on the event loop.
+
+    :param executor: Thread pool to load in, defaults to the event loop's
+        default executor
+    :type executor: Optional[concurrent.futures.Executor], optional
+    :return: The loaded environment.
+    :rtype: Mapping[str, str]
+    """
+    return await loaded_env.aload(executor)
+
+
+async def areload_env(
+    force: bool = False, executor: Optional[Any] = None
+) -> frozenset[str]:
+    """Reload :data:`loaded_env` in an executor if any of its files changed.
+
+    :param force: Reload even if the files look unchanged, defaults to False
+    :type force: bool, optional
+    :param executor: Thread pool to reload in, defaults to the event loop's
+        default executor
+    :type executor: Optional[concurrent.futures.Executor], optional
+    :return: The keys that were added, removed or changed.
+    :rtype: frozenset[str]
+    """
+    return await loaded_env.areload(force, executor)
+
+
+def changes() -> AsyncIterator[frozenset[str]]:
+    """Iterate over the keys changed by each reload of :data:`loaded_env`.
+
+    :return: An async iterator of frozensets of changed keys.
+    :rtype: AsyncIterator[frozenset[str]]
+    """
+    return loaded_env.changes()
+
+
+def awatch(interval: float = 1.0, executor: Optional[Any] = None) -> AsyncEnvWatcher:
+    """Poll the config files of :data:`loaded_env` from the running event loop.
+
+    :param interval: Seconds between polls, defaults to 1.0
+    :type interval: float, optional
+    :param executor: Thread pool to reload in, defaults to the event loop's
+        default executor
+    :type executor: Optional[concurrent.futures.Executor], optional
+    :return: The started watcher, await its ``stop`` method to end polling.
+    :rtype: AsyncEnvWatcher
+    """
+    return loaded_env.awatch(interval, executor)
+
+
+def configure(start_path: Optional[str] = None, **options: Any) -> None:
+    """Set the options used to load :data:`loaded_env`.
+
+    The environment is loaded again, with the new options, on next access.
+
+    :param start_path: Directory to start the config file search from,
+        defaults to the current working directory at load time
+    :type start_path: Optional[str], optional
+    :param options: Keyword arguments passed on to :func:`load_env`.
+    """
+    loaded_env.configure(start_path, **options)
+
+
+class EnvOverride:
+    """Context manager and decorator returned by :func:`override`."""
+
+    def __init__(self, values: Mapping[str, str]) -> None:
+        """Create the override, nothing is applied until it is entered.
+
+        :param values: The values to layer over the environment.
+        :type values: Mapping[str, str]
+        """
+        self.values = values
+
+    def __enter__(self) -> "EnvOverride":
+        # The token lives on a frame of its own, not on this object, which
+        # may be entered from several threads or tasks at once
+        frame = _OverrideFrame(self.values, _context_overrides.get())
+        frame.token = _context_overrides.set(frame)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        frame = _context_overrides.get()
+        if frame is None or frame.token is None:
+            raise RuntimeError("override() block exited without being entered")
+        _context_overrides.reset(frame.token)
+
+    def __call__(self, func: Callable[..., T]) -> Callable[..., T]:
+        # Imported here to keep importing this module cheap
+        import inspect
+
+        values = self.values
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with EnvOverride(values):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with EnvOverride(values):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+def override(
+    values: Optional[Mapping[str, str]] = None, /, **kwargs: str
+) -> EnvOverride:
+    """Layer values over :data:`loaded_env` in the current context.
+
+    Use it as a context manager or as a decorator, of plain or ``async``
+    functions. The values win over every other source, are seen by
+    :func:`get_env`, :func:`get_many` and :class:`Settings`, and only apply
+    to the current thread or asyncio task, and to tasks it creates. Entering
+    and leaving a block costs the same whatever the size of the environment,
+    nothing is copied or reloaded. Blocks can be nested.
+
+    :param values: Values whose keys are not valid keyword names, defaults
+        to None
+    :type values: Optional[Mapping[str, str]], optional
+    :param kwargs: The values to layer over the environment.
+    :return: A context manager that also works as a decorator.
+    :rtype: EnvOverride
+    """
+    if values:
+        kwargs = {**values, **kwargs}
+    return EnvOverride(kwargs)
+
+
+def _lookup(key: str, cast: type[T], default: Optional[T], generation: int = 0) -> T:
+    """Resolve and cast a key, returning ``_MISSING`` if it is required and unset.
+
+    ``generation`` is only part of the cache key, so that a result computed
+    from a snapshot that was just swapped out is never served again.
+    """
+    try:
+        val = loaded_env[key]
+    except KeyError:
+        if default is None:
+            return _MISSING
+        val = default
+
+    if _instrumentation is not None:
+        return _timed_cast(_instrumentation, val, cast)
+    return _cast(val, cast)
+
+
+def _timed_cast(instrumentation: Instrumentation, val: Any, cast: Any) -> Any:
+    """Cast a value and record the time it took."""
+    start = time.perf_counter()
+    val = _cast(val, cast)
+    instrumentation.add_cast(cast, time.perf_counter() - start)
+    return val
+
+
+class _Unshared(list):
+    """Holds a mutable result in the cache until its first caller takes it."""
+
+    __slots__ = ()
+
+
+def _lookup_to_cache(
+    key: str, cast: type[T], default: Optional[T], generation: int = 0
+) -> Any:
+    """Body of the :func:`get_env` cache, which must not share containers.
+
+    Lists, dicts and sets returned by casts that are not registered are
+    wrapped in an :class:`_Unshared` box. Registered casts return immutable
+    values and are shared as they are.
+    """
+    val = _lookup(key, cast, default, generation)
+    if isinstance(val, (list, dict, set, bytearray)) and cast not in _CASTS:
+        return _Unshared((val,))
+    return val
+
+
+# typed, so that equal defaults of different types, such as 0 and False,
+# are cast separately
+_cached_lookup = functools.lru_cache(maxsize=GET_ENV_CACHE_SIZE, typed=True)(
+    _lookup_to_cache
+)
+
+
+def get_env_cache_info() -> functools._CacheInfo:
+    """Return hit and miss statistics of the :func:`get_env` result cache.
+
+    :return: Named tuple of ``hits``, ``misses``, ``maxsize`` and ``currsize``.
+    :rtype: functools._CacheInfo
+    """
+    return _cached_lookup.cache_info()
+
+
+def clear_get_env_cache() -> None:
+    """Drop all cached :func:`get_env` results and reset the statistics."""
+    _cached_lookup.cache_clear()
+
+
+def get_env(
+    key: str, cast: type[T] = str, default: Optional[T] = None, cache: bool = True
+) -> T:
+    """Load environment variable from the .env file or the system environment.
+
+    Results are cached per ``(key, cast, default)`` until the environment is
+    loaded again, so ``cast`` is only called once for each of them. Cached
+    values are shared between callers, except lists, dicts and sets returned
+    by casts that are not registered, which are cast again for each caller.
+    Unhashable casts and defaults are not cached. Inside an :func:`override`
+    block, values are looked up and cast on every call.
+
+    :param key: The environment variable key.
+    :type key: str
+    :param cast: The type to cast the environment variable to, defaults to str
+    :type cast: type, optional
+    :param default: The default value to return if the environment variable is not found, defaults to None
+    :type default: Optional[T], optional
+    :param cache: Set to False for casts that are not pure functions of the
+        value, defaults to True
+    :type cache: bool, optional
+    :raises KeyError: If the environment variable is not found and is required.
+    :return: The environment variable value.
+    :rtype: str
+    """
+    if _instrumentation is not None:
+        _instrumentation.add_get_env(key, key in loaded_env, default is not None)
+    # Results computed under override() must not leak out of its block
+    if cache and _context_overrides.get() is None:
+        try:
+            val = _cached_lookup(key, cast, default, loaded_env.generation)
+        except TypeError:
+            try:
+                hash((cast, default))
+            except TypeError:
+                # Unhashable casts and defaults cannot be cached
+                val = _lookup(key, cast, default)
+            else:
+                raise
+        if type(val) is _Unshared:
+            try:
+                # Atomic, so that only one caller gets the cached container
+                val = val.pop()
+            except IndexError:
+                val = _lookup(key, cast, default)
+    else:
+        val = _lookup(key, cast, default)
+
+    if val is _MISSING:
+        raise KeyError(f"Environment variable {key} is not found")
+    return val
+
+
+class MissingEnvError(KeyError):
+    """Raised by :func:`get_many` when required variables are not set."""
+
+    def __init__(self, keys: Sequence[str]) -> None:
+        """Create the error.
+
+        :param keys: Every required key that is not set.
+        :type keys: Sequence[str]
+        """
+        super().__init__(f"Environment variables {', '.join(keys)} are not found")
+        self.keys = tuple(keys)
+
+
+@functools.lru_cache(maxsize=None)
+def _values_type(fields: tuple[str, ...]) -> type:
+    """Return the named tuple class used by :func:`get_many` for these keys."""
+    import collections
+
+    return collections.namedtuple("EnvValues", fields)
+
+
+def get_many(spec: Mapping[str, Any], as_namedtuple: bool = False) -> Any:
+    """Load several environment variables in one pass.
+
+    Each value of ``spec`` is a ``(cast, default)`` pair, or only a cast for
+    a required variable. The variables are cast with the same rules as
+    :func:`get_env`, but all of them are looked up together and a missing
+    key does not raise until every key has been checked.
+
+    :param spec: Maps each key to ``(cast, default)`` or to a cast.
+    :type spec: Mapping[str, Any]
+    :param as_namedtuple: Return a named tuple with one field per key instead
+        of a dict, defaults to False
+    :type as_namedtuple: bool, optional
+    :raises MissingEnvError: If required keys are not set, listing all of them.
+    :return: The cast values, in the order of ``spec``.
+    :rtype: dict[str, Any] or a named tuple
+    """
+    found = loaded_env.current().select(spec)
+    instrumentation = _instrumentation
+    values = {}
+    missing = []
+    for key, item in spec.items():
+        if item.__class__ is tuple:
+            cast, default = item
+        else:
+            cast, default = item, None
+        value = found.get(key, _MISSING)
+        if instrumentation is not None:
+            instrumentation.add_get_env(key, value is not _MISSING, default is not None)
+        if value is _MISSING:
+            if default is None:
+                missing.append(key)
+                continue
+            value = default
+        if instrumentation is not None:
+            values[key] = _timed_cast(instrumentation, value, cast)
+        else:
+            values[key] = _cast(value, cast)
+
+    if missing:
+        raise MissingEnvError(missing)
+    if as_namedtuple:
+        return _values_type(tuple(values))(*values.values())
+    return values
+
+
+class SettingsError(ValueError):
+    """Raised when :class:`Settings` fields are missing or cannot be cast.
+
+    Every failing field is reported at once in :attr:`errors`.
+    """
+
+    def __init__(self, errors: dict[str, Exception]) -> None:
+        """Create the error.
+
+        :param errors: The exception raised for each failing key.
+        :type errors: dict[str, Exception]
+        """
+        details = "; ".join(
+            f"{key} is not found" if isinstance(err, KeyError) else f"{key}: {err}"
+            for key, err in errors.items()
+        )
+        super().__init__(f"Invalid settings: {details}")
+        self.errors = errors
+
+
+def _optional_type(annotation: Any) -> Optional[Any]:
+    """Return ``X`` for an ``Optional[X]`` annotation, else None."""
+    args = typing.get_args(annotation)
+    if type(None) in args and len(args) == 2:
+        origin = typing.get_origin(annotation)
+        if origin is typing.Union or origin is getattr(types, "UnionType", None):
+            return args[0] if args[1] is type(None) else args[1]
+    return None
+
+
+def _is_class_var(annotation: Any) -> bool:
+    """Whether an annotation, possibly a string, is a ``ClassVar``."""
+    if isinstance(annotation, str):
+        return annotation.startswith(("ClassVar", "typing.ClassVar"))
+    return typing.get_origin(annotation) is typing.ClassVar
+
+
+class _SettingsMeta(type):
+    """Turns annotated class attributes of :class:`Settings` into slots."""
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        annotations = namespace.get("__annotations__", {})
+        defaults = {}
+        for field, annotation in annotations.items():
+            if field.startswith("_") or _is_class_var(annotation):
+                continue
+            # A class attribute would shadow the slot of the same name
+            defaults[field] = namespace.pop(field, _MISSING)
+        inherited = set()
+        for base in bases:
+            inherited.update(getattr(base, "__settings_fields__", {}))
+        namespace["__slots__"] = tuple(
+            field for field in defaults if field not in inherited
+        )
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+
+        hints = typing.get_type_hints(cls) if annotations else {}
+        fields = {}
+        for base in reversed(cls.__mro__[1:]):
+            fields.update(getattr(base, "__settings_fields__", {}))
+        for field, default in defaults.items():
+            annotation = hints.get(field, str)
+            optional = _optional_type(annotation)
+            cast = optional if optional is not None else annotation
+            fields[field] = (cast, default, optional is not None)
+        cls.__settings_fields__ = fields
+        return cls
+
+
+class Settings(metaclass=_SettingsMeta):
+    """Base class for typed settings declared with annotations.
+
+    Each annotated field is read from the environment variable of the same
+    name and cast with the same rules as :func:`get_env`. A field without a
+    default is required; ``Optional`` fields default to None. All fields are
+    resolved in one pass and every problem is reported in a single
+    :class:`SettingsError`. Instances are frozen and store their values in
+    slots.
+
+    .. code-block:: python
+
+        class AppSettings(Settings):
+            DB_URL: str
+            PORT: int = 8000
+            DEBUG: bool = False
+            SENTRY_DSN: Optional[str] = None
+
+        settings = AppSettings()
+    """
+
+    __slots__ = ()
+    __settings_fields__: dict[str, tuple[Any, Any, bool]] = {}
+
+    def __init__(self, env: Optional[Mapping[str, str]] = None) -> None:
+        """Resolve every field.
+
+        :param env: Mapping to read the values from, defaults to
+            :data:`loaded_env`
+        :type env: Optional[Mapping[str, str]], optional
+        :raises SettingsError: If any field is missing or invalid.
+        """
+        if env is None:
+            env = loaded_env.current()
+        errors: dict[str, Exception] = {}
+        for field, (cast, default, optional) in self.__settings_fields__.items():
+            val = env.get(field, _MISSING)
+            if val is _MISSING:
+                val = default
+                if val is _MISSING:
+                    if not optional:
+                        errors[field] = KeyError(
+                            f"Environment variable {field} is not found"
+                        )
+                        continue
+                    val = None
+                if val is None:
+                    object.__setattr__(self, field, None)
+                    continue
+            try:
+                object.__setattr__(self, field, _cast(val, cast))
+            except (TypeError, ValueError) as err:
+                errors[field] = err
+        if errors:
+            raise SettingsError(errors)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is frozen")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is frozen")
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the resolved values.
+
+        :return: A dictionary of field names and values.
+        :rtype: dict[str, Any]
+        """
+        return {field: getattr(self, field) for field in self.__settings_fields__}
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{key}={val!r}" for key, val in self.as_dict().items())
+        return f"{type(self).__name__}({values})"
+
+
+# Names usable in the type expressions of a JSON schema
+_SCHEMA_TYPES: dict[str, Any] = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "Json": Json,
+    "list": list,
+    "tuple": tuple,
+    "set": set,
+    "frozenset": frozenset,
+    "dict": dict,
+    "Optional": Optional,
+}
+
+
+def _parse_type(text: str) -> Any:
+    """Turn a type expression such as ``"dict[str, list[int]]"`` into a cast."""
+    pos = 0
+
+    def parse() -> Any:
+        nonlocal pos
+        start = pos
+        while pos < len(text) and (text[pos].isalnum() or text[pos] in "_."):
+            pos += 1
+        name = text[start:pos]
+        if name == "..." or text.startswith("...", start):
+            pos = start + 3
+            return ...
+        if name == "timedelta":
+            from datetime import timedelta
+
+            cast: Any = timedelta
+        elif name == "Decimal":
+            from decimal import Decimal
+
+            cast = Decimal
+        elif name in _SCHEMA_TYPES:
+            cast = _SCHEMA_TYPES[name]
+        else:
+            raise ValueError(f"Unknown type {name!r} in {text!r}")
+        if text[pos : pos + 1] != "[":
+            return cast
+        pos += 1
+        args = [parse()]
+        while text[pos : pos + 1] == ",":
+            pos += 1
+            while text[pos : pos + 1] == " ":
+                pos += 1
+            args.append(parse())
+        if text[pos : pos + 1] != "]":
+            raise ValueError(f"Invalid type {text!r}")
+        pos += 1
+        return cast[tuple(args) if len(args) > 1 else args[0]]
+
+    result = parse()
+    if pos != len(text):
+        raise ValueError(f"Invalid type {text!r}")
+    return result
+
+
+def load_schema(spec: str) -> dict[str, tuple[Any, bool]]:
+    """Load the schema used by :func:`check_file`.
+
+    ``spec`` is either a JSON file mapping each key to a type expression,
+    such as ``"int"``, ``"list[int]"`` or ``"Optional[timedelta]"``, or a
+    ``module:Class`` reference to a :class:`Settings` subclass.
+
+    :param spec: Path of the JSON file, or ``module:Class``.
+    :type spec: str
+    :raises ValueError: If a type expression cannot be parsed.
+    :return: The cast of each key and whether the key is required.
+    :rtype: dict[str, tuple[Any, bool]]
+    """
+    if not spec.endswith(".json") and ":" in spec:
+        import importlib
+
+        module_name, _, name = spec.partition(":")
+        settings = getattr(importlib.import_module(module_name), name)
+        return {
+            field: (cast, default is _MISSING and not optional)
+            for field, (cast, default, optional) in (
+                settings.__settings_fields__.items()
+            )
+        }
+
+    import json
+
+    with open(spec, "r", encoding="utf-8") as file:
+        types_by_key = json.load(file)
+    schema = {}
+    for key, text in types_by_key.items():
+        cast = _parse_type(text.strip())
+        optional = _optional_type(cast)
+        schema[key] = (cast if optional is None else optional, optional is None)
+    return schema
+
+
+def _key_line(text: str, key: str) -> Optional[int]:
+    """Return the line of the last assignment to ``key``, if any."""
+    found = None
+    for lineno, line in enumerate(text.split("\n"), 1):
+        line = line.strip()
+        if line.startswith("export "):
+            line = line[7:].lstrip()
+        if line.startswith(key):
+            rest = line[len(key) :].lstrip()
+            if rest[:1] in ("=", ":"):
+                found = lineno
+    return found
+
+
+def _error(
+    message: str,
+    line: Optional[int] = None,
+    column: Optional[int] = None,
+    key: Optional[str] = None,
+) -> dict[str, Any]:
+    return {"line": line, "column": column, "key": key, "message": message}
+
+
+def check_file(
+    path: str, schema: Optional[Mapping[str, tuple[Any, bool]]] = None
+) -> dict[str, Any]:
+    """Parse a config file and validate it against a schema.
+
+    The file is parsed like :func:`parse_config_file` does, every ini value
+    is interpolated, and each key of the schema is cast with the rules of
+    :func:`get_env`.
+
+    :param path: Path of a .env or .ini file.
+    :type path: str
+    :param schema: The cast of each key and whether it is required, see
+        :func:`load_schema`, defaults to None
+    :type schema: Optional[Mapping[str, tuple[Any, bool]]], optional
+    :return: ``{"file", "ok", "errors"}``, each error holding ``line``,
+        ``column``, ``key`` and ``message``, or None where unknown.
+    :rtype: dict[str, Any]
+    """
+    import configparser
+
+    errors = []
+    text = ""
+    values: dict[str, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        if path.endswith(".ini"):
+            values = dict(parse_ini_text(text, path))
+        else:
+            values = parse_env_text(text, path)
+    except EnvFileSyntaxError as err:
+        errors.append(_error(err.msg, err.lineno, err.colno))
+    except EnvInterpolationError as err:
+        key = err.cycle[0]
+        errors.append(_error(str(err), _key_line(text, key), key=key))
+    except configparser.ParsingError as err:
+        for lineno, line in err.errors:
+            errors.append(_error(f"cannot parse line {line}", lineno))
+    except configparser.InterpolationError as err:
+        errors.append(_error(err.message, _key_line(text, err.option), key=err.option))
+    except configparser.Error as err:
+        errors.append(_error(err.message, getattr(err, "lineno", None)))
+    except (OSError, ValueError) as err:
+        errors.append(_error(str(err)))
+
+    if not errors and schema:
+        for key, (cast, required) in schema.items():
+            value = values.get(key)
+            if value is None:
+                if required:
+                    errors.append(_error("missing required key", key=key))
+                continue
+            try:
+                _cast(value, cast)
+            except Exception as err:
+                line = _key_line(text, key)
+                errors.append(_error(f"invalid value: {err}", line, key=key))
+    return {"file": path, "ok": not errors, "errors": errors}
+
+
+def _check_files(
+    paths: list[str], schema: Optional[Mapping[str, tuple[Any, bool]]]
+) -> list[dict[str, Any]]:
+    """Check a chunk of files in a worker process."""
+    return [check_file(path, schema) for path in paths]
+
+
+def _is_config_name(name: str) -> bool:
+    return (
+        name == ENV_FILE_NAME
+        or name.startswith(ENV_FILE_NAME + ".")
+        or name.endswith((ENV_FILE_NAME, ".ini"))
+    )
+
+
+def _expand_paths(patterns: Iterable[str]) -> list[str]:
+    """Expand directories and globs into config files, without duplicates."""
+    import glob
+
+    paths: dict[str, None] = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if _is_config_name(name):
+                        paths[os.path.join(root, name)] = None
+        elif glob.has_magic(pattern):
+            paths.update(dict.fromkeys(sorted(glob.glob(pattern, recursive=True))))
+        else:
+            paths[pattern] = None
+    return list(paths)
+
+
+def _format_text(result: dict[str, Any]) -> Iterator[str]:
+    for error in result["errors"]:
+        location = result["file"]
+        if error["line"] is not None:
+            location += f":{error['line']}"
+            if error["column"] is not None:
+                location += f":{error['column']}"
+        key = f" {error['key']}:" if error["key"] is not None else ""
+        yield f"{location}:{key} {error['message']}"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point of ``python -m newenvreader``.
+
+    ``check`` parses and validates config files in a process pool and
+    prints each result as soon as it is ready. It exits with status 1 if
+    any file has errors.
+
+    :param argv: Command line arguments, defaults to ``sys.argv[1:]``
+    :type argv: Optional[Sequence[str]], optional
+    :return: The exit status.
+    :rtype: int
+    """
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(prog="python -m newenvreader")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="validate config files")
+    check.add_argument("paths", nargs="+", help="files, directories or globs")
+    check.add_argument("--schema", help="JSON file of key types, or module:Class")
+    check.add_argument(
+        "--format", choices=("text", "json"), default="text", help="output format"
+    )
+    check.add_argument(
+        "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes"
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        schema = load_schema(args.schema) if args.schema else None
+    except (OSError, ValueError, ImportError, AttributeError) as err:
+        parser.error(f"cannot load schema: {err}")
+    paths = _expand_paths(args.paths)
+    if not paths:
+        parser.error("no config files found")
+
+    failed = 0
+
+    def report(results: list[dict[str, Any]]) -> None:
+        nonlocal failed
+        for result in results:
+            failed += not result["ok"]
+            if args.format == "json":
+                print(json.dumps(result), flush=True)
+            else:
+                for line in _format_text(result):
+                    print(line, flush=True)
+
+    jobs = max(1, min(args.jobs, len(paths)))
+    if jobs == 1:
+        for path in paths:
+            report([check_file(path, schema)])
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # Chunks amortize the cost of sending work to the pool, while
+        # staying small enough to balance the load and stream results
+        size = max(1, min(64, len(paths) // (jobs * 8)))
+        chunks = [paths[i : i + size] for i in range(0, len(paths), size)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_check_files, chunk, schema) for chunk in chunks]
+            for future in as_completed(futures):
+                report(future.result())
+
+    if args.format == "text":
+        print(f"{len(paths)} files checked, {failed} with errors", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # Run the importable module, so that worker processes can find the
+    # functions they are sent
+    import newenvreader
 
-    if cast is bool:
-        return cast_bool(val)
-    return cast(val)
+    raise SystemExit(newenvreader.main())
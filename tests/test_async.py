@@ -0,0 +1,178 @@
+import asyncio
+import importlib
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestAsyncLoad(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, ".env")
+        self.write("VAR1=value1\nVAR2=value2\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def write(self, data):
+        with open(self.file_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+    def slow_load_env(self, delay=0.1):
+        """Patch _load_env to count calls and take ``delay`` seconds."""
+        load_env = newenvreader._load_env
+        self.loads = []
+
+        def slow(*args, **kwargs):
+            self.loads.append(threading.current_thread().name)
+            time.sleep(delay)
+            return load_env(*args, **kwargs)
+
+        return patch.object(newenvreader, "_load_env", slow)
+
+    def test_async_load_env(self):
+        with ThreadPoolExecutor(thread_name_prefix="config") as executor:
+            with self.slow_load_env(0):
+                env = asyncio.run(
+                    newenvreader.async_load_env(self.temp_dir.name, executor=executor)
+                )
+        assert dict(env) == dict(newenvreader.load_env(self.temp_dir.name))
+        assert self.loads[0].startswith("config")
+
+    def test_aload_coalesces(self):
+        async def main():
+            return await asyncio.gather(*(newenvreader.aload() for _ in range(10)))
+
+        with self.slow_load_env():
+            envs = asyncio.run(main())
+        assert len(self.loads) == 1
+        assert all(env is envs[0] for env in envs)
+        assert newenvreader.loaded_env.is_loaded
+        assert newenvreader.get_env("VAR1") == "value1"
+
+    def test_loop_is_not_blocked(self):
+        async def ticker(stop):
+            ticks = 0
+            while not stop.is_set():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return ticks
+
+        async def main():
+            stop = asyncio.Event()
+            task = asyncio.create_task(ticker(stop))
+            await newenvreader.aload()
+            stop.set()
+            return await task
+
+        with self.slow_load_env(0.2):
+            assert asyncio.run(main()) >= 5
+
+    def test_areload_coalesces(self):
+        newenvreader.preload()
+        self.write("VAR1=changed\n")
+
+        async def main():
+            return await asyncio.gather(
+                *(newenvreader.areload_env(force=True) for _ in range(5))
+            )
+
+        with self.slow_load_env():
+            results = asyncio.run(main())
+        assert len(self.loads) == 1
+        assert results == [frozenset({"VAR1", "VAR2"})] * 5
+        assert newenvreader.get_env("VAR1") == "changed"
+
+    def test_cancelled_caller(self):
+        async def main():
+            first = asyncio.create_task(newenvreader.aload())
+            second = asyncio.create_task(newenvreader.aload())
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        with self.slow_load_env():
+            env = asyncio.run(main())
+        assert env["VAR1"] == "value1"
+        assert len(self.loads) == 1
+
+    def test_changes(self):
+        newenvreader.preload()
+
+        async def main():
+            stream = newenvreader.changes()
+            pending = asyncio.create_task(anext(stream))
+            # Let the stream subscribe before reloading
+            await asyncio.sleep(0)
+            self.write("VAR1=value1\nVAR2=changed\n")
+            await newenvreader.areload_env()
+            changed = await asyncio.wait_for(pending, 5)
+            await stream.aclose()
+            return changed
+
+        assert asyncio.run(main()) == {"VAR2"}
+        assert newenvreader.loaded_env._subscribers == ()
+
+    def test_changes_from_other_thread(self):
+        newenvreader.preload()
+
+        async def main():
+            stream = newenvreader.changes()
+            pending = asyncio.create_task(anext(stream))
+            await asyncio.sleep(0)
+            self.write("VAR3=new\n")
+            thread = threading.Thread(target=newenvreader.reload_env)
+            thread.start()
+            changed = await asyncio.wait_for(pending, 5)
+            thread.join()
+            await stream.aclose()
+            return changed
+
+        assert asyncio.run(main()) == {"VAR1", "VAR2", "VAR3"}
+
+    def test_awatch(self):
+        newenvreader.preload()
+
+        async def main():
+            watcher = newenvreader.awatch(0.01)
+            stream = newenvreader.changes()
+            pending = asyncio.create_task(anext(stream))
+            await asyncio.sleep(0)
+            self.write("VAR1=watched\n")
+            changed = await asyncio.wait_for(pending, 5)
+            await stream.aclose()
+            await watcher.stop()
+            return changed, watcher.error
+
+        changed, error = asyncio.run(main())
+        assert changed == {"VAR1", "VAR2"}
+        assert error is None
+        assert newenvreader.get_env("VAR1") == "watched"
+
+    def test_awatch_keeps_snapshot_on_error(self):
+        newenvreader.preload()
+
+        async def main():
+            watcher = newenvreader.awatch(0.01)
+            self.write("not an assignment\n")
+            for _ in range(500):
+                if watcher.error is not None:
+                    break
+                await asyncio.sleep(0.01)
+            await watcher.stop()
+            return watcher.error
+
+        assert isinstance(asyncio.run(main()), newenvreader.EnvFileSyntaxError)
+        assert newenvreader.get_env("VAR1") == "value1"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
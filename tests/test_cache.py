@@ -0,0 +1,98 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestGetEnvCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("INT_VAL=12\nBOOL_VAL=yes\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+        self.calls = []
+
+    def counting_int(self, value):
+        self.calls.append(value)
+        return int(value)
+
+    def test_cast_runs_once(self):
+        for _ in range(3):
+            assert newenvreader.get_env("INT_VAL", cast=self.counting_int) == 12
+        assert self.calls == ["12"]
+
+        info = newenvreader.get_env_cache_info()
+        assert info.hits == 2
+        assert info.misses == 1
+
+    def test_default_and_missing_are_cached(self):
+        for _ in range(2):
+            assert newenvreader.get_env("NOPE", cast=self.counting_int, default=3) == 3
+            with self.assertRaises(KeyError):
+                newenvreader.get_env("NOPE", cast=self.counting_int)
+        assert self.calls == [3]
+        assert newenvreader.get_env_cache_info().hits == 2
+
+    def test_defaults_of_different_types(self):
+        assert newenvreader.get_env("NOPE", cast=str, default=0) == "0"
+        assert newenvreader.get_env("NOPE", cast=str, default=False) == "False"
+        assert newenvreader.get_env("NOPE", cast=str, default=0.0) == "0.0"
+
+    def test_cache_disabled(self):
+        for _ in range(3):
+            newenvreader.get_env("INT_VAL", cast=self.counting_int, cache=False)
+        assert len(self.calls) == 3
+        assert newenvreader.get_env_cache_info().misses == 0
+
+    def test_unhashable_default(self):
+        assert newenvreader.get_env("NOPE", cast=list, default=[1]) == [1]
+        assert newenvreader.get_env("NOPE", cast=list, default=[2]) == [2]
+
+    def test_unhashable_cast(self):
+        class Cast:
+            __hash__ = None
+
+            def __call__(self, value):
+                return int(value) + 1
+
+        assert newenvreader.get_env("INT_VAL", cast=Cast()) == 13
+
+    def test_mutable_results_are_not_shared(self):
+        first = newenvreader.get_env("INT_VAL", cast=list)
+        first.append("3")
+        assert newenvreader.get_env("INT_VAL", cast=list) == ["1", "2"]
+        # Built-in casts of generics return tuples, which are shared
+        assert newenvreader.get_env("INT_VAL", cast=list[int]) is (
+            newenvreader.get_env("INT_VAL", cast=list[int])
+        )
+
+    def test_cast_errors_are_raised(self):
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("BOOL_VAL", cast=int)
+        with self.assertRaises(TypeError):
+            newenvreader.get_env("NOPE", cast=int, default=(1,))
+
+    def test_invalidated_on_reload(self):
+        assert newenvreader.get_env("INT_VAL", cast=int) == 12
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("INT_VAL=13\n")
+
+        newenvreader.configure(self.temp_dir.name)
+        assert newenvreader.get_env_cache_info().currsize == 0
+        assert newenvreader.get_env("INT_VAL", cast=int) == 13
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import importlib
+import os
+import tempfile
+import types
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestCastRegistry(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write(
+                "PORTS=80, 443,8080\n"
+                "HOSTS=a.example,b.example\n"
+                "EMPTY=\n"
+                "LABELS=team=core, tier = 1\n"
+                "PAIR=localhost,5432\n"
+                "FLAGS=yes,no,on\n"
+                "TIMEOUT=1h30m\n"
+                "DELAY=250ms\n"
+                "INTERVAL=01:02:03\n"
+                "SECONDS=90\n"
+                "PRICE=19.99\n"
+                "DATA_DIR=/var/lib/app\n"
+                'OPTIONS={"retries": 3, "hosts": ["a", "b"]}\n'
+            )
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def test_sequences(self):
+        assert newenvreader.get_env("PORTS", cast=list[int]) == (80, 443, 8080)
+        assert newenvreader.get_env("HOSTS", cast=tuple[str, ...]) == (
+            "a.example",
+            "b.example",
+        )
+        assert newenvreader.get_env("FLAGS", cast=list[bool]) == (True, False, True)
+        assert newenvreader.get_env("PORTS", cast=frozenset[int]) == {80, 443, 8080}
+        assert newenvreader.get_env("EMPTY", cast=list[int]) == ()
+        assert newenvreader.get_env("NOPE", cast=list[int], default=(1, "2")) == (1, 2)
+
+    def test_fixed_tuple(self):
+        assert newenvreader.get_env("PAIR", cast=tuple[str, int]) == (
+            "localhost",
+            5432,
+        )
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("PORTS", cast=tuple[str, int])
+
+    def test_mapping(self):
+        labels = newenvreader.get_env("LABELS", cast=dict[str, str])
+        assert isinstance(labels, types.MappingProxyType)
+        assert labels == {"team": "core", "tier": "1"}
+        assert newenvreader.get_env("LABELS", cast=dict[str, str]) is labels
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("HOSTS", cast=dict[str, str])
+
+    def test_timedelta(self):
+        assert newenvreader.get_env("TIMEOUT", cast=timedelta) == timedelta(
+            hours=1, minutes=30
+        )
+        assert newenvreader.get_env("DELAY", cast=timedelta) == timedelta(
+            milliseconds=250
+        )
+        assert newenvreader.get_env("INTERVAL", cast=timedelta) == timedelta(
+            hours=1, minutes=2, seconds=3
+        )
+        assert newenvreader.get_env("SECONDS", cast=timedelta) == timedelta(seconds=90)
+        default = timedelta(seconds=5)
+        assert newenvreader.get_env("NOPE", cast=timedelta, default=default) == default
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("HOSTS", cast=timedelta)
+
+    def test_decimal_and_path(self):
+        assert newenvreader.get_env("PRICE", cast=Decimal) == Decimal("19.99")
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("HOSTS", cast=Decimal)
+        assert newenvreader.get_env("DATA_DIR", cast=Path) == Path("/var/lib/app")
+
+    def test_json(self):
+        options = newenvreader.get_env("OPTIONS", cast=newenvreader.Json)
+        assert options["retries"] == 3
+        assert options["hosts"] == ("a", "b")
+        with self.assertRaises(TypeError):
+            options["retries"] = 4
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("HOSTS", cast=newenvreader.Json)
+
+    def test_optional(self):
+        assert newenvreader.get_env("PORTS", cast=Optional[list[int]]) == (
+            80,
+            443,
+            8080,
+        )
+
+    def test_register_cast(self):
+        assert newenvreader.get_env("HOSTS") == "a.example,b.example"
+        newenvreader.register_cast(str, str.upper)
+        assert newenvreader.get_env("HOSTS") == "A.EXAMPLE,B.EXAMPLE"
+        assert newenvreader.get_env("HOSTS", cast=list[str]) == (
+            "A.EXAMPLE",
+            "B.EXAMPLE",
+        )
+
+    def test_resolved_once(self):
+        newenvreader.get_env("PORTS", cast=list[int], cache=False)
+        converter = newenvreader._resolved_casts[list[int]]
+        newenvreader.get_env("PORTS", cast=list[int], cache=False)
+        assert newenvreader._resolved_casts[list[int]] is converter
+
+    def test_callables_are_not_kept(self):
+        before = len(newenvreader._resolved_casts)
+        for i in range(100):
+            value = newenvreader.get_env("PORTS", cast=lambda v, i=i: f"{v}{i}")
+            assert value == f"80, 443,8080{i}"
+        assert len(newenvreader._resolved_casts) == before
+
+    def test_settings_fields(self):
+        class AppSettings(newenvreader.Settings):
+            PORTS: list[int]
+            TIMEOUT: timedelta
+            LABELS: Optional[dict[str, str]]
+
+        settings = AppSettings()
+        assert settings.PORTS == (80, 443, 8080)
+        assert settings.TIMEOUT == timedelta(minutes=90)
+        assert settings.LABELS["team"] == "core"
+
+    def test_cast_bool(self):
+        assert newenvreader.cast_bool("ON") is True
+        assert newenvreader.cast_bool("") is False
+        with self.assertRaises(ValueError):
+            newenvreader.cast_bool("maybe")
+
+    def test_unsupported_generic(self):
+        with self.assertRaises(TypeError):
+            newenvreader.get_env("PORTS", cast=Optional[int | str])
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import newenvreader
+
+
+class TestCheck(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.good = self.write("good.env", "PORT=8080\nDEBUG=yes\nIDS=1,2,3\n")
+        self.bad = self.write("svc/bad.env", "A=1\n\nnot a pair\n")
+        self.schema = self.write(
+            "schema.json",
+            json.dumps({"PORT": "int", "IDS": "list[int]", "DEBUG": "Optional[bool]"}),
+        )
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(data)
+        return path
+
+    def run_main(self, *argv):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(
+            io.StringIO()
+        ):
+            status = newenvreader.main(list(argv))
+        return status, stdout.getvalue()
+
+    def test_check_file(self):
+        result = newenvreader.check_file(self.good)
+        assert result == {"file": self.good, "ok": True, "errors": []}
+
+        result = newenvreader.check_file(self.bad)
+        assert not result["ok"]
+        assert result["errors"] == [
+            {"line": 3, "column": 1, "key": None, "message": "expected KEY=value"}
+        ]
+
+    def test_schema(self):
+        schema = newenvreader.load_schema(self.schema)
+        assert schema["PORT"] == (int, True)
+        assert schema["DEBUG"] == (bool, False)
+        assert newenvreader.check_file(self.good, schema)["ok"]
+
+        path = self.write("wrong.env", "IDS=1,x\nPORT=1\nPORT=http\n")
+        errors = newenvreader.check_file(path, schema)["errors"]
+        assert [(error["key"], error["line"]) for error in errors] == [
+            ("PORT", 3),
+            ("IDS", 1),
+        ]
+
+        path = self.write("empty.env", "")
+        errors = newenvreader.check_file(path, schema)["errors"]
+        assert [error["key"] for error in errors] == ["PORT", "IDS"]
+        assert errors[0]["message"] == "missing required key"
+
+    def test_parse_type(self):
+        assert newenvreader._parse_type("dict[str, list[int]]") == dict[str, list[int]]
+        assert newenvreader._parse_type("tuple[int, ...]") == tuple[int, ...]
+        for text in ("list[int", "object", "int]"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    newenvreader._parse_type(text)
+
+    def test_settings_schema(self):
+        self.write(
+            "check_settings.py",
+            "import newenvreader\n\n"
+            "class AppSettings(newenvreader.Settings):\n"
+            "    PORT: int\n"
+            "    TIMEOUT: float = 1.0\n",
+        )
+        sys.path.insert(0, self.root)
+        try:
+            schema = newenvreader.load_schema("check_settings:AppSettings")
+        finally:
+            sys.path.remove(self.root)
+            sys.modules.pop("check_settings", None)
+        assert schema == {"PORT": (int, True), "TIMEOUT": (float, False)}
+
+    def test_ini_errors(self):
+        path = self.write("settings.ini", "[settings]\nA = 1\nB = %(MISSING)s\n")
+        errors = newenvreader.check_file(path)["errors"]
+        assert [(error["key"], error["line"]) for error in errors] == [("B", 3)]
+
+        path = self.write("broken.ini", "[settings]\nA = 1\nA = 2\n")
+        errors = newenvreader.check_file(path)["errors"]
+        assert errors[0]["line"] == 3
+
+    def test_unreadable(self):
+        missing = os.path.join(self.root, "missing.env")
+        result = newenvreader.check_file(missing)
+        assert not result["ok"] and result["errors"][0]["line"] is None
+
+    def test_main_json(self):
+        for jobs in ("1", "2"):
+            with self.subTest(jobs=jobs):
+                status, output = self.run_main(
+                    "check", self.root, "--format", "json", "--jobs", jobs
+                )
+                assert status == 1
+                results = [json.loads(line) for line in output.splitlines()]
+                assert {result["file"]: result["ok"] for result in results} == {
+                    self.good: True,
+                    self.bad: False,
+                }
+
+    def test_main_text(self):
+        glob = os.path.join(self.root, "**", "*.env")
+        status, output = self.run_main("check", glob, "--jobs", "1")
+        assert status == 1
+        assert output == f"{self.bad}:3:1: expected KEY=value\n"
+
+        status, output = self.run_main("check", self.good, "--schema", self.schema)
+        assert status == 0 and output == ""
+
+    def test_main_usage_errors(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit) as ctx:
+                newenvreader.main(["check", os.path.join(self.root, "*.missing")])
+            assert ctx.exception.code == 2
+            with self.assertRaises(SystemExit):
+                newenvreader.main(["check", self.good, "--schema", "missing.json"])
+
+    def test_command_line(self):
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(newenvreader.__file__))
+        proc = subprocess.run(
+            [sys.executable, "-m", "newenvreader", "check", self.root, "--jobs", "2"],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        assert proc.returncode == 1
+        assert proc.stdout == f"{self.bad}:3:1: expected KEY=value\n"
+        assert "2 files checked, 1 with errors" in proc.stderr
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestCompactEnv(unittest.TestCase):
+    def setUp(self):
+        self.values = {
+            f"TENANT_{i}_FLAG_{j}": f"value {i}.{j}"
+            for i in range(20)
+            for j in range(5)
+        }
+        self.values["UNICODE_ÿ"] = "naïve ☃"
+        self.values["EMPTY"] = ""
+        self.env = newenvreader.CompactEnv(self.values)
+
+    def test_mapping(self):
+        assert len(self.env) == len(self.values)
+        assert dict(self.env) == self.values
+        assert list(self.env) == sorted(self.values)
+        assert self.env["TENANT_3_FLAG_4"] == "value 3.4"
+        assert self.env["UNICODE_ÿ"] == "naïve ☃"
+        assert self.env.get("EMPTY") == ""
+        assert self.env.get("NOPE", "x") == "x"
+        assert self.env.get(None) is None
+        assert "TENANT_19_FLAG_0" in self.env
+        assert "TENANT_19" not in self.env
+        assert 42 not in self.env
+        with self.assertRaises(KeyError):
+            self.env["NOPE"]
+
+    def test_with_prefix(self):
+        assert self.env.with_prefix("TENANT_1_") == {
+            f"TENANT_1_FLAG_{j}": f"value 1.{j}" for j in range(5)
+        }
+        assert len(self.env.with_prefix("TENANT_1")) == 55
+        assert self.env.with_prefix("UNICODE_") == {"UNICODE_ÿ": "naïve ☃"}
+        assert self.env.with_prefix("NOPE") == {}
+        assert self.env.with_prefix("") == self.values
+
+    def test_empty(self):
+        env = newenvreader.CompactEnv({})
+        assert len(env) == 0
+        assert "KEY" not in env
+        assert env.with_prefix("") == {}
+
+
+class TestCompactLoad(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("TENANT_1_PLAN=free\nTENANT_1_SEATS=3\nTENANT_2_PLAN=pro\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def test_load_env(self):
+        env = newenvreader.load_env(self.temp_dir.name, compact=True)
+        assert isinstance(dict(env.layers)["file"], newenvreader.CompactEnv)
+        assert env["TENANT_1_SEATS"] == "3"
+        assert env.source_of("TENANT_2_PLAN") == "file"
+
+    def test_get_prefixed(self):
+        newenvreader.configure(self.temp_dir.name, compact=True)
+        with patch.dict(os.environ, {"TENANT_1_PLAN": "system", "TENANT_1_X": "x"}):
+            assert newenvreader.get_prefixed("TENANT_1_") == {
+                "TENANT_1_PLAN": "free",
+                "TENANT_1_SEATS": "3",
+                "TENANT_1_X": "x",
+            }
+            assert newenvreader.get_env("TENANT_1_SEATS", cast=int) == 3
+
+    def tearDown(self):
+        newenvreader.configure()
+        self.temp_dir.cleanup()
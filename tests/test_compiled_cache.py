@@ -0,0 +1,102 @@
+import configparser
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestCompiledCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.file_path = os.path.join(self.temp_dir.name, ".env")
+        self.write("VAR1=value1\nVAR2=value2\n")
+
+    def write(self, data):
+        with open(self.file_path, "w", encoding="utf-8") as file:
+            file.write(data)
+
+    def parse(self):
+        return newenvreader.parse_config_file(self.file_path, self.cache_dir)
+
+    def test_cache_hit_skips_parsing(self):
+        assert self.parse() == {"VAR1": "value1", "VAR2": "value2"}
+        assert len(os.listdir(self.cache_dir)) == 1
+
+        with patch.object(newenvreader, "parse_env_file") as parse:
+            assert self.parse() == {"VAR1": "value1", "VAR2": "value2"}
+        parse.assert_not_called()
+
+    def test_cache_miss_reads_once(self):
+        paths = []
+        real_open = open
+
+        def counting_open(file, *args, **kwargs):
+            paths.append(file)
+            return real_open(file, *args, **kwargs)
+
+        self.write("VAR1=value1\r\nVAR2=value2\r\n")
+        with patch("builtins.open", counting_open):
+            assert self.parse() == {"VAR1": "value1", "VAR2": "value2"}
+        assert paths.count(self.file_path) == 1
+
+    def test_changed_file_is_parsed_again(self):
+        self.parse()
+        stat = os.stat(self.file_path)
+        # Same size and mtime, only the content hash differs
+        self.write("VAR1=VALUE1\nVAR2=value2\n")
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert self.parse()["VAR1"] == "VALUE1"
+        with patch.object(newenvreader, "parse_env_file") as parse:
+            assert self.parse()["VAR1"] == "VALUE1"
+        parse.assert_not_called()
+
+    def test_corrupt_cache_is_ignored(self):
+        self.parse()
+        (name,) = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, name), "wb") as file:
+            file.write(b"\x00garbage")
+
+        assert self.parse() == {"VAR1": "value1", "VAR2": "value2"}
+
+    def test_unwritable_cache_dir(self):
+        with open(self.cache_dir, "w", encoding="utf-8") as file:
+            file.write("not a directory")
+
+        assert self.parse() == {"VAR1": "value1", "VAR2": "value2"}
+
+    def test_load_env_uses_env_var(self):
+        with patch.dict(os.environ, {"NEWENVREADER_CACHE_DIR": self.cache_dir}):
+            env = newenvreader.load_env(self.temp_dir.name)
+        assert env["VAR1"] == "value1"
+        assert os.listdir(self.cache_dir)
+
+    def test_ini_file(self):
+        self.file_path = os.path.join(self.temp_dir.name, "settings.ini")
+        self.write("[settings]\nVAR1=1\nVAR2=%(VAR1)s\n")
+
+        assert self.parse() == {"VAR1": "1", "VAR2": "1"}
+        with patch.object(newenvreader, "parse_ini_file") as parse:
+            assert self.parse() == {"VAR1": "1", "VAR2": "1"}
+        parse.assert_not_called()
+
+    def test_ini_values_stay_lazy(self):
+        self.file_path = os.path.join(self.temp_dir.name, "settings.ini")
+        self.write("[settings]\nVAR1=1\nUNUSED=%(nope)s\n")
+
+        for _ in range(2):
+            values = self.parse()
+            assert values["VAR1"] == "1"
+            assert values.raw("UNUSED") == "%(nope)s"
+            with self.assertRaises(configparser.InterpolationMissingOptionError):
+                values["UNUSED"]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,189 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestSearchEnvFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+
+    def make_file(self, *parts):
+        path = os.path.join(self.root, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("VAR1=value1\n")
+        return path
+
+    def test_finds_file_in_ancestor(self):
+        file_path = self.make_file(".env")
+        start = os.path.join(self.root, "a", "b", "c")
+        os.makedirs(start)
+
+        assert newenvreader.search_env_file(start) == file_path
+
+    def test_ignores_subdirectories(self):
+        self.make_file("sub", ".env")
+        parent_file = self.make_file("settings.ini")
+        start = os.path.join(self.root, "start")
+        os.makedirs(os.path.join(start, "nested"))
+        self.make_file("start", "nested", ".env")
+
+        assert newenvreader.search_env_file(start) == parent_file
+
+    def test_candidate_priority(self):
+        self.make_file("b.env")
+        self.make_file("a.env")
+        assert newenvreader.search_env_file(self.root).endswith("a.env")
+
+        ini_path = self.make_file("settings.ini")
+        assert newenvreader.search_env_file(self.root) == ini_path
+
+        env_path = self.make_file(".env")
+        assert newenvreader.search_env_file(self.root) == env_path
+
+    def test_directory_named_like_candidate_is_skipped(self):
+        os.makedirs(os.path.join(self.root, "start", ".env"))
+        file_path = self.make_file("settings.ini")
+
+        start = os.path.join(self.root, "start")
+        assert newenvreader.search_env_file(start) == file_path
+
+    def test_stop_marker(self):
+        self.make_file(".env")
+        project = os.path.join(self.root, "project")
+        start = os.path.join(project, "src")
+        os.makedirs(start)
+        os.mkdir(os.path.join(project, ".git"))
+
+        with self.assertRaises(FileNotFoundError):
+            newenvreader.search_env_file(start, stop_markers=(".git",))
+
+        # The directory holding the marker is still checked
+        file_path = self.make_file("project", ".env")
+        assert (
+            newenvreader.search_env_file(start, stop_markers=(".git",)) == file_path
+        )
+
+    def test_max_depth(self):
+        file_path = self.make_file(".env")
+        start = os.path.join(self.root, "a", "b")
+        os.makedirs(start)
+
+        with self.assertRaises(FileNotFoundError):
+            newenvreader.search_env_file(start, max_depth=1)
+        assert newenvreader.search_env_file(start, max_depth=2) == file_path
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestDiscoveryCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.temp_dir.name, "tree")
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.cache_file = os.path.join(self.cache_dir, "discovery.cache")
+        self.start = os.path.join(self.root, "a", "b", "c")
+        os.makedirs(self.start)
+        self.env_path = os.path.join(self.root, ".env")
+        with open(self.env_path, "w", encoding="utf-8") as file:
+            file.write("VAR1=value1\n")
+        self.age()
+
+        self.environ = patch.dict(
+            os.environ, {newenvreader.DISCOVERY_CACHE_ENV_VAR: self.cache_dir}
+        )
+        self.environ.start()
+
+    def age(self):
+        """Move directory mtimes out of the window where they are not trusted."""
+        past = time.time_ns() - 60 * 10**9
+        for directory, _, _ in os.walk(self.root):
+            os.utime(directory, ns=(past, past))
+
+    def no_scan(self):
+        return patch.object(
+            newenvreader, "_find_candidate", side_effect=AssertionError("scanned")
+        )
+
+    def test_hit_skips_scan(self):
+        assert newenvreader.search_env_file(self.start) == self.env_path
+        assert os.path.isfile(self.cache_file)
+        with self.no_scan():
+            assert newenvreader.search_env_file(self.start) == self.env_path
+
+    def test_not_found_is_cached(self):
+        os.remove(self.env_path)
+        os.mkdir(os.path.join(self.root, ".git"))
+        self.age()
+        with self.assertRaises(FileNotFoundError):
+            newenvreader.search_env_file(self.start, stop_markers=(".git",))
+        with self.no_scan():
+            with self.assertRaises(FileNotFoundError):
+                newenvreader.search_env_file(self.start, stop_markers=(".git",))
+
+    def test_options_are_part_of_the_key(self):
+        newenvreader.search_env_file(self.start)
+        with self.assertRaises(FileNotFoundError):
+            newenvreader.search_env_file(self.start, max_depth=1)
+        files = newenvreader.search_env_files(self.start, profile="")
+        assert files == [("file", self.env_path)]
+
+    def test_new_file_invalidates(self):
+        newenvreader.search_env_file(self.start)
+        closer = os.path.join(self.root, "a", ".env")
+        with open(closer, "w", encoding="utf-8") as file:
+            file.write("VAR1=closer\n")
+        assert newenvreader.search_env_file(self.start) == closer
+
+    def test_removed_directory_invalidates(self):
+        other = os.path.join(self.root, "x", "y")
+        os.makedirs(other)
+        self.age()
+        newenvreader.search_env_file(other)
+        os.rmdir(other)
+        os.mkdir(other)
+        assert newenvreader.search_env_file(other) == self.env_path
+
+    def test_recent_directories_are_not_cached(self):
+        os.utime(os.path.join(self.root, "a"))
+        newenvreader.search_env_file(self.start)
+        assert not os.path.exists(self.cache_file)
+
+    def test_corrupt_cache(self):
+        os.makedirs(self.cache_dir)
+        with open(self.cache_file, "wb") as file:
+            file.write(b"\x00garbage")
+        assert newenvreader.search_env_file(self.start) == self.env_path
+        with self.no_scan():
+            assert newenvreader.search_env_file(self.start) == self.env_path
+
+    def test_default_location(self):
+        cache_home = os.path.join(self.temp_dir.name, "xdg")
+        with patch.dict(
+            os.environ,
+            {newenvreader.DISCOVERY_CACHE_ENV_VAR: "1", "XDG_CACHE_HOME": cache_home},
+        ):
+            newenvreader.search_env_file(self.start)
+            path = os.path.join(cache_home, "newenvreader", "discovery.cache")
+            assert os.path.isfile(path)
+            newenvreader.clear_discovery_cache()
+            assert not os.path.exists(path)
+
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {newenvreader.DISCOVERY_CACHE_ENV_VAR: ""}):
+            newenvreader.search_env_file(self.start)
+        assert not os.path.exists(self.cache_dir)
+
+    def tearDown(self):
+        self.environ.stop()
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -130,5 +130,60 @@ class TestEnvParsing(unittest.TestCase):
         self.temp_dir.cleanup()
 
 
+class TestEnvTokenizer(unittest.TestCase):
+    def parse(self, text):
+        return newenvreader.parse_env_text(text)
+
+    def test_comments(self):
+        env = self.parse("# just a comment\nKEY=value # trailing\nURL=a#b\n")
+        assert env == {"KEY": "value", "URL": "a#b"}
+
+    def test_export(self):
+        env = self.parse("export KEY=value\nexport\tOTHER = 1\nexported=2\n")
+        assert env == {"KEY": "value", "OTHER": "1", "exported": "2"}
+
+    def test_quoted_values(self):
+        env = self.parse(
+            "SINGLE='it  stays \\n raw' # comment\n"
+            'DOUBLE="tab\\there \\"quoted\\" \\\\ \\$HOME"\n'
+            'EMPTY=""\n'
+        )
+        assert env["SINGLE"] == "it  stays \\n raw"
+        assert env["DOUBLE"] == 'tab\there "quoted" \\ $HOME'
+        assert env["EMPTY"] == ""
+
+    def test_multiline_values(self):
+        env = self.parse(
+            'CERT="-----BEGIN-----\nAAAA\n\nBBBB\n-----END-----"\n'
+            "NOTE='first\n  second'\n"
+            "NEXT=1\n"
+        )
+        assert env["CERT"] == "-----BEGIN-----\nAAAA\n\nBBBB\n-----END-----"
+        assert env["NOTE"] == "first\n  second"
+        assert env["NEXT"] == "1"
+
+    def test_unterminated_quote_is_data(self):
+        env = self.parse('OPEN="text\nNEXT=1\nLAST="\n')
+        assert env == {"OPEN": '"text', "NEXT": "1", "LAST": '"'}
+
+    def test_errors_have_position(self):
+        with self.assertRaises(newenvreader.EnvFileSyntaxError) as ctx:
+            self.parse("KEY=value\n\n    not an assignment\n")
+        assert (ctx.exception.lineno, ctx.exception.colno) == (3, 5)
+        assert str(ctx.exception) == "<string>:3:5: expected KEY=value"
+
+        with self.assertRaises(ValueError) as ctx:
+            self.parse("KEY=value\n = value\n")
+        assert (ctx.exception.lineno, ctx.exception.colno) == (2, 2)
+
+    def test_crlf_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, ".env")
+            with open(file_path, "wb") as file:
+                file.write(b'KEY=value\r\nMULTI="a\r\nb"\r\n')
+            env = newenvreader.parse_env_file(file_path)
+        assert env == {"KEY": "value", "MULTI": "a\nb"}
+
+
 if __name__ == "__main__":
     unittest.main()
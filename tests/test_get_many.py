@@ -0,0 +1,102 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestGetMany(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("HOST=localhost\nPORT=5432\nDEBUG=yes\nHOSTS=a,b\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def test_dict(self):
+        with patch.dict(os.environ, {"SYSTEM_ONLY": "1.5"}):
+            values = newenvreader.get_many(
+                {
+                    "HOST": str,
+                    "PORT": (int, None),
+                    "DEBUG": (bool, False),
+                    "HOSTS": list[str],
+                    "SYSTEM_ONLY": float,
+                    "TIMEOUT": (int, 30),
+                }
+            )
+        assert values == {
+            "HOST": "localhost",
+            "PORT": 5432,
+            "DEBUG": True,
+            "HOSTS": ("a", "b"),
+            "SYSTEM_ONLY": 1.5,
+            "TIMEOUT": 30,
+        }
+        assert list(values) == [
+            "HOST",
+            "PORT",
+            "DEBUG",
+            "HOSTS",
+            "SYSTEM_ONLY",
+            "TIMEOUT",
+        ]
+
+    def test_namedtuple(self):
+        spec = {"HOST": str, "PORT": int}
+        values = newenvreader.get_many(spec, as_namedtuple=True)
+        assert values.HOST == "localhost"
+        assert values.PORT == 5432
+        assert type(newenvreader.get_many(spec, as_namedtuple=True)) is type(values)
+
+    def test_missing_keys_are_reported_together(self):
+        with self.assertRaises(newenvreader.MissingEnvError) as ctx:
+            newenvreader.get_many({"HOST": str, "NOPE1": int, "NOPE2": (str, None)})
+        assert ctx.exception.keys == ("NOPE1", "NOPE2")
+        assert isinstance(ctx.exception, KeyError)
+        assert "NOPE1, NOPE2" in str(ctx.exception)
+
+    def test_matches_get_env(self):
+        spec = {"HOST": (str, None), "PORT": (int, None), "DEBUG": (bool, None)}
+        values = newenvreader.get_many(spec)
+        for key, (cast, default) in spec.items():
+            assert values[key] == newenvreader.get_env(key, cast, default)
+
+    def test_sources_are_recorded(self):
+        with patch.dict(os.environ, {"SYSTEM_ONLY": "x"}):
+            newenvreader.get_many({"SYSTEM_ONLY": str, "HOST": str})
+        assert newenvreader.source_of("SYSTEM_ONLY") == "system"
+        assert newenvreader.source_of("HOST") == "file"
+
+    def test_select(self):
+        env = newenvreader.load_env(
+            self.temp_dir.name, overrides={"PORT": "1"}, defaults={"EXTRA": "2"}
+        )
+        assert env.select(["PORT", "HOST", "EXTRA", "NOPE"]) == {
+            "PORT": "1",
+            "HOST": "localhost",
+            "EXTRA": "2",
+        }
+        assert env.source_of("PORT") == "overrides"
+
+    def test_instrumented(self):
+        newenvreader.enable_instrumentation()
+        try:
+            newenvreader.get_many({"PORT": int, "NOPE": (int, 1)})
+        finally:
+            newenvreader.disable_instrumentation()
+        stats = newenvreader.stats()
+        assert stats["get_env"]["NOPE"] == {"calls": 1, "misses": 1, "defaults": 1}
+        assert stats["casts"]["int"]["count"] == 2
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
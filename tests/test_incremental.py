@@ -0,0 +1,192 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestIncrementalParse(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, ".env")
+        # Small blocks, so that a few lines span many of them
+        self.patch = patch.object(newenvreader, "INCREMENTAL_BLOCK_BYTES", 64)
+        self.patch.start()
+        self.lines = [f"KEY_{i}=value {i}" for i in range(100)]
+        self.write()
+
+    def write(self, text=None):
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write("\n".join(self.lines) + "\n" if text is None else text)
+
+    def reparse(self, previous):
+        """Parse again, returning the values and the byte ranges tokenized."""
+        ranges = []
+        parse_blocks = newenvreader._parse_blocks
+
+        def record(data, start, end, path, lineno):
+            ranges.append((start, end))
+            return parse_blocks(data, start, end, path, lineno)
+
+        with patch.object(newenvreader, "_parse_blocks", record):
+            values = newenvreader.parse_env_file_incremental(self.path, previous)
+        assert values == newenvreader.parse_env_file(self.path)
+        return values, sum(end - start for start, end in ranges)
+
+    def test_full_parse(self):
+        values = newenvreader.parse_env_file_incremental(self.path)
+        assert values == newenvreader.parse_env_file(self.path)
+        assert values.changed is None
+        assert len(values._index.blocks) > 10
+
+    def test_append(self):
+        values = newenvreader.parse_env_file_incremental(self.path)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write("NEW=1\n")
+        values, tokenized = self.reparse(values)
+        assert values.changed == {"NEW"}
+        assert tokenized == len("NEW=1\n")
+
+    def test_edit_and_delete(self):
+        values = newenvreader.parse_env_file_incremental(self.path)
+        self.lines[50] = "KEY_50=changed"
+        self.write()
+        values, tokenized = self.reparse(values)
+        assert values.changed == {"KEY_50"}
+        assert values["KEY_50"] == "changed"
+        assert tokenized < 200
+
+        del self.lines[20:30]
+        self.write()
+        values, _ = self.reparse(values)
+        assert values.changed == {f"KEY_{i}" for i in range(20, 30)}
+
+    def test_duplicate_key_resurfaces(self):
+        self.lines[90] = "KEY_5=later"
+        self.write()
+        values = newenvreader.parse_env_file_incremental(self.path)
+        assert values["KEY_5"] == "later"
+        del self.lines[90]
+        self.write()
+        values, _ = self.reparse(values)
+        assert values["KEY_5"] == "value 5"
+        assert values.changed == {"KEY_5"}
+
+    def test_multiline_values(self):
+        self.lines[40] = 'KEY_40="first\n# not a comment'
+        self.write()
+        values = newenvreader.parse_env_file_incremental(self.path)
+        assert values["KEY_40"] == '"first'
+        # Closing the quote pulls the following lines into the value
+        self.lines[40] += '\nstill the value"'
+        self.write()
+        values, _ = self.reparse(values)
+        assert values["KEY_40"] == "first\n# not a comment\nstill the value"
+        assert values.changed == {"KEY_40"}
+
+    def test_references(self):
+        self.lines[0] = "LINK=${KEY_80}/path"
+        self.write()
+        values = newenvreader.parse_env_file_incremental(self.path)
+        assert values["LINK"] == "value 80/path"
+        self.lines[80] = "KEY_80=other"
+        self.write()
+        values, _ = self.reparse(values)
+        assert values["LINK"] == "other/path"
+        assert values.changed == {"KEY_80", "LINK"}
+
+    def test_syntax_error(self):
+        values = newenvreader.parse_env_file_incremental(self.path)
+        self.lines[70] = "not a pair"
+        self.write()
+        with self.assertRaises(newenvreader.EnvFileSyntaxError) as ctx:
+            newenvreader.parse_env_file_incremental(self.path, values)
+        assert ctx.exception.lineno == 71
+
+        # The failed parse left the index of the previous values usable
+        self.lines[70] = "KEY_70=fixed"
+        self.write()
+        values, tokenized = self.reparse(values)
+        assert values.changed == {"KEY_70"}
+        assert tokenized < 200
+
+    def test_previous_used_once(self):
+        first = newenvreader.parse_env_file_incremental(self.path)
+        newenvreader.parse_env_file_incremental(self.path, first)
+        again = newenvreader.parse_env_file_incremental(self.path, first)
+        assert again.changed is None
+        assert again == first
+
+    def test_random_edits(self):
+        rng = random.Random(4)
+        choices = (
+            lambda: f"KEY_{rng.randrange(20)}=v{rng.randrange(100)}",
+            lambda: f'KEY_{rng.randrange(20)}="open\n# inside\nclose"',
+            lambda: f'KEY_{rng.randrange(20)}="unclosed',
+            lambda: f"KEY_{rng.randrange(20)}=${{KEY_{rng.randrange(20)}:-d}}",
+            lambda: "# comment",
+            lambda: "",
+        )
+        values = newenvreader.parse_env_file_incremental(self.path)
+        for _ in range(200):
+            index = rng.randrange(len(self.lines) + 1)
+            if rng.random() < 0.3 and self.lines:
+                del self.lines[index : index + rng.randrange(1, 4)]
+            else:
+                self.lines[index:index] = [rng.choice(choices)()]
+            self.write()
+            values, _ = self.reparse(values)
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+
+class TestIncrementalReload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, ".env")
+        self.write("".join(f"KEY_{i}=value {i}\n" for i in range(1000)))
+        self.patch = patch.object(newenvreader, "INCREMENTAL_PARSE_MIN_BYTES", 0)
+        self.patch.start()
+
+    def write(self, data, mode="w"):
+        with open(self.path, mode, encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+    def test_reload(self):
+        env = newenvreader.LazyEnv(self.temp_dir.name)
+        assert env["KEY_1"] == "value 1"
+        # The first reload builds the index
+        assert env.reload(force=True) == frozenset()
+        layer = dict(env.load().layers)["file"]
+        assert isinstance(layer, newenvreader.IndexedEnv)
+
+        self.write("NEW=1\nKEY_1=changed\n", "a")
+        assert env.reload() == {"NEW", "KEY_1"}
+        assert env["KEY_1"] == "changed"
+        assert env.source_of("NEW") == "file"
+        # Comparing the snapshots did not look every key up
+        assert len(env.load()._values) == 2
+
+    def test_system_changes_are_seen(self):
+        env = newenvreader.LazyEnv(self.temp_dir.name)
+        env.reload(force=True)
+        with patch.dict(os.environ, {"SYSTEM_ONLY": "1"}):
+            assert env["SYSTEM_ONLY"] == "1"
+            self.write("KEY_2=changed\n", "a")
+        assert env.reload() == {"KEY_2", "SYSTEM_ONLY"}
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
+import configparser
 import importlib
 import os
+import subprocess
+import sys
 import tempfile
 import unittest
 from unittest.mock import patch
@@ -95,5 +98,99 @@ class TestEnvParsing(unittest.TestCase):
         self.temp_dir.cleanup()
 
 
+def configparser_items(text):
+    """What parse_ini_file returned when it was built on ConfigParser."""
+    parser = configparser.ConfigParser()
+    parser.optionxform = lambda option: option
+    try:
+        parser.read_string(text)
+    except configparser.MissingSectionHeaderError as err:
+        raise ValueError(
+            "Invalid .ini file: File contains no settings section"
+        ) from err
+    return dict(parser.items("settings"))
+
+
+# Each entry is parsed by both readers, results or errors must match
+INI_CORPUS = [
+    "[settings]\nA=1\nB = 2\nC: 3\nD :4\n",
+    "[settings]\nURL=http://host:80/path\nMIXED:a=b\nEQ=a:b\n",
+    "[settings]\nEMPTY=\nSPACES =   padded   \n",
+    "# comment\n; other comment\n\n[settings]\n# inside\nA=1\n; A=2\n",
+    "[settings]\nA=first\n  second\n\n  third\nB=x\n",
+    "[settings]\nA=first\n  # comment line is dropped\n  second\n",
+    "    [settings]\n    A=1\n    B=2\n        continued\n",
+    "[settings]\nA=1\n[other]\nA=2\n[settings2]\nC=3\n",
+    "[other]\nX=1\n[settings]\nA=%(B)s-%%\nB=b\n[more]\nY=2\n",
+    "[DEFAULT]\nBASE=/srv\nA=default\n[settings]\nA=%(BASE)s/app\n",
+    "[settings]\nA=%(BASE)s\n[other]\nQ=1\n[DEFAULT]\nBASE=late\n",
+    "[settings]\nA=%(B)s\nB=%(C)s\nC=%(D)s\nD=end\n",
+    "[settings]\nCaseKey=1\ncasekey=2\n",
+    "[settings]\nA=100%\n",
+    "[settings]\nA=%(missing)s\n",
+    "[settings]\nA=%(broken\n",
+    "[settings]\nA=%()s\n",
+    "[settings]\nA=%(A)s\n",
+    "[settings]\nA=1\nA=2\n",
+    "[settings]\nA=1\n[settings]\nB=2\n",
+    "[settings]\nnot an option\nA=1\n",
+    "[settings]\n=value\n",
+    "[settings]\nA=1\n  more\nbroken line\n  continued\nB=2",
+    "[DEFAULT]\nA=1\nA=2\n[settings]\n",
+    "A=1\n[settings]\nB=2\n",
+    "[other]\nA=1\n",
+    "",
+    "# only comments\n",
+    "[settings] trailing text\nA=1\n",
+    "[settings]\nA=1\n  [notaheader]\nB=2\n",
+    "[settings]\r\nA=1\r\nB=two words\r\n",
+    "[settings]\nA=1\n[DEFAULT]\nB=2\n[DEFAULT]\nC=3\n",
+    "[settings]\nA=1\n  [settings]\nB=2\n",
+    "[other]\nX=1\n  [settings]\n  A=2\n[settings]\nB=3\n",
+    "[other]\nX=1\n  [settings]\n  A=2\n",
+    "[DEFAULT]\nA=1\n  [settings]\nB=2\n",
+    "[other]\n  X=1\n  [settings]\n  A=2\n",
+    "[other]\nX=1\n\n  # comment\n  [settings]\nA=2\n",
+    "[other]\nX=1\n  [DEFAULT]\nA=2\n[settings]\nB=%(A)s\n",
+]
+
+
+class TestIniParity(unittest.TestCase):
+    def outcome(self, func, text):
+        try:
+            return "ok", func(text)
+        except Exception as err:  # Compare error types and messages
+            return type(err), str(err)
+
+    def test_corpus(self):
+        for text in INI_CORPUS:
+            with self.subTest(text=text):
+                expected = self.outcome(configparser_items, text)
+                actual = self.outcome(
+                    lambda text: dict(newenvreader.parse_ini_text(text)), text
+                )
+                assert actual == expected
+
+    def test_interpolation_is_lazy(self):
+        settings = newenvreader.parse_ini_text("[settings]\nA=1\nBAD=%(nope)s\n")
+        assert settings["A"] == "1"
+        assert settings.raw("BAD") == "%(nope)s"
+        with self.assertRaises(configparser.InterpolationMissingOptionError):
+            settings["BAD"]
+
+    def test_configparser_not_imported(self):
+        code = (
+            "import sys, newenvreader; "
+            "newenvreader.parse_ini_text('[settings]\\nA=%(B)s\\nB=1\\n')['A']; "
+            "assert 'configparser' not in sys.modules"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run(
+            [sys.executable, "-c", code],
+            env=dict(os.environ, PYTHONPATH=root),
+            check=True,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,102 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        with open(os.path.join(self.root, ".env"), "w", encoding="utf-8") as file:
+            file.write("INT_VAL=12\nSTR_VAL=hello\n")
+        self.start = os.path.join(self.root, "a", "b")
+        os.makedirs(self.start)
+        open(os.path.join(self.start, "unrelated.txt"), "w").close()
+
+        with patch("os.getcwd", return_value=self.start):
+            importlib.reload(newenvreader)
+        self.events = []
+
+    def test_off_by_default(self):
+        newenvreader.get_env("INT_VAL", cast=int)
+        stats = newenvreader.stats()
+        assert stats["phases"] == {}
+        assert stats["get_env"] == {}
+        assert stats["discovery"]["path"] is None
+
+    def test_load_phases(self):
+        newenvreader.enable_instrumentation()
+        newenvreader.preload()
+        stats = newenvreader.stats()
+        assert set(stats["phases"]) == {"discovery", "read", "parse", "merge"}
+        for phase in stats["phases"].values():
+            assert phase["count"] == 1
+            assert phase["seconds"] >= 0
+        assert stats["discovery"] == {
+            "directories": 3,
+            "entries": 4,
+            "path": os.path.join(self.root, ".env"),
+        }
+
+    def test_get_env_counters(self):
+        newenvreader.enable_instrumentation()
+        for _ in range(3):
+            newenvreader.get_env("INT_VAL", cast=int)
+        newenvreader.get_env("NOPE", default="x")
+        with self.assertRaises(KeyError):
+            newenvreader.get_env("NOPE")
+
+        stats = newenvreader.stats()
+        assert stats["get_env"]["INT_VAL"] == {"calls": 3, "misses": 0, "defaults": 0}
+        assert stats["get_env"]["NOPE"] == {"calls": 2, "misses": 2, "defaults": 1}
+        # Cached results are not cast again
+        assert stats["casts"]["int"]["count"] == 1
+        assert stats["casts"]["str"]["count"] == 1
+
+    def test_hook(self):
+        newenvreader.enable_instrumentation(
+            lambda event, data: self.events.append((event, data))
+        )
+        newenvreader.get_env("STR_VAL")
+        events = [event for event, _ in self.events]
+        assert events == [
+            "phase",
+            "discovery",
+            "phase",
+            "phase",
+            "phase",
+            "get_env",
+            "cast",
+        ]
+        assert self.events[5][1] == {"key": "STR_VAL", "found": True, "default": False}
+
+    def test_disable_and_reset(self):
+        newenvreader.enable_instrumentation()
+        newenvreader.get_env("STR_VAL")
+        newenvreader.disable_instrumentation()
+        newenvreader.get_env("STR_VAL")
+        assert newenvreader.stats()["get_env"]["STR_VAL"]["calls"] == 1
+
+        newenvreader.reset_stats()
+        assert newenvreader.stats()["get_env"] == {}
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.root, ".env"))
+        newenvreader.enable_instrumentation()
+        with self.assertRaises(FileNotFoundError):
+            newenvreader.search_env_file(self.start, max_depth=1)
+        discovery = newenvreader.stats()["discovery"]
+        assert discovery["directories"] == 2
+        assert discovery["path"] is None
+
+    def tearDown(self):
+        newenvreader.disable_instrumentation()
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+def parse(text, **environ):
+    return newenvreader.parse_env_text(text, environ=environ)
+
+
+class TestInterpolation(unittest.TestCase):
+    def test_references(self):
+        env = parse(
+            "HOST=db.example\n"
+            "URL=postgres://${USER}@${HOST}:${PORT}/app\n"
+            "PORT=5432\n",
+            USER="admin",
+        )
+        assert env["URL"] == "postgres://admin@db.example:5432/app"
+
+    def test_file_wins_over_environ(self):
+        env = parse("USER=file\nNAME=${USER}\n", USER="system")
+        assert env["NAME"] == "file"
+
+    def test_defaults(self):
+        env = parse(
+            "EMPTY=\n"
+            "A=${UNSET:-fallback}\n"
+            "B=${EMPTY:-fallback}\n"
+            "C=${UNSET}\n"
+            "D=${UNSET:-${A}/nested}\n"
+            "E=${A:-unused}\n"
+        )
+        assert env["A"] == "fallback"
+        assert env["B"] == "fallback"
+        assert env["C"] == ""
+        assert env["D"] == "fallback/nested"
+        assert env["E"] == "fallback"
+
+    def test_self_reference_reads_environ(self):
+        env = parse("PATH=${PATH}:/opt/bin\n", PATH="/usr/bin")
+        assert env["PATH"] == "/usr/bin:/opt/bin"
+
+    def test_quoting(self):
+        env = parse(
+            "A=value\n"
+            "SINGLE='${A}'\n"
+            'DOUBLE="${A} and \\${A}"\n'
+            'MULTI="first\n${A}"\n'
+            "COMMENT=${A} # ${B}\n"
+        )
+        assert env["SINGLE"] == "${A}"
+        assert env["DOUBLE"] == "value and ${A}"
+        assert env["MULTI"] == "first\nvalue"
+        assert env["COMMENT"] == "value"
+
+    def test_disabled(self):
+        env = newenvreader.parse_env_text("A=x\nB=${A}\n", interpolate=False)
+        assert env["B"] == "${A}"
+
+    def test_redefined_key(self):
+        env = parse("A=${B}\nB=1\nA=plain\n")
+        assert env["A"] == "plain"
+
+    def test_cycle(self):
+        with self.assertRaises(newenvreader.EnvInterpolationError) as ctx:
+            parse("A=${B}\nB=x${C}\nC=${A}\nD=${A}\n")
+        assert ctx.exception.cycle == ("A", "B", "C", "A")
+        assert "A -> B -> C -> A" in str(ctx.exception)
+        assert isinstance(ctx.exception, ValueError)
+
+    def test_unused_default_is_not_followed(self):
+        env = parse("A=${B:-${C}}\nB=x\nC=${A}\n")
+        assert env["A"] == "x"
+        assert env["C"] == "x"
+
+    def test_malformed(self):
+        for line in ("A=${B\n", "A=${}\n", "A=${B-x}\n", 'A="${B:-x"\n'):
+            with self.subTest(line=line):
+                with self.assertRaises(newenvreader.EnvFileSyntaxError) as ctx:
+                    parse("OK=1\n" + line)
+                assert ctx.exception.lineno == 2
+
+    def test_deep_chain(self):
+        count = 50000
+        lines = [f"K{i}=${{K{i + 1}}}" for i in range(count)]
+        lines.append(f"K{count}=end")
+        env = parse("\n".join(reversed(lines)))
+        assert env["K0"] == "end"
+
+
+class TestLoadedInterpolation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("BASE=/srv\nDATA=${BASE}/data\nHOME_DIR=${TEST_HOME}\n")
+
+    def test_get_env(self):
+        with patch.dict(os.environ, {"TEST_HOME": "/home/test"}):
+            with patch("os.getcwd", return_value=self.temp_dir.name):
+                importlib.reload(newenvreader)
+            assert newenvreader.get_env("DATA") == "/srv/data"
+            assert newenvreader.get_env("HOME_DIR") == "/home/test"
+
+    def test_not_compiled(self):
+        cache_dir = os.path.join(self.temp_dir.name, "cache")
+        path = os.path.join(self.temp_dir.name, ".env")
+        with patch.dict(os.environ, {"TEST_HOME": "/a"}):
+            assert newenvreader.parse_config_file(path, cache_dir)["HOME_DIR"] == "/a"
+        with patch.dict(os.environ, {"TEST_HOME": "/b"}):
+            assert newenvreader.parse_config_file(path, cache_dir)["HOME_DIR"] == "/b"
+        assert not os.path.exists(cache_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import importlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestLayeredEnv(unittest.TestCase):
+    def setUp(self):
+        os.environ["LAYER_SYSTEM"] = "system"
+        os.environ["LAYER_SHARED"] = "system"
+
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("LAYER_FILE=file\nLAYER_SHARED=file\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def load(self, **options):
+        return newenvreader.load_env(self.temp_dir.name, **options)
+
+    def test_default_precedence(self):
+        env = self.load(
+            overrides={"LAYER_OVERRIDE": "override", "LAYER_SHARED": "override"},
+            defaults={"LAYER_DEFAULT": "default", "LAYER_FILE": "default"},
+        )
+
+        assert env["LAYER_SHARED"] == "override"
+        assert env.source_of("LAYER_SHARED") == "overrides"
+        assert env["LAYER_FILE"] == "file"
+        assert env.source_of("LAYER_FILE") == "file"
+        assert env.source_of("LAYER_SYSTEM") == "system"
+        assert env.source_of("LAYER_DEFAULT") == "defaults"
+        with self.assertRaises(KeyError):
+            env.source_of("LAYER_NOWHERE")
+
+    def test_custom_precedence(self):
+        env = self.load(precedence=("system", "file"))
+        assert env["LAYER_SHARED"] == "system"
+        assert env.source_of("LAYER_FILE") == "file"
+
+        env = self.load(precedence=("file",))
+        assert "LAYER_SYSTEM" not in env
+
+        with self.assertRaises(ValueError):
+            self.load(precedence=("file", "nope"))
+
+    def test_environ_is_not_copied(self):
+        env = self.load()
+        assert [layer for _, layer in env.layers][1] is os.environ
+
+        keys = list(env)
+        assert len(keys) == len(set(keys)) == len(env)
+        assert set(keys) == set(os.environ) | {"LAYER_FILE"}
+
+    def test_read_only(self):
+        env = self.load()
+        with self.assertRaises(TypeError):
+            env["LAYER_FILE"] = "changed"
+
+    def test_module_source_of(self):
+        newenvreader.configure(
+            self.temp_dir.name, defaults={"LAYER_DEFAULT": "default"}
+        )
+        assert newenvreader.source_of("LAYER_SHARED") == "file"
+        assert newenvreader.source_of("LAYER_DEFAULT") == "defaults"
+        assert newenvreader.get_env("LAYER_DEFAULT") == "default"
+
+    def tearDown(self):
+        del os.environ["LAYER_SYSTEM"]
+        del os.environ["LAYER_SHARED"]
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
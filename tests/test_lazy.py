@@ -0,0 +1,117 @@
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestLazyLoading(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, ".env")
+        with open(self.file_path, "w", encoding="utf-8") as file:
+            file.write("VAR1=value1\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def test_not_loaded_on_import(self):
+        assert not newenvreader.loaded_env.is_loaded
+
+        assert newenvreader.get_env("VAR1") == "value1"
+        assert newenvreader.loaded_env.is_loaded
+
+    def test_preload(self):
+        env = newenvreader.preload()
+        assert newenvreader.loaded_env.is_loaded
+        assert env["VAR1"] == "value1"
+        assert newenvreader.preload() is env
+
+    def test_concurrent_first_access_loads_once(self):
+        calls = []
+        real_load_env = newenvreader._load_env
+
+        def counting_load_env(*args, **kwargs):
+            calls.append(1)
+            return real_load_env(*args, **kwargs)
+
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(newenvreader.get_env("VAR1"))
+
+        with patch.object(newenvreader, "_load_env", counting_load_env):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(calls) == 1
+        assert results == ["value1"] * 8
+
+    def test_configure_reloads(self):
+        newenvreader.preload()
+        subdir = os.path.join(self.temp_dir.name, "sub")
+        os.mkdir(subdir)
+        with open(os.path.join(subdir, ".env"), "w", encoding="utf-8") as file:
+            file.write("VAR1=from_subdir\n")
+
+        newenvreader.configure(subdir)
+        assert not newenvreader.loaded_env.is_loaded
+        assert newenvreader.get_env("VAR1") == "from_subdir"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestImportTime(unittest.TestCase):
+    """Importing the module must not discover, read or parse anything."""
+
+    def test_import_is_cheap(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # A broken config file would make an eager load raise on import
+            with open(
+                os.path.join(temp_dir, "settings.ini"), "w", encoding="utf-8"
+            ) as file:
+                file.write("VAR1=no section header\n")
+
+            # Time a warm import from bytecode, not the compilation of the source
+            env = dict(
+                os.environ,
+                PYTHONPATH=REPO_ROOT,
+                PYTHONPYCACHEPREFIX=os.path.join(temp_dir, "pycache"),
+            )
+            env.pop("PYTHONDONTWRITEBYTECODE", None)
+            for _ in range(2):
+                result = subprocess.run(
+                    [sys.executable, "-X", "importtime", "-c", "import newenvreader"],
+                    cwd=temp_dir,
+                    env=env,
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+
+        self_us = None
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() == "newenvreader":
+                self_us = int(fields[0].split(":")[1])
+        assert self_us is not None, result.stderr
+        # The module body only defines functions and classes
+        assert self_us < 10000, f"newenvreader import took {self_us}us"
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -88,12 +88,6 @@ class TestFindAndReadEnv(unittest.TestCase):
         os.remove(file_path)
 
     def test_invalid_ini_file(self):
-        # Reload at start to clear any previous settings which don't get cleared
-        # when the module is reloaded as an exception is raised due to 
-        # invalid ini file
-        with patch("os.getcwd", return_value=self.temp_dir.name):
-            importlib.reload(newenvreader)
-        
         file_data = """
         VAR1=12121
         VAR2=Value2
@@ -102,10 +96,15 @@ class TestFindAndReadEnv(unittest.TestCase):
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(file_data)
 
+        # Importing does not touch the file, the error surfaces on first load
         with patch("os.getcwd", return_value=self.temp_dir.name):
-            with self.assertRaises(ValueError):
-                importlib.reload(newenvreader)
-    
+            importlib.reload(newenvreader)
+
+        with self.assertRaises(ValueError):
+            newenvreader.preload()
+        with self.assertRaises(ValueError):
+            newenvreader.get_env("VAR1")
+
         os.remove(file_path)
 
     def tearDown(self):
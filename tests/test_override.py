@@ -0,0 +1,138 @@
+import asyncio
+import importlib
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestOverride(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("NAME=file\nPORT=8000\nDEBUG=no\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def test_context_manager(self):
+        assert newenvreader.get_env("PORT", cast=int) == 8000
+        with newenvreader.override(PORT="9000", EXTRA="x"):
+            assert newenvreader.get_env("PORT", cast=int) == 9000
+            assert newenvreader.get_env("EXTRA") == "x"
+            assert newenvreader.get_env("NAME") == "file"
+            assert newenvreader.source_of("PORT") == "context"
+            assert "EXTRA" in newenvreader.loaded_env
+        # The cached result from before the block is served again
+        assert newenvreader.get_env("PORT", cast=int) == 8000
+        assert newenvreader.source_of("PORT") == "file"
+        with self.assertRaises(KeyError):
+            newenvreader.get_env("EXTRA")
+
+    def test_nested(self):
+        with newenvreader.override(NAME="outer", PORT="1"):
+            with newenvreader.override({"NAME": "inner", "WITH-DASH": "y"}):
+                assert newenvreader.get_env("NAME") == "inner"
+                assert newenvreader.get_env("PORT") == "1"
+                assert newenvreader.get_env("WITH-DASH") == "y"
+            assert newenvreader.get_env("NAME") == "outer"
+        assert newenvreader.get_env("NAME") == "file"
+
+    def test_reentrant(self):
+        block = newenvreader.override(NAME="again")
+        with block:
+            with block:
+                assert newenvreader.get_env("NAME") == "again"
+            assert newenvreader.get_env("NAME") == "again"
+        assert newenvreader.get_env("NAME") == "file"
+
+    def test_decorator(self):
+        @newenvreader.override(DEBUG="yes")
+        def debug():
+            return newenvreader.get_env("DEBUG", cast=bool)
+
+        assert debug() is True
+        assert newenvreader.get_env("DEBUG", cast=bool) is False
+
+    def test_async_decorator(self):
+        @newenvreader.override(NAME="async")
+        async def name():
+            await asyncio.sleep(0)
+            return newenvreader.get_env("NAME")
+
+        assert asyncio.run(name()) == "async"
+        assert newenvreader.get_env("NAME") == "file"
+
+    def test_tasks_are_isolated(self):
+        async def handler(tenant):
+            with newenvreader.override(NAME=tenant):
+                await asyncio.sleep(0.01)
+                return newenvreader.get_env("NAME")
+
+        async def main():
+            return await asyncio.gather(*(handler(f"t{i}") for i in range(20)))
+
+        assert asyncio.run(main()) == [f"t{i}" for i in range(20)]
+
+    def test_shared_block_in_tasks(self):
+        block = newenvreader.override(NAME="shared")
+
+        async def handler(delay):
+            with block:
+                await asyncio.sleep(delay)
+                name = newenvreader.get_env("NAME")
+            return name, newenvreader.get_env("NAME")
+
+        async def main():
+            # The first task to enter the block is the first to leave it
+            return await asyncio.gather(handler(0.01), handler(0.02))
+
+        assert asyncio.run(main()) == [("shared", "file")] * 2
+
+    def test_threads_are_isolated(self):
+        entered = threading.Event()
+        done = threading.Event()
+        seen = []
+
+        def worker():
+            with newenvreader.override(NAME="thread"):
+                entered.set()
+                done.wait(5)
+                seen.append(newenvreader.get_env("NAME"))
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        entered.wait(5)
+        seen.append(newenvreader.get_env("NAME"))
+        done.set()
+        thread.join()
+        assert seen == ["file", "thread"]
+
+    def test_get_many_and_settings(self):
+        class AppSettings(newenvreader.Settings):
+            NAME: str
+            PORT: int
+
+        with newenvreader.override(PORT="9000"):
+            assert newenvreader.get_many({"PORT": int}) == {"PORT": 9000}
+            assert AppSettings().PORT == 9000
+        assert AppSettings().PORT == 8000
+
+    def test_reload_inside_block(self):
+        with newenvreader.override(PORT="9000"):
+            assert newenvreader.get_env("NAME") == "file"
+            with open(
+                os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+            ) as file:
+                file.write("NAME=changed\n")
+            newenvreader.reload_env(force=True)
+            assert newenvreader.get_env("NAME") == "changed"
+            assert newenvreader.get_env("PORT") == "9000"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
@@ -0,0 +1,115 @@
+import importlib
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestProfiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.write(".env", "NAME=base\nBASE_ONLY=1\nPROFILED=base\n")
+        self.write(".env.local", "NAME=local\n")
+        self.write(".env.staging", "NAME=staging\nPROFILED=staging\n")
+
+        with patch("os.getcwd", return_value=self.root):
+            importlib.reload(newenvreader)
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+        return path
+
+    def test_search_env_files(self):
+        files = newenvreader.search_env_files(self.root, profile="staging")
+        assert files == [
+            ("file:.env.local", os.path.join(self.root, ".env.local")),
+            ("file:.env.staging", os.path.join(self.root, ".env.staging")),
+            ("file", os.path.join(self.root, ".env")),
+        ]
+        files = newenvreader.search_env_files(self.root, profile="")
+        assert [name for name, _ in files] == ["file:.env.local", "file"]
+
+    def test_overlays_without_base(self):
+        nested = os.path.join(self.root, "nested")
+        os.mkdir(nested)
+        with open(os.path.join(nested, ".env.local"), "w", encoding="utf-8") as file:
+            file.write("NAME=nested\n")
+        files = newenvreader.search_env_files(nested, profile="")
+        assert files == [("file:.env.local", os.path.join(nested, ".env.local"))]
+
+    def test_layering_order(self):
+        env = newenvreader.load_env(self.root, profile="staging")
+        assert env["NAME"] == "local"
+        assert env["PROFILED"] == "staging"
+        assert env["BASE_ONLY"] == "1"
+        assert env.source_of("NAME") == "file:.env.local"
+        assert env.source_of("PROFILED") == "file:.env.staging"
+        assert env.source_of("BASE_ONLY") == "file"
+
+    def test_profile_from_environment(self):
+        with patch.dict(os.environ, {newenvreader.PROFILE_ENV_VAR: "staging"}):
+            env = newenvreader.load_env(self.root)
+        assert env["PROFILED"] == "staging"
+
+        env = newenvreader.load_env(self.root, profile="")
+        assert env["PROFILED"] == "base"
+
+    def test_invalid_profile(self):
+        for profile in ("../prod", "a/b", ".."):
+            with self.subTest(profile=profile):
+                with self.assertRaises(ValueError):
+                    newenvreader.load_env(self.root, profile=profile)
+
+    def test_precedence_moves_all_file_layers(self):
+        with patch.dict(os.environ, {"NAME": "system", "PROFILED": "system"}):
+            env = newenvreader.load_env(
+                self.root, profile="staging", precedence=("system", "file")
+            )
+            assert env["NAME"] == "system"
+            assert env["BASE_ONLY"] == "1"
+            names = [name for name, _ in env.layers]
+            assert names == ["system", "file:.env.local", "file:.env.staging", "file"]
+
+    def test_single_scan(self):
+        newenvreader.enable_instrumentation()
+        try:
+            newenvreader.load_env(self.root, profile="staging")
+            discovery = newenvreader.stats()["discovery"]
+        finally:
+            newenvreader.disable_instrumentation()
+        assert discovery["directories"] == 1
+
+    def test_parallel_parse(self):
+        with patch.object(newenvreader, "PARALLEL_PARSE_MIN_BYTES", 0):
+            env = newenvreader.load_env(self.root, profile="staging")
+        assert env["NAME"] == "local"
+        assert env["PROFILED"] == "staging"
+        assert env.source_of("BASE_ONLY") == "file"
+
+    def test_module_level_profile(self):
+        newenvreader.configure(self.root, profile="staging")
+        assert newenvreader.get_env("PROFILED") == "staging"
+        assert newenvreader.source_of("NAME") == "file:.env.local"
+        assert newenvreader.loaded_env.path == os.path.join(self.root, ".env")
+        assert len(newenvreader.loaded_env.paths) == 3
+
+    def test_reload_on_overlay_change(self):
+        newenvreader.configure(self.root, profile="staging")
+        assert newenvreader.get_env("PROFILED") == "staging"
+        assert newenvreader.reload_env() == frozenset()
+
+        self.write(".env.staging", "NAME=staging\nPROFILED=changed\n")
+        assert newenvreader.reload_env() == {"PROFILED"}
+        assert newenvreader.get_env("PROFILED") == "changed"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
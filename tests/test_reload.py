@@ -0,0 +1,131 @@
+import importlib
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestReload(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, ".env")
+        self.write("VAR1=value1\nVAR2=value2\n")
+
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+
+    def write(self, data):
+        with open(self.file_path, "w", encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+    def test_unchanged_file_is_not_parsed(self):
+        newenvreader.preload()
+        with patch.object(newenvreader, "parse_env_file") as parse:
+            assert newenvreader.reload_env() == frozenset()
+        parse.assert_not_called()
+
+    def test_reload_swaps_snapshot(self):
+        assert newenvreader.get_env("VAR1") == "value1"
+        old = newenvreader.loaded_env.load()
+
+        self.write("VAR1=changed\nVAR3=value3\n")
+        changed = newenvreader.reload_env()
+
+        assert changed == {"VAR1", "VAR2", "VAR3"}
+        assert newenvreader.get_env("VAR1") == "changed"
+        with self.assertRaises(KeyError):
+            newenvreader.get_env("VAR2")
+        # The old snapshot is left untouched for readers still holding it
+        assert old["VAR1"] == "value1"
+        with self.assertRaises(TypeError):
+            old["VAR1"] = "mutated"
+
+    def test_write_during_parse_is_seen(self):
+        parse_config_file = newenvreader.parse_config_file
+
+        def parse_then_write(*args):
+            values = parse_config_file(*args)
+            self.write("VAR1=changed\nVAR2=value2\n")
+            return values
+
+        with patch.object(newenvreader, "parse_config_file", parse_then_write):
+            assert newenvreader.get_env("VAR1") == "value1"
+        assert newenvreader.loaded_env.has_changed()
+        assert newenvreader.reload_env() == {"VAR1"}
+        assert newenvreader.get_env("VAR1") == "changed"
+
+    def test_subscribers_get_changed_keys(self):
+        newenvreader.preload()
+        received = []
+        unsubscribe = newenvreader.subscribe(received.append)
+
+        self.write("VAR1=value1\nVAR2=changed\n")
+        newenvreader.reload_env()
+        assert received == [frozenset({"VAR2"})]
+
+        unsubscribe()
+        self.write("VAR1=changed\nVAR2=changed\n")
+        newenvreader.reload_env()
+        assert len(received) == 1
+
+    def test_file_appearing_is_picked_up(self):
+        os.remove(self.file_path)
+        newenvreader.configure(self.temp_dir.name)
+        newenvreader.preload()
+        assert newenvreader.reload_env() == frozenset()
+
+        self.write("VAR1=late\n")
+        assert newenvreader.reload_env() == {"VAR1"}
+        assert newenvreader.get_env("VAR1") == "late"
+
+    def test_watcher(self):
+        newenvreader.preload()
+        reloaded = threading.Event()
+        newenvreader.subscribe(lambda keys: reloaded.set())
+
+        watcher = newenvreader.watch(interval=0.01)
+        try:
+            self.write("VAR1=watched\n")
+            assert reloaded.wait(5)
+        finally:
+            watcher.stop()
+        assert newenvreader.get_env("VAR1") == "watched"
+
+    def test_readers_never_see_partial_env(self):
+        newenvreader.preload()
+        stop = threading.Event()
+        errors = []
+
+        def reader():
+            while not stop.is_set():
+                env = newenvreader.loaded_env.load()
+                if env["VAR1"] != env["VAR2"]:
+                    errors.append(dict(env))
+
+        self.write("VAR1=0\nVAR2=0\n")
+        newenvreader.reload_env()
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(1, 20):
+            self.write(f"VAR1={i}\nVAR2={i}\n")
+            newenvreader.reload_env()
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+import hashlib
+import http.server
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class ConfigHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        server = self.server
+        server.gate.wait()
+        time.sleep(server.delay)
+        if server.fail:
+            status, body, headers = 500, b"down", {}
+        else:
+            etag = '"%s"' % hashlib.sha256(server.body).hexdigest()[:16]
+            headers = {"ETag": etag, "Content-Type": server.content_type}
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+            else:
+                status, body = 200, server.body
+        server.requests.append((self.path, status, self.headers.get("X-Token")))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.trickle:
+            # Each write is quick, only the whole response is slow
+            for byte in body:
+                self.wfile.write(bytes([byte]))
+                self.wfile.flush()
+                time.sleep(server.trickle)
+        else:
+            self.wfile.write(body)
+        # Drop the connection without telling the client, as idle timeouts do
+        self.close_connection = server.drop
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSource(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.copy = os.path.join(self.temp_dir.name, "remote.cache")
+        self.start_server()
+        self.url = "http://127.0.0.1:%d/config/app.env" % self.server.server_port
+
+    def start_server(self, port=0):
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", port), ConfigHandler
+        )
+        self.server.daemon_threads = True
+        self.server.body = b"NAME=remote\nPORT=8000\n"
+        self.server.content_type = "text/plain"
+        self.server.delay = 0
+        self.server.trickle = 0
+        self.server.gate = threading.Event()
+        self.server.gate.set()
+        self.server.fail = False
+        self.server.drop = False
+        self.server.requests = []
+        self.server.connections = 0
+        threading.Thread(
+            target=self.server.serve_forever, args=(0.01,), daemon=True
+        ).start()
+
+    def stop_server(self):
+        self.server.gate.set()
+        newenvreader.close_http_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def source(self, **options):
+        return newenvreader.HttpSource(self.url, cache_path=self.copy, **options)
+
+    def statuses(self):
+        return [status for _, status, _ in self.server.requests]
+
+    def test_fetch(self):
+        source = self.source(headers={"X-Token": "secret"})
+        assert dict(source) == {"NAME": "remote", "PORT": "8000"}
+        assert not source.stale and source.error is None
+        assert source.etag is not None
+        assert self.server.requests == [("/config/app.env", 200, "secret")]
+        assert os.path.exists(self.copy)
+
+    def test_revalidation_reuses_connection(self):
+        source = self.source()
+        assert not source.has_changed()
+        assert not source.has_changed()
+        assert self.statuses() == [200, 304, 304]
+        assert self.server.connections == 1
+
+        self.server.body = b"NAME=changed\n"
+        assert source.has_changed()
+        newer = self.source(previous=source)
+        assert newer["NAME"] == "changed"
+        # The response fetched by has_changed() is not fetched again
+        assert self.statuses() == [200, 304, 304, 200]
+
+    def test_dropped_connection_is_retried(self):
+        self.server.drop = True
+        source = self.source()
+        assert not source.has_changed()
+        assert self.statuses() == [200, 304]
+        assert self.server.connections == 2
+        assert source.error is None
+
+    def test_startup_revalidates_copy(self):
+        self.source()
+        source = self.source()
+        assert source["NAME"] == "remote"
+        assert source.wait(5)
+        assert not source.stale and source.error is None
+        assert self.statuses() == [200, 304]
+        assert not source.has_changed()
+
+    def test_startup_keeps_newer_config_for_reload(self):
+        self.source()
+        self.server.body = b"NAME=newer\n"
+        source = self.source()
+        assert source.wait(5)
+        assert source["NAME"] == "remote" and source.stale
+        assert source.has_changed()
+        assert self.source(previous=source)["NAME"] == "newer"
+        assert self.statuses() == [200, 200]
+
+    def test_fallback_to_copy(self):
+        self.source()
+        self.server.fail = True
+        source = self.source()
+        assert source["NAME"] == "remote"
+        assert source.wait(5)
+        assert source.stale
+        assert "HTTP 500" in str(source.error)
+
+        os.remove(self.copy)
+        source = self.source()
+        assert len(source) == 0 and source.stale
+
+    def test_startup_does_not_wait(self):
+        self.source()
+        self.server.gate.clear()
+        source = self.source(timeout=5)
+        # The copy is served while the server has not answered yet
+        assert source["NAME"] == "remote"
+        assert not source.wait(0)
+        self.server.gate.set()
+        assert source.wait(5)
+        assert not source.stale
+
+    def test_startup_timeout(self):
+        self.source()
+        self.server.gate.clear()
+        source = self.source(timeout=0.1)
+        assert source.wait(5)
+        assert source["NAME"] == "remote"
+        assert source.stale
+        assert isinstance(source.error, TimeoutError)
+
+    def test_total_timeout(self):
+        # Without a copy, the first fetch waits, for timeout seconds in all
+        self.server.trickle = 0.1
+        start = time.perf_counter()
+        source = self.source(timeout=0.3)
+        assert time.perf_counter() - start < 1.5
+        assert len(source) == 0 and source.stale
+        assert isinstance(source.error, TimeoutError)
+
+    def test_invalid_body_keeps_copy(self):
+        source = self.source()
+        self.server.body = b"not a pair\n"
+        assert source.has_changed()
+        source = self.source(previous=source)
+        assert source["NAME"] == "remote"
+        assert isinstance(source.error, newenvreader.EnvFileSyntaxError)
+        self.server.fail = True
+        source = self.source()
+        source.wait(5)
+        assert source["NAME"] == "remote"
+
+    def test_json(self):
+        self.server.content_type = "application/json"
+        self.server.body = json.dumps({"NAME": "json", "PORT": 8000}).encode()
+        source = self.source()
+        assert dict(source) == {"NAME": "json", "PORT": "8000"}
+
+    def test_invalid_url(self):
+        for url in ("ftp://example.com/app.env", "/etc/app.env"):
+            with self.subTest(url=url):
+                with self.assertRaises(ValueError):
+                    newenvreader.HttpSource(url, cache_path=self.copy)
+
+    def test_layer(self):
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("NAME=file\n")
+        newenvreader.configure(
+            self.temp_dir.name, remote_url=self.url, remote_cache=self.copy
+        )
+        assert newenvreader.get_env("NAME") == "file"
+        assert newenvreader.get_env("PORT", cast=int) == 8000
+        assert newenvreader.source_of("PORT") == "remote"
+
+        assert newenvreader.reload_env() == frozenset()
+        self.server.body = b"PORT=9000\n"
+        assert newenvreader.reload_env() == {"PORT"}
+        assert newenvreader.get_env("PORT", cast=int) == 9000
+        assert self.statuses() == [200, 304, 200]
+        newenvreader.configure()
+
+    def test_server_started_after_load(self):
+        port = self.server.server_port
+        self.stop_server()
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("OTHER=file\n")
+        newenvreader.configure(
+            self.temp_dir.name, remote_url=self.url, remote_cache=self.copy
+        )
+        assert "NAME" not in newenvreader.loaded_env
+        assert not newenvreader.loaded_env.has_changed()
+
+        self.start_server(port)
+        assert newenvreader.loaded_env.has_changed()
+        assert newenvreader.reload_env() == {"NAME", "PORT"}
+        assert newenvreader.source_of("NAME") == "remote"
+        newenvreader.configure()
+
+    def tearDown(self):
+        self.stop_server()
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
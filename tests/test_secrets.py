@@ -0,0 +1,151 @@
+import importlib
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestSecretsDir(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.secrets = os.path.join(self.temp_dir.name, "secrets")
+        os.mkdir(self.secrets)
+        self.write("DB_PASSWORD", "hunter2\n")
+        self.write("API_TOKEN", "token")
+        self.write(".hidden", "x")
+
+    def write(self, name, data):
+        path = os.path.join(self.secrets, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+    def test_lazy_reads(self):
+        secrets = newenvreader.SecretsDir(self.secrets)
+        assert set(secrets) == {"DB_PASSWORD", "API_TOKEN"}
+        assert secrets.unread() == {"DB_PASSWORD", "API_TOKEN"}
+        assert "DB_PASSWORD" in secrets
+
+        assert secrets["DB_PASSWORD"] == "hunter2"
+        assert secrets.unread() == {"API_TOKEN"}
+        with patch("builtins.open", side_effect=AssertionError("read again")):
+            assert secrets["DB_PASSWORD"] == "hunter2"
+        assert secrets.get(".hidden") is None
+        with self.assertRaises(KeyError):
+            secrets["MISSING"]
+
+    def test_strip(self):
+        secrets = newenvreader.SecretsDir(self.secrets, strip=False)
+        assert secrets["DB_PASSWORD"] == "hunter2\n"
+
+    def test_missing_directory(self):
+        secrets = newenvreader.SecretsDir(os.path.join(self.secrets, "nope"))
+        assert len(secrets) == 0
+        assert secrets.get("DB_PASSWORD") is None
+
+    def test_removed_file(self):
+        secrets = newenvreader.SecretsDir(self.secrets)
+        os.remove(os.path.join(self.secrets, "API_TOKEN"))
+        assert secrets.get("API_TOKEN") is None
+        assert secrets.has_changed()
+
+    def test_changed_file(self):
+        secrets = newenvreader.SecretsDir(self.secrets)
+        assert secrets["API_TOKEN"] == "token"
+        assert not secrets.has_changed()
+        self.write("API_TOKEN", "rotated")
+        assert secrets.has_changed()
+
+        fresh = newenvreader.SecretsDir(self.secrets, previous=secrets)
+        assert fresh.unread() == {"DB_PASSWORD", "API_TOKEN"}
+        assert fresh["API_TOKEN"] == "rotated"
+
+    def test_previous_values_are_reused(self):
+        secrets = newenvreader.SecretsDir(self.secrets)
+        secrets["DB_PASSWORD"]
+        fresh = newenvreader.SecretsDir(self.secrets, previous=secrets)
+        assert fresh.unread() == {"API_TOKEN"}
+        assert fresh["DB_PASSWORD"] == "hunter2"
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestKubernetesVolume(unittest.TestCase):
+    """Secrets mounted the way the kubelet writes them, rotated by a symlink swap."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.volume = os.path.join(self.temp_dir.name, "volume")
+        os.mkdir(self.volume)
+        self.publish("..2024_01_01", {"DB_PASSWORD": "first", "API_TOKEN": "token"})
+        for name in ("DB_PASSWORD", "API_TOKEN"):
+            os.symlink(os.path.join("..data", name), os.path.join(self.volume, name))
+
+        with open(
+            os.path.join(self.temp_dir.name, ".env"), "w", encoding="utf-8"
+        ) as file:
+            file.write("NAME=app\n")
+        with patch("os.getcwd", return_value=self.temp_dir.name):
+            importlib.reload(newenvreader)
+        newenvreader.configure(self.temp_dir.name, secrets_dir=self.volume)
+
+    def publish(self, version, values):
+        directory = os.path.join(self.volume, version)
+        os.mkdir(directory)
+        for name, value in values.items():
+            with open(os.path.join(directory, name), "w", encoding="utf-8") as file:
+                file.write(value)
+        tmp_link = os.path.join(self.volume, "..data_tmp")
+        os.symlink(version, tmp_link)
+        os.replace(tmp_link, os.path.join(self.volume, "..data"))
+
+    def test_lookup(self):
+        assert newenvreader.get_env("DB_PASSWORD") == "first"
+        assert newenvreader.source_of("DB_PASSWORD") == "secrets"
+        assert newenvreader.get_env("NAME") == "app"
+        with patch.dict(os.environ, {"DB_PASSWORD": "from-env"}):
+            env = newenvreader.load_env(self.temp_dir.name, secrets_dir=self.volume)
+            assert env["DB_PASSWORD"] == "from-env"
+
+    def test_rotation(self):
+        assert newenvreader.get_env("DB_PASSWORD") == "first"
+        assert newenvreader.reload_env() == frozenset()
+
+        self.publish("..2024_02_01", {"DB_PASSWORD": "second", "API_TOKEN": "token"})
+        assert newenvreader.loaded_env.has_changed()
+        # Only the secret that was used is read to compute the changes
+        assert newenvreader.reload_env() == {"DB_PASSWORD"}
+        assert newenvreader.get_env("DB_PASSWORD") == "second"
+        secrets = dict(newenvreader.loaded_env.load().layers)["secrets"]
+        assert secrets.unread() == {"API_TOKEN"}
+
+    def test_secrets_added_after_load(self):
+        empty = os.path.join(self.temp_dir.name, "empty")
+        os.mkdir(empty)
+        newenvreader.configure(self.temp_dir.name, secrets_dir=empty)
+        assert "DB_PASS" not in newenvreader.loaded_env
+        assert not newenvreader.loaded_env.has_changed()
+
+        with open(os.path.join(empty, "DB_PASS"), "w", encoding="utf-8") as file:
+            file.write("s3cret\n")
+        assert newenvreader.loaded_env.has_changed()
+        assert newenvreader.reload_env() == {"DB_PASS"}
+        assert newenvreader.get_env("DB_PASS") == "s3cret"
+
+    def test_secrets_left_out_of_precedence(self):
+        env = newenvreader.load_env(
+            self.temp_dir.name,
+            secrets_dir=self.volume,
+            precedence=("file", "system"),
+        )
+        assert "DB_PASSWORD" not in env
+
+    def tearDown(self):
+        newenvreader.configure()
+        self.temp_dir.cleanup()
@@ -0,0 +1,91 @@
+import unittest
+import unittest.mock
+from typing import ClassVar, Optional
+
+import newenvreader
+
+
+class TestSettings(unittest.TestCase):
+    def setUp(self):
+        # Declared here as other tests reload the module
+        class AppSettings(newenvreader.Settings):
+            DB_URL: str
+            PORT: int = 8000
+            DEBUG: bool = False
+            RATIO: float = "0.5"
+            SENTRY_DSN: Optional[str] = None
+            TIMEOUT: Optional[int]
+            NAME: ClassVar[str] = "app"
+
+        class WorkerSettings(AppSettings):
+            CONCURRENCY: int = 4
+            PORT: int = 9000
+
+        self.AppSettings = AppSettings
+        self.WorkerSettings = WorkerSettings
+
+    def test_resolve(self):
+        settings = self.AppSettings({"DB_URL": "postgres://db", "DEBUG": "yes"})
+
+        assert settings.DB_URL == "postgres://db"
+        assert settings.PORT == 8000
+        assert settings.DEBUG is True
+        assert settings.RATIO == 0.5
+        assert settings.SENTRY_DSN is None
+        assert settings.TIMEOUT is None
+        assert self.AppSettings.NAME == "app"
+
+    def test_casting_matches_get_env(self):
+        settings = self.AppSettings({"DB_URL": "x", "PORT": "81", "TIMEOUT": "3"})
+        assert settings.PORT == 81
+        assert settings.TIMEOUT == 3
+
+    def test_all_errors_reported(self):
+        with self.assertRaises(newenvreader.SettingsError) as ctx:
+            self.AppSettings({"PORT": "eighty", "DEBUG": "maybe"})
+
+        errors = ctx.exception.errors
+        assert set(errors) == {"DB_URL", "PORT", "DEBUG"}
+        assert isinstance(errors["DB_URL"], KeyError)
+        assert isinstance(errors["PORT"], ValueError)
+        assert "DB_URL is not found" in str(ctx.exception)
+        assert isinstance(ctx.exception, ValueError)
+
+    def test_frozen_slots(self):
+        settings = self.AppSettings({"DB_URL": "x"})
+        with self.assertRaises(AttributeError):
+            settings.PORT = 1
+        with self.assertRaises(AttributeError):
+            del settings.PORT
+        assert not hasattr(settings, "__dict__")
+        assert self.AppSettings.__slots__ == (
+            "DB_URL",
+            "PORT",
+            "DEBUG",
+            "RATIO",
+            "SENTRY_DSN",
+            "TIMEOUT",
+        )
+
+    def test_inheritance(self):
+        settings = self.WorkerSettings({"DB_URL": "x"})
+        assert settings.PORT == 9000
+        assert settings.CONCURRENCY == 4
+        assert self.WorkerSettings.__slots__ == ("CONCURRENCY",)
+        assert settings.as_dict()["DB_URL"] == "x"
+
+    def test_reads_loaded_env(self):
+        with unittest.mock.patch.dict(
+            "os.environ", {"DB_URL": "from-env", "PORT": "1234"}
+        ):
+            newenvreader.configure()
+            settings = self.AppSettings()
+        newenvreader.configure()
+
+        assert settings.DB_URL == "from-env"
+        assert settings.PORT == 1234
+        assert repr(settings).startswith("AppSettings(DB_URL='from-env', PORT=1234")
+
+
+if __name__ == "__main__":
+    unittest.main()
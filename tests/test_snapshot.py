@@ -0,0 +1,169 @@
+import importlib
+import multiprocessing
+import os
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+def snapshot_worker(key):
+    """Load the environment in a spawned child and report the load phases."""
+    newenvreader.enable_instrumentation()
+    value = newenvreader.get_env(key)
+    return value, newenvreader.source_of(key), sorted(newenvreader.stats()["phases"])
+
+
+class TestSnapshotFile(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "env.snap")
+
+    def test_round_trip(self):
+        values = {f"KEY_{i}": f"value {i}" for i in range(1000)}
+        values["UNICODE_ÿ"] = "naïve ☃"
+        values["EMPTY"] = ""
+        newenvreader.write_snapshot(values, self.path, {"source": None})
+
+        snapshot = newenvreader.EnvSnapshot(self.path)
+        try:
+            assert len(snapshot) == len(values)
+            assert dict(snapshot) == values
+            assert snapshot["KEY_500"] == "value 500"
+            assert snapshot["UNICODE_ÿ"] == "naïve ☃"
+            assert snapshot.get("EMPTY") == ""
+            assert snapshot.get("NOPE", "x") == "x"
+            assert "KEY_999" in snapshot
+            assert "NOPE" not in snapshot
+            assert snapshot.meta == {"source": None}
+            with self.assertRaises(KeyError):
+                snapshot["NOPE"]
+        finally:
+            snapshot.close()
+
+    def test_empty(self):
+        newenvreader.write_snapshot({}, self.path)
+        snapshot = newenvreader.EnvSnapshot(self.path)
+        assert len(snapshot) == 0
+        assert snapshot.get("KEY") is None
+        snapshot.close()
+
+    def test_invalid(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a snapshot at all")
+        with self.assertRaises(ValueError):
+            newenvreader.EnvSnapshot(self.path)
+
+    def test_attach_does_not_copy(self):
+        values = {f"KEY_{i}": "x" * 100 for i in range(50000)}
+        newenvreader.write_snapshot(values, self.path)
+        del values
+
+        tracemalloc.start()
+        try:
+            snapshot = newenvreader.EnvSnapshot(self.path)
+            for i in range(0, 50000, 500):
+                assert snapshot[f"KEY_{i}"] == "x" * 100
+            allocated = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        snapshot.close()
+        # A parsed dict of the same file takes several megabytes
+        assert allocated < 100000, allocated
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestSharedEnv(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.temp_dir.name)
+        self.env_path = os.path.join(self.root, ".env")
+        with open(self.env_path, "w", encoding="utf-8") as file:
+            file.write("SHARED=from file\nOTHER=1\n")
+        self.cwd = os.getcwd()
+        os.chdir(self.root)
+        with patch("os.getcwd", return_value=self.root):
+            importlib.reload(newenvreader)
+
+    def test_attach(self):
+        path = newenvreader.share_env(self.root)
+        assert os.environ[newenvreader.SNAPSHOT_ENV_VAR] == path
+
+        child = newenvreader.LazyEnv(self.root)
+        newenvreader.enable_instrumentation()
+        try:
+            assert child["SHARED"] == "from file"
+        finally:
+            newenvreader.disable_instrumentation()
+        assert isinstance(dict(child.load().layers)["file"], newenvreader.EnvSnapshot)
+        assert child.source_of("SHARED") == "file"
+        assert child.path == self.env_path
+        assert "parse" not in newenvreader.stats()["phases"]
+        assert not child.has_changed()
+
+    def test_stale_snapshot_is_ignored(self):
+        newenvreader.share_env(self.root)
+        with open(self.env_path, "a", encoding="utf-8") as file:
+            file.write("NEW=2\n")
+        child = newenvreader.LazyEnv(self.root)
+        assert child["NEW"] == "2"
+        assert not isinstance(
+            dict(child.load().layers)["file"], newenvreader.EnvSnapshot
+        )
+
+    def test_other_start_dir_is_ignored(self):
+        newenvreader.share_env(self.root)
+        other = os.path.join(self.root, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, ".env"), "w", encoding="utf-8") as file:
+            file.write("SHARED=other\n")
+        assert newenvreader.LazyEnv(other)["SHARED"] == "other"
+
+    def test_other_profile_is_ignored(self):
+        for profile in ("prod", "dev"):
+            path = os.path.join(self.root, f".env.{profile}")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(f"SHARED={profile}\n")
+        newenvreader.LazyEnv(self.root, profile="prod").share(self.root)
+
+        child = newenvreader.LazyEnv(self.root, profile="dev")
+        assert child["SHARED"] == "dev"
+        assert os.path.join(self.root, ".env.dev") in child.paths
+        with patch.dict(os.environ, {newenvreader.PROFILE_ENV_VAR: "dev"}):
+            assert newenvreader.LazyEnv(self.root)["SHARED"] == "dev"
+        assert newenvreader.LazyEnv(self.root, max_depth=0)["SHARED"] == "from file"
+        child = newenvreader.LazyEnv(self.root, profile="prod")
+        assert child["SHARED"] == "prod"
+        assert isinstance(dict(child.load().layers)["file"], newenvreader.EnvSnapshot)
+
+    def test_share_again_replaces_snapshot(self):
+        first = newenvreader.share_env(self.root)
+        second = newenvreader.share_env(self.root)
+        assert not os.path.exists(first)
+        assert os.path.exists(second)
+
+    def test_spawned_workers_do_not_parse(self):
+        newenvreader.share_env(self.root)
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(2) as pool:
+            results = pool.map(snapshot_worker, ["SHARED", "OTHER"])
+
+        assert results[0][:2] == ("from file", "file")
+        assert results[1][:2] == ("1", "file")
+        for _, _, phases in results:
+            assert phases == ["attach", "merge"]
+
+    def tearDown(self):
+        path = os.environ.pop(newenvreader.SNAPSHOT_ENV_VAR, None)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
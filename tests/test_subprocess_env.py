@@ -0,0 +1,113 @@
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import newenvreader
+
+
+class TestSubprocessEnv(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.write(".env", "NAME=file\nMODE=base\n")
+
+        with patch("os.getcwd", return_value=self.root):
+            importlib.reload(newenvreader)
+        newenvreader.configure(self.root)
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(data)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, time.time_ns() + 10**9))
+
+    def test_encoded_once_per_snapshot(self):
+        env = newenvreader.subprocess_env()
+        assert env[b"NAME"] == b"file"
+        assert env[b"PATH"] == os.environb[b"PATH"]
+        assert newenvreader.subprocess_env() is env
+        with self.assertRaises(TypeError):
+            env[b"NAME"] = b"changed"
+
+        self.write(".env", "NAME=changed\nMODE=base\n")
+        assert newenvreader.reload_env() == {"NAME"}
+        assert newenvreader.subprocess_env()[b"NAME"] == b"changed"
+
+    def test_extra(self):
+        base = newenvreader.subprocess_env()
+        env = newenvreader.subprocess_env({"JOB": "1"}, MODE="job")
+        assert env[b"JOB"] == b"1"
+        assert env[b"MODE"] == b"job"
+        assert env[b"NAME"] == b"file"
+        assert b"JOB" not in base and base[b"MODE"] == b"base"
+
+    def test_override(self):
+        with newenvreader.override(MODE="outer", OUTER="1"):
+            with newenvreader.override(MODE="inner"):
+                env = newenvreader.subprocess_env(JOB="2")
+        assert env[b"MODE"] == b"inner"
+        assert env[b"OUTER"] == b"1"
+        assert env[b"JOB"] == b"2"
+        assert newenvreader.subprocess_env()[b"MODE"] == b"base"
+
+    def test_deleted_secret_is_skipped(self):
+        secrets = os.path.join(self.root, "secrets")
+        os.mkdir(secrets)
+        for name in ("TOKEN", "GONE"):
+            self.write(os.path.join("secrets", name), "s3cret\n")
+        newenvreader.configure(self.root, secrets_dir=secrets)
+        newenvreader.preload()
+        os.remove(os.path.join(secrets, "GONE"))
+
+        env = newenvreader.subprocess_env()
+        assert env[b"TOKEN"] == b"s3cret"
+        assert b"GONE" not in env
+
+    def test_share_invalidates(self):
+        env = newenvreader.subprocess_env()
+        assert newenvreader.SNAPSHOT_ENV_VAR.encode() not in env
+        try:
+            path = newenvreader.share_env(self.root)
+            env = newenvreader.subprocess_env()
+            assert env[newenvreader.SNAPSHOT_ENV_VAR.encode()] == path.encode()
+        finally:
+            os.environ.pop(newenvreader.SNAPSHOT_ENV_VAR, None)
+
+    def test_spawn(self):
+        code = "import os; print(os.environ['NAME'], os.environ['JOB'])"
+        env = newenvreader.subprocess_env(JOB="3")
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, check=True
+        ).stdout
+        assert output == b"file 3\n"
+
+    @unittest.skipUnless(hasattr(os, "posix_spawn"), "requires os.posix_spawn")
+    def test_posix_spawn(self):
+        code = "import os; print(os.environ['NAME'], os.environ['JOB'])"
+        read, write = os.pipe()
+        pid = os.posix_spawn(
+            sys.executable,
+            [sys.executable, "-c", code],
+            newenvreader.subprocess_env(JOB="4"),
+            file_actions=[(os.POSIX_SPAWN_DUP2, write, 1)],
+        )
+        os.close(write)
+        with os.fdopen(read, "rb") as file:
+            output = file.read()
+        os.waitpid(pid, 0)
+        assert output == b"file 4\n"
+
+    def tearDown(self):
+        newenvreader.configure()
+        self.temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()